@@ -0,0 +1,471 @@
+import asyncio
+import time
+
+from fuzzywuzzy import fuzz
+
+from intent_router import VOLUME_KEYWORDS
+from tts_stream import CLAUSE_END, SENTENCE_END
+from youtube_resolver import ResolveError, StageTimer
+
+# Intents that interrupt the bot while it is speaking, per mode.
+BARGE_IN_INTENTS = {
+    "main": ("stop_video", "story", "enter_youtube"),
+    "youtube": ("stop_video", "exit_youtube"),
+}
+
+
+class ConversationCore:
+    """
+    Event-driven conversation loop on asyncio.
+
+    Listening never stops: a capture task turns phrases into text and puts
+    them on a queue while the dispatcher speaks or plays music, so the user
+    can interrupt (barge in) speech or playback mid-sentence. Blocking work
+    (recognition, synthesis, playback, database and YouTube lookups) runs in
+    worker threads through `asyncio.to_thread`, and the `ChatBot` methods it
+    calls stay usable on their own. A barge-in ends the turn it cuts: `say`
+    returns False and the handler drops the rest, such as the answer after
+    the "waiting" prompt or the track after its prompt, and the command
+    heard is handled as the next turn.
+
+    The turns are those of the original blocking loop: stories, answers and
+    volume in the main mode, searches and the play queue in youtube mode.
+    With `barge_in=False` the bot only listens while it waits for input, like
+    the blocking loop did, which keeps replayed recordings in step.
+
+    Listening, speaking, playback and volume go through the methods of the
+    "Input and output" section, which use the microphone, speaker and
+    player of the bot. The server's `SessionCore` overrides them to talk to
+    a remote client. The play queue is the one of `owner` in the media
+    library.
+
+    With a `TraceRecorder` as `bot.trace`, every turn is recorded with the
+    routing decisions it took through `route` and the `branch` it ended in.
+    """
+    def __init__(self, bot, barge_in=True, owner=""):
+        self.bot = bot
+        self.barge_in = barge_in
+        self.owner = owner
+        self.ready = asyncio.Event()
+        self.utterances = asyncio.Queue()
+        self.mode = "main"
+        # The config of the current turn, with its router.
+        self.config = bot.config
+        self.enter_text = None
+        # False when `youtube_mode` runs it for a caller that answers.
+        self.answer_on_exit = True
+        self.speaking_text = None
+        self.speech_lock = asyncio.Lock()
+        self.interrupted = False
+        self.playing = None
+        self.skip_prompts = False
+        self.last_keyword = None
+        self.turn_start = None
+        self.routes = []
+        self.branch = None
+
+    @property
+    def voice_dict(self):
+        return self.config.voice_dict
+
+    async def run(self, greet=True, until=None):
+        """
+        Greets the user and processes utterances until the audio source is
+        exhausted.
+
+        Args:
+            greet (bool): Say hello first; False if the caller already did.
+            until (str): Also return once a turn ends in this mode.
+        """
+        listener = asyncio.create_task(self.listen_loop())
+        try:
+            if greet:
+                await self.say(self.voice_dict["hello"])
+            while True:
+                self.ready.set()
+                heard = await self.utterances.get()
+                self.ready.clear()
+                if heard is None:
+                    break
+                text, audio = heard
+                self.turn_start = time.perf_counter()
+                self.routes, self.branch = [], None
+                # options.json may be reloaded at any time; a turn uses one
+                # config throughout.
+                self.config = self.bot.config
+                self.resume_speaking()
+                mode = self.mode
+                await self.handle(text)
+                self.end_turn()
+                if self.bot.trace is not None:
+                    self.bot.trace.record(mode, text, self.routes,
+                                          self.branch or "ignored", audio)
+                if until is not None and self.mode == until:
+                    break
+            if self.playing:
+                await self.playing
+        finally:
+            listener.cancel()
+
+    async def youtube_mode(self, text):
+        """
+        Enters youtube mode with the utterance that asked for it and runs
+        the conversation until the user leaves it, for
+        `ChatBot.youtube_mode`. As in the blocking loop, the caller answers
+        that utterance afterwards.
+
+        Returns:
+            bool: False if the utterance does not ask for youtube mode.
+        """
+        self.config = self.bot.config
+        enter = self.config.router.route(text, ("enter_youtube",))
+        if enter.intent is None:
+            return False
+        self.answer_on_exit = False
+        await self.enter_youtube(text, enter.option)
+        await self.run(greet=False, until="main")
+        return True
+
+    async def listen_loop(self):
+        """
+        Captures utterances continuously. While the bot is speaking or
+        playing, only commands are passed on; they interrupt speech, and a
+        stop command also ends playback. Everything else heard meanwhile,
+        including the bot's own voice, is dropped. A command that cut the
+        speech is handled as the next turn, except a stop, which only
+        silences the bot (see `stops_speech`).
+        """
+        while True:
+            if not self.barge_in:
+                await self.ready.wait()
+            try:
+                text, audio = await self.next_utterance()
+            except EOFError:
+                await self.utterances.put(None)
+                return
+            routes = []
+            router = self.bot.config.router
+            if self.speaking_text is not None:
+                if self.is_echo(text):
+                    self.trace_heard(text, audio, routes, "echo")
+                    continue
+                intents = BARGE_IN_INTENTS[self.mode]
+                route = router.route(text, intents)
+                routes.append((intents, route))
+                if route.intent is None:
+                    self.trace_heard(text, audio, routes, "dropped")
+                    continue
+                print(f"Barge-in: {route.intent}")
+                self.interrupted = True
+                self.stop_speaking()
+                if route.intent == "stop_video" and self.playing is None:
+                    if self.stops_speech(text, route):
+                        self.trace_heard(text, audio, routes, "barge_in")
+                        continue
+            if self.playing is not None:
+                intents = ("volume_up", "volume_down", "stop_video",
+                           "next_video", "replay_video")
+                route = router.route(text, intents)
+                routes.append((intents, route))
+                if route.intent == "stop_video":
+                    self.trace_heard(text, audio, routes, "stop_playback")
+                    playing = self.playing
+                    await self.stop_playback(cancel=True)
+                    if not self.barge_in and playing is not None:
+                        # Let the closing prompts of the track finish before
+                        # the next recorded utterance is captured.
+                        await asyncio.gather(playing, return_exceptions=True)
+                    continue
+                if route.intent in ("next_video", "replay_video"):
+                    # Switch tracks without the closing prompts; the
+                    # dispatcher then starts the new one.
+                    playing = self.playing
+                    self.skip_prompts = True
+                    await self.stop_playback()
+                    if playing is not None:
+                        await asyncio.gather(playing, return_exceptions=True)
+                if route.intent is None:
+                    self.trace_heard(text, audio, routes, "dropped")
+                    continue
+            self.ready.clear()
+            await self.utterances.put((text, audio))
+
+    def stops_speech(self, text, route):
+        """
+        Whether a stop command heard over speech, with nothing playing, only
+        asks the bot to be quiet. In youtube mode anything else is a search,
+        and "nhạc thiếu nhi" scores 86 against "tắt nhạc", so the stop
+        phrase itself must have been said; otherwise the utterance is
+        handled as a request once the speech is cut.
+        """
+        if self.mode != "youtube":
+            return True
+        normalize = self.bot.config.router.normalize
+        return normalize(route.option) in normalize(text)
+
+    def is_echo(self, text):
+        """
+        Tells whether an utterance heard while speaking is the bot's own
+        voice.
+
+        The utterance is compared as a whole with each sentence or clause
+        being spoken, and with each pair of neighbouring ones, since the
+        microphone picks up the bot phrase by phrase. A short command such
+        as a story name said during a long answer that mentions it does not
+        match.
+        """
+        phrases = [phrase.strip().lower()
+                   for sentence in SENTENCE_END.split(self.speaking_text)
+                   for phrase in CLAUSE_END.split(sentence) if phrase.strip()]
+        phrases += [f"{first} {second}"
+                    for first, second in zip(phrases, phrases[1:])]
+        return any(fuzz.ratio(text, phrase) >= 80 for phrase in phrases)
+
+    async def say(self, text):
+        """
+        Speaks a text; `listen_loop` may interrupt it.
+
+        Returns:
+            bool: False if the speech was cut by a barge-in, in which case
+            the caller drops the rest of its turn.
+        """
+        async with self.speech_lock:
+            self.interrupted = False
+            self.resume_speaking()
+            self.speaking_text = text
+            try:
+                await self.speak(text)
+            finally:
+                self.speaking_text = None
+            self.end_turn()
+            return not self.interrupted
+
+    # Input and output.
+
+    async def next_utterance(self):
+        """
+        Returns the next recognized utterance, as a (text, pcm) pair with
+        the audio it was recognized from, or `None` for the audio if the
+        input has none.
+
+        Raises:
+            EOFError: When the audio source is exhausted.
+        """
+        return await asyncio.to_thread(self.bot.listen, "vi-VN", True)
+
+    async def speak(self, text):
+        await asyncio.to_thread(self.bot.speak, text)
+
+    def stop_speaking(self):
+        self.bot.speaker.stop()
+
+    def resume_speaking(self):
+        """
+        Lets the bot speak again after a `stop_speaking`; called on the
+        event loop when a turn or a speech starts, before it can be cut.
+        """
+        self.bot.speaker.resume()
+
+    @property
+    def first_audio_at(self):
+        return self.bot.speaker.first_audio_at
+
+    async def stop_playback(self, cancel=False):
+        """
+        Stops the track; with `cancel`, also the stream URL lookups.
+        """
+        if cancel:
+            self.bot.youtube.cancel()
+        await asyncio.to_thread(self.bot.player.stop)
+
+    async def play_video(self, video_url, audio_url):
+        await asyncio.to_thread(self.bot.play_video, video_url, audio_url)
+
+    async def change_volume(self, text):
+        await asyncio.to_thread(self.bot.change_volume_by_voice, text)
+
+    async def no_internet(self):
+        await asyncio.to_thread(self.bot.no_internet_speak)
+
+    def trace_heard(self, text, audio, routes, branch):
+        """
+        Records an utterance that `listen_loop` handled itself: a command
+        while the bot spoke or played, or one it dropped.
+        """
+        if self.bot.trace is not None:
+            self.bot.trace.record(self.mode, text, routes, branch, audio)
+
+    def route(self, text, intents):
+        """
+        Routes the utterance of the turn, see `IntentRouter.route`, timed
+        as the "route" stage.
+        """
+        with self.bot.metrics.time("route"):
+            route = self.config.router.route(text, intents)
+        self.routes.append((intents, route))
+        return route
+
+    def end_turn(self):
+        """
+        Records the "turn" latency, from the recognized utterance to the
+        first audio of the reply, once per utterance.
+        """
+        if self.turn_start is None:
+            return
+        first_audio = self.first_audio_at
+        if first_audio is not None and first_audio >= self.turn_start:
+            self.bot.metrics.observe("turn", first_audio - self.turn_start)
+        self.turn_start = None
+
+    async def handle(self, text):
+        route = self.route(text, ("volume_up", "volume_down"))
+        if route.intent in VOLUME_KEYWORDS:
+            self.branch = "volume"
+            await self.change_volume(text)
+            return
+        if self.playing is not None:
+            self.branch = "playing"
+            return
+        if self.mode == "youtube":
+            await self.handle_youtube(text)
+        else:
+            await self.handle_main(text)
+
+    async def handle_main(self, text):
+        route = self.route(text, ("story",))
+        if route.intent == "story":
+            self.branch = "story"
+            if not await self.say(
+                    f"{self.voice_dict['waiting']} {route.option}"):
+                return
+            answer = await asyncio.to_thread(self.bot.get_response,
+                                             route.option)
+            if answer:
+                await self.say(answer)
+                return
+        enter = self.route(text, ("enter_youtube",))
+        if enter.intent:
+            self.branch = "enter_youtube"
+            await self.enter_youtube(text, enter.option)
+            return
+        self.branch = "answer"
+        await self.answer(text)
+
+    async def enter_youtube(self, text, option):
+        self.mode = "youtube"
+        self.enter_text = text
+        self.last_keyword = None
+        await self.say(f"{option} {self.voice_dict['youtube_mode']}")
+
+    async def answer(self, text):
+        response = await asyncio.to_thread(self.bot.get_response, text)
+        await self.say(response or self.voice_dict["unknown_answer"])
+
+    async def handle_youtube(self, text):
+        route = self.route(
+            text, ("exit_youtube", "hello", "next_video", "replay_video"))
+        if route.intent == "exit_youtube":
+            self.branch = "exit_youtube"
+            self.mode = "main"
+            if not await self.say(route.option) or not self.answer_on_exit:
+                return
+            # Like main(), answer the input that entered youtube mode.
+            await self.answer(self.enter_text)
+            return
+        if route.intent == "hello":
+            self.branch = "youtube_hello"
+            await self.say(self.voice_dict["youtube_hello"])
+            return
+        library = self.bot.library
+        if route.intent in ("next_video", "replay_video"):
+            self.branch = route.intent
+            entry = await asyncio.to_thread(
+                library.next if route.intent == "next_video"
+                else library.current, self.owner)
+            if entry is None:
+                self.branch = "queue_empty"
+                await self.say(self.voice_dict["queue_empty"])
+                return
+            self.last_keyword, video_url = entry
+            await self.start_track(self.last_keyword, video_url, StageTimer())
+            return
+
+        timer = StageTimer()
+        try:
+            with self.bot.metrics.time("search_mp4"):
+                candidates = await asyncio.to_thread(self.bot.youtube.search,
+                                                     text, timer)
+        except Exception as e:
+            print(f"An error occurred during the search: {e}")
+            candidates = []
+        if not candidates and not self.bot.connectivity.online:
+            self.branch = "no_internet"
+            await self.no_internet()
+            return
+        if not candidates:
+            self.branch = "no_video"
+            await self.say(f"{self.voice_dict['no_video_found']} {text}")
+            return
+        self.branch = "search"
+        # Asking for the same keyword again plays the next result.
+        if text == self.last_keyword:
+            entry = await asyncio.to_thread(library.next, self.owner)
+            if entry is None:
+                self.branch = "queue_empty"
+                await self.say(self.voice_dict["queue_empty"])
+                return
+            _, video_url = entry
+        else:
+            video_url = await asyncio.to_thread(library.set_queue, text,
+                                                candidates, self.owner)
+        self.last_keyword = text
+        await self.start_track(text, video_url, timer)
+
+    async def start_track(self, keyword, video_url, timer):
+        """
+        Resolves a track of the play queue while the prompt is spoken, then
+        starts playing it.
+        """
+        audio = asyncio.wrap_future(self.bot.youtube.extract_async(video_url))
+        upcoming = await asyncio.to_thread(self.bot.library.upcoming, 1,
+                                           self.owner)
+        self.bot.youtube.prefetch(upcoming)
+        start = time.perf_counter()
+        if not await self.say(f"{self.voice_dict['find_video']} {keyword},"
+                              f" {self.voice_dict['wait_30s']}"):
+            # The stream URL is still resolved, for the next request.
+            return
+        timer.record("prompt", time.perf_counter() - start)
+        start = time.perf_counter()
+        try:
+            audio_url = await audio
+            timer.record("extract_wait", time.perf_counter() - start)
+        except ResolveError as e:
+            print(f"Error: {e}")
+            await self.say(self.voice_dict["error_video"])
+            return
+        self.playing = asyncio.create_task(
+            self.play(video_url, audio_url, timer)
+        )
+
+    async def play(self, video_url, audio_url, timer):
+        """
+        Plays a track while the dispatcher keeps handling commands.
+        """
+        start = time.perf_counter()
+        try:
+            try:
+                await self.play_video(video_url, audio_url)
+            finally:
+                timer.record("playback", time.perf_counter() - start)
+            print(timer.report())
+            self.bot.metrics.record_stages(timer)
+        finally:
+            self.playing = None
+        if self.skip_prompts:
+            self.skip_prompts = False
+            return
+        if not await self.say(self.voice_dict["end_video"]):
+            return
+        if self.mode == "youtube":
+            await self.say(self.voice_dict["more_video"])
@@ -0,0 +1,339 @@
+import math
+import queue
+import threading
+import time
+import wave
+from array import array
+from collections import deque
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+FRAME_MS = 30
+
+
+class CaptureTimeout(Exception):
+    """
+    Raised when no speech starts before the capture timeout.
+    """
+
+
+def frame_rms(frame):
+    """
+    Returns the root mean square energy of a 16-bit PCM frame.
+    """
+    samples = array("h", frame)
+    if not samples:
+        return 0
+    return math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+
+
+class EnergyVAD:
+    """
+    Energy based voice activity detector. The threshold is calibrated on
+    ambient noise, like `Recognizer.adjust_for_ambient_noise`.
+    """
+    def __init__(self, threshold=300, ratio=1.5):
+        self.threshold = threshold
+        self.ratio = ratio
+
+    def calibrate(self, energies):
+        """
+        Sets the threshold from the energies of ambient noise frames.
+
+        Args:
+            energies (list[float]): RMS energies of frames without speech.
+        """
+        if energies:
+            self.threshold = max(sum(energies) / len(energies) * self.ratio, 50)
+
+    def is_speech(self, energy):
+        return energy > self.threshold
+
+
+class MicrophoneSource:
+    """
+    Reads 30 ms frames of 16 kHz mono audio from the default microphone.
+    """
+    def __init__(self):
+        self.microphone = None
+
+    def __enter__(self):
+        import speech_recognition as sr
+        self.microphone = sr.Microphone(
+            sample_rate=SAMPLE_RATE,
+            chunk_size=SAMPLE_RATE * FRAME_MS // 1000
+        )
+        self.microphone.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.microphone.__exit__(*exc)
+        self.microphone = None
+
+    def read(self):
+        return self.microphone.stream.read(self.microphone.CHUNK)
+
+
+class WavSource:
+    """
+    Replays 16 kHz mono 16-bit WAV files as if they were spoken into the
+    microphone, each followed by one second of silence. Files at another
+    rate or sample width are converted with `speech_recognition`.
+
+    Raises `EOFError` from `read` when every file has been played.
+    """
+    def __init__(self, paths, silence_ms=1000):
+        self.paths = list(paths)
+        self.silence_ms = silence_ms
+        self.frames = self._frames()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def _frames(self):
+        frame_bytes = SAMPLE_RATE * FRAME_MS // 1000 * SAMPLE_WIDTH
+        silence = bytes(frame_bytes)
+        for path in self.paths:
+            with wave.open(path, "rb") as wav:
+                pcm = wav.readframes(wav.getnframes())
+                rate, width = wav.getframerate(), wav.getsampwidth()
+            if (rate, width) != (SAMPLE_RATE, SAMPLE_WIDTH):
+                import speech_recognition as sr
+                pcm = sr.AudioData(pcm, rate, width).get_raw_data(
+                    convert_rate=SAMPLE_RATE, convert_width=SAMPLE_WIDTH)
+            for start in range(0, len(pcm), frame_bytes):
+                yield pcm[start:start + frame_bytes].ljust(frame_bytes, b"\0")
+            for _ in range(self.silence_ms // FRAME_MS):
+                yield silence
+
+    def read(self):
+        try:
+            return next(self.frames)
+        except StopIteration:
+            raise EOFError("No more recorded utterances") from None
+
+
+class Subscription:
+    """
+    A consumer of the phrases segmented by `AudioCaptureService`.
+    """
+    def __init__(self, service):
+        self.service = service
+        self.events = queue.Queue()
+        self.waiting = False
+        self.in_phrase = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.service.unsubscribe(self)
+
+    def next_phrase(self, on_frame=None, timeout=20):
+        """
+        Waits for the next phrase.
+
+        Args:
+            on_frame (callable): Called with every frame of the phrase as it
+                is captured, e.g. to stream it into a recognizer.
+            timeout (float): Seconds to wait for speech to start.
+
+        Returns:
+            bytes: The PCM audio of the phrase.
+
+        Raises:
+            CaptureTimeout: If no speech started within `timeout` seconds.
+            EOFError: If the audio source is exhausted.
+        """
+        self.service.set_waiting(self, True)
+        try:
+            return self._next_phrase(on_frame, timeout)
+        finally:
+            self.service.set_waiting(self, False)
+
+    def _next_phrase(self, on_frame, timeout):
+        deadline = time.monotonic() + timeout
+        frames = None
+        while True:
+            wait = None if frames is not None else deadline - time.monotonic()
+            if wait is not None and wait <= 0:
+                raise CaptureTimeout()
+            try:
+                kind, data = self.events.get(timeout=wait)
+            except queue.Empty:
+                raise CaptureTimeout() from None
+            if kind == "start":
+                frames = list(data)
+            elif kind == "frame" and frames is not None:
+                frames.append(data)
+            elif kind == "end" and frames is not None:
+                return b"".join(frames)
+            elif kind == "eof":
+                raise EOFError("Audio source closed")
+            else:
+                continue
+            if on_frame:
+                for frame in (data if kind == "start" else [data]):
+                    on_frame(frame)
+
+
+class AudioCaptureService:
+    """
+    Long-lived audio capture shared by every listener.
+
+    One background thread keeps a single input stream open, segments it
+    into phrases with voice activity detection and hands every phrase to
+    all current subscribers, so the main loop and the stop-video listener
+    no longer open the microphone and calibrate on each call. The energy
+    threshold is recalibrated periodically from the quietest recent frames.
+    """
+    def __init__(self, source_factory=MicrophoneSource, vad=None,
+                 silence_ms=600, phrase_time_limit=15, recalibrate_every=60,
+                 calibrate=True, idle_pause=False):
+        """
+        Args:
+            source_factory (callable): Returns a context manager with a
+                `read()` method yielding 30 ms frames.
+            vad (EnergyVAD): The voice activity detector.
+            silence_ms (int): Silence that ends a phrase.
+            phrase_time_limit (float): Maximum phrase length in seconds.
+            recalibrate_every (float): Seconds between recalibrations.
+            calibrate (bool): Whether to calibrate on the first second.
+            idle_pause (bool): Stop reading while nobody waits for a phrase,
+                for sources that are not real time such as `WavSource`.
+        """
+        self.source_factory = source_factory
+        self.vad = vad or EnergyVAD()
+        self.max_silence = silence_ms // FRAME_MS
+        self.max_phrase = int(phrase_time_limit * 1000 // FRAME_MS)
+        self.recalibrate_every = recalibrate_every
+        self.calibrate = calibrate
+        self.idle_pause = idle_pause
+        self.subscribers = []
+        self.condition = threading.Condition()
+        self.energies = deque(maxlen=10 * 1000 // FRAME_MS)
+        self.thread = None
+        self.stopped = False
+
+    def start(self):
+        """
+        Starts the capture thread if it is not running.
+        """
+        with self.condition:
+            if self.thread and self.thread.is_alive():
+                return
+            self.stopped = False
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """
+        Stops the capture thread and closes the input stream.
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def subscribe(self):
+        """
+        Registers a consumer and starts capturing if needed.
+
+        Returns:
+            Subscription: Receives every phrase that starts from now on.
+        """
+        subscription = Subscription(self)
+        with self.condition:
+            self.subscribers.append(subscription)
+            self.condition.notify_all()
+        self.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.condition:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+
+    def set_waiting(self, subscription, waiting):
+        with self.condition:
+            subscription.waiting = waiting
+            self.condition.notify_all()
+
+    def publish(self, kind, data=None):
+        with self.condition:
+            subscribers = list(self.subscribers)
+            for subscription in subscribers:
+                if kind == "start":
+                    subscription.in_phrase = subscription.waiting
+                elif kind == "end" and subscription.in_phrase:
+                    # The phrase is complete for this consumer, do not let
+                    # `idle_pause` read ahead before it has unsubscribed.
+                    subscription.in_phrase = subscription.waiting = False
+        for subscription in subscribers:
+            subscription.events.put((kind, data))
+
+    def recalibrate(self):
+        """
+        Recalibrates the threshold on the quietest quarter of the last ten
+        seconds, which is ambient noise even if someone was talking.
+        """
+        quiet = sorted(self.energies)[:max(len(self.energies) // 4, 1)]
+        self.vad.calibrate(quiet)
+
+    def run(self):
+        try:
+            with self.source_factory() as source:
+                if self.calibrate:
+                    self.vad.calibrate([frame_rms(source.read())
+                                        for _ in range(1000 // FRAME_MS)])
+                self.capture(source)
+        except EOFError:
+            pass
+        except Exception as e:
+            print(f"Error: audio capture stopped. {e}")
+        self.publish("eof")
+
+    def capture(self, source):
+        pre_roll = deque(maxlen=10)
+        phrase_frames = 0
+        silent = 0
+        last_calibration = time.monotonic()
+        while True:
+            with self.condition:
+                while (self.idle_pause and not self.stopped
+                       and not any(s.waiting for s in self.subscribers)):
+                    self.condition.wait()
+                if self.stopped:
+                    return
+            frame = source.read()
+            energy = frame_rms(frame)
+            self.energies.append(energy)
+            speech = self.vad.is_speech(energy)
+
+            if not phrase_frames:
+                if speech:
+                    phrase_frames = len(pre_roll) + 1
+                    silent = 0
+                    self.publish("start", list(pre_roll) + [frame])
+                    pre_roll.clear()
+                else:
+                    pre_roll.append(frame)
+                    if (self.recalibrate_every and time.monotonic()
+                            - last_calibration >= self.recalibrate_every):
+                        self.recalibrate()
+                        last_calibration = time.monotonic()
+                continue
+
+            phrase_frames += 1
+            silent = 0 if speech else silent + 1
+            self.publish("frame", frame)
+            if silent >= self.max_silence or phrase_frames >= self.max_phrase:
+                self.publish("end")
+                phrase_frames = 0
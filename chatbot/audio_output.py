@@ -0,0 +1,556 @@
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+FRAME_BYTES = CHANNELS * SAMPLE_WIDTH
+BLOCK_MS = 20
+
+
+class NullSink:
+    """
+    Output that discards the audio, for tests and machines without a sound
+    card. Blocks are consumed in real time unless `realtime` is False, so
+    playback takes as long as it would on a device.
+    """
+    def __init__(self, realtime=True, history=0):
+        """
+        Args:
+            realtime (bool): Pace the writes like a device would.
+            history (int): Number of recent blocks kept in `blocks`.
+        """
+        self.realtime = realtime
+        self.blocks = deque(maxlen=history)
+        self.frames = 0
+        self.clock = None
+
+    def open(self):
+        self.clock = time.monotonic()
+
+    def write(self, data):
+        self.frames += len(data) // FRAME_BYTES
+        if self.blocks.maxlen:
+            self.blocks.append(data)
+        if self.realtime:
+            self.clock += len(data) / FRAME_BYTES / SAMPLE_RATE
+            delay = self.clock - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Do not catch up after a stall.
+                self.clock = time.monotonic()
+
+    def close(self):
+        pass
+
+
+class PyAudioSink:
+    """
+    The default sound card through PyAudio, which `speech_recognition`
+    already needs for the microphone. One output stream stays open for the
+    life of the process.
+    """
+    def __init__(self, block_ms=BLOCK_MS):
+        self.block_ms = block_ms
+        self.audio = None
+        self.stream = None
+
+    def open(self):
+        """
+        Raises:
+            ImportError: If PyAudio is not installed.
+            OSError: If the output device cannot be opened.
+        """
+        import pyaudio
+        self.audio = pyaudio.PyAudio()
+        try:
+            self.stream = self.audio.open(
+                format=pyaudio.paInt16, channels=CHANNELS, rate=SAMPLE_RATE,
+                output=True,
+                frames_per_buffer=SAMPLE_RATE * self.block_ms // 1000
+            )
+        except Exception:
+            self.audio.terminate()
+            raise
+
+    def write(self, data):
+        self.stream.write(data)
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.audio is not None:
+            self.audio.terminate()
+            self.audio = None
+
+
+class Channel:
+    """
+    Bounded buffer of 16-bit stereo PCM between a decoder and the mixer.
+
+    A producer that writes faster than the mixer plays blocks once
+    `max_ms` of audio is buffered, so decoders are paced by the output
+    device. A channel is `active` from `begin` until `finish` has been
+    called and the buffer is played out; the mixer ducks the music while
+    the speech channel is active.
+    """
+    def __init__(self, max_ms=200):
+        self.max_bytes = SAMPLE_RATE * max_ms // 1000 * FRAME_BYTES
+        self.buffer = bytearray()
+        self.busy = False
+        self.changed = threading.Condition()
+
+    @property
+    def active(self):
+        return self.busy or bool(self.buffer)
+
+    def begin(self):
+        with self.changed:
+            self.busy = True
+
+    def finish(self):
+        with self.changed:
+            self.busy = False
+            self.changed.notify_all()
+
+    def write(self, data):
+        with self.changed:
+            self.changed.wait_for(lambda: len(self.buffer) < self.max_bytes)
+            self.buffer += data
+
+    def read(self, size):
+        """
+        Returns up to `size` bytes, a whole number of frames, without
+        waiting.
+        """
+        with self.changed:
+            size = min(size, len(self.buffer)) // FRAME_BYTES * FRAME_BYTES
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            self.changed.notify_all()
+        return data
+
+    def clear(self):
+        """
+        Drops the buffered audio, e.g. when playback is stopped.
+        """
+        with self.changed:
+            self.buffer.clear()
+            self.changed.notify_all()
+
+    def wait_drained(self, timeout=None):
+        """
+        Waits until the buffered audio has been played.
+
+        Returns:
+            bool: False if the timeout expired first.
+        """
+        with self.changed:
+            return self.changed.wait_for(lambda: not self.buffer, timeout)
+
+
+class AudioMixer:
+    """
+    One persistent PCM output stream shared by speech and music.
+
+    A mixer thread reads a block of 16-bit 48 kHz stereo from the "music"
+    and "speech" channels every `block_ms`, adds them and writes the sum to
+    the sink. Silence is written while both are empty, so the device is
+    opened once and never underruns. While speech is active the music is
+    ducked to `duck_gain` and brought back afterwards, both with a ramp of
+    `fade_ms`, so prompts stay audible over a song.
+
+    The volume is a software gain on speech and music alike, applied with
+    a short ramp on the next block; changing it forks nothing. It maps
+    0-100 percent to the square of the fraction, which sounds closer to
+    linear than the fraction does, so 100 is the level of the sound card.
+    With `volume_file`, the volume is read from that file when the mixer
+    is created and written back on every change, so it survives a restart.
+    The mixing needs numpy.
+    """
+    def __init__(self, sink, volume=100, duck_gain=0.3, fade_ms=200,
+                 block_ms=BLOCK_MS, volume_file=None):
+        """
+        Args:
+            sink: `PyAudioSink`, `NullSink` or an object with
+                `open`/`write`/`close`.
+            volume (int): Initial volume in percent, unless `volume_file`
+                holds one.
+            duck_gain (float): Gain of the music while speech plays.
+            fade_ms (float): Duration of the ducking ramps.
+            block_ms (int): Duration of a mixed block.
+            volume_file (str): File the volume is kept in.
+        """
+        self.sink = sink
+        self.volume_file = volume_file
+        self.volume = max(0, min(100, self.load_volume(volume)))
+        self.duck_gain = duck_gain
+        self.block_frames = SAMPLE_RATE * block_ms // 1000
+        self.duck_step = block_ms / fade_ms if fade_ms else 1.0
+        self.music = Channel()
+        self.speech = Channel()
+        self.duck = 1.0
+        self.gains = (self.gain, self.gain)
+        self.lock = threading.RLock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @property
+    def gain(self):
+        return (self.volume / 100) ** 2
+
+    def load_volume(self, default):
+        if self.volume_file is None:
+            return default
+        try:
+            with open(self.volume_file, encoding="utf-8") as file:
+                return int(file.read().strip())
+        except FileNotFoundError:
+            return default
+        except (OSError, ValueError) as e:
+            print(f"Error: unable to read the volume, using {default}%. {e}")
+            return default
+
+    def save_volume(self):
+        if self.volume_file is None:
+            return
+        temp_path = f"{self.volume_file}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                file.write(f"{self.volume}\n")
+            os.replace(temp_path, self.volume_file)
+        except OSError as e:
+            print(f"Error: unable to save the volume. {e}")
+
+    def set_volume(self, volume):
+        """
+        Sets the volume in percent, clamped to 0-100, and saves it.
+
+        Returns:
+            int: The new volume.
+        """
+        with self.lock:
+            volume = max(0, min(100, int(volume)))
+            if volume != self.volume:
+                self.volume = volume
+                self.save_volume()
+            return self.volume
+
+    def change_volume(self, step=10, increase=True):
+        """
+        Changes the volume by `step` percent.
+
+        Returns:
+            bool: False if the volume was already at its limit.
+        """
+        with self.lock:
+            previous = self.volume
+            self.set_volume(previous + (step if increase else -step))
+            return self.volume != previous
+
+    def start(self):
+        """
+        Opens the sink and starts mixing; does nothing if already running.
+
+        Raises:
+            ImportError, OSError: If the sink cannot be opened.
+        """
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            # Fails here rather than in the mixer thread.
+            import numpy  # noqa: F401
+            self.sink.open()
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=2)
+        self.music.clear()
+        self.speech.clear()
+
+    def _next_gains(self):
+        target = self.duck_gain if self.speech.active else 1.0
+        if self.duck < target:
+            self.duck = min(self.duck + self.duck_step, target)
+        elif self.duck > target:
+            self.duck = max(self.duck - self.duck_step, target)
+        gain = self.gain
+        return (self.duck * gain, gain)
+
+    def mix(self, music, speech):
+        """
+        Mixes one block of each channel with the gains ramped from the
+        previous block.
+
+        Returns:
+            bytes: A block of 16-bit stereo PCM.
+        """
+        import numpy as np
+        previous, self.gains = self.gains, self._next_gains()
+        samples = self.block_frames * CHANNELS
+        out = np.zeros(samples, dtype=np.float32)
+        for data, start, end in ((music, previous[0], self.gains[0]),
+                                 (speech, previous[1], self.gains[1])):
+            if not data:
+                continue
+            pcm = np.frombuffer(data, dtype=np.int16)
+            ramp = np.repeat(np.linspace(start, end, self.block_frames,
+                                         endpoint=False, dtype=np.float32),
+                             CHANNELS)
+            out[:len(pcm)] += pcm * ramp[:len(pcm)]
+        np.clip(out, -32768, 32767, out=out)
+        return out.astype(np.int16).tobytes()
+
+    def run(self):
+        size = self.block_frames * FRAME_BYTES
+        silence = bytes(size)
+        try:
+            while not self.stopped.is_set():
+                music = self.music.read(size)
+                speech = self.speech.read(size)
+                if music or speech:
+                    self.sink.write(self.mix(music, speech))
+                else:
+                    # Keep the ramps moving, so the music comes back faded.
+                    self.gains = self._next_gains()
+                    self.sink.write(silence)
+        except Exception as e:
+            print(f"Error: audio output failed. {e}")
+        finally:
+            self.sink.close()
+
+    def feed_fifo(self, path, channel):
+        """
+        Creates a named pipe and copies whatever is written to it into a
+        channel, reopening it after every writer, from a daemon thread.
+
+        Returns:
+            str: The path of the pipe.
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        os.mkfifo(path)
+        threading.Thread(target=self._read_fifo, args=(path, channel),
+                         daemon=True).start()
+        return path
+
+    def _read_fifo(self, path, channel):
+        size = self.block_frames * FRAME_BYTES
+        while not self.stopped.is_set():
+            try:
+                with open(path, "rb", buffering=0) as fifo:
+                    remainder = b""
+                    while True:
+                        data = fifo.read(size)
+                        if not data:
+                            break
+                        data = remainder + data
+                        whole = len(data) // FRAME_BYTES * FRAME_BYTES
+                        remainder = data[whole:]
+                        channel.write(data[:whole])
+            except OSError as e:
+                print(f"Error: unable to read {path}. {e}")
+                time.sleep(1)
+
+    def mpv_args(self, fifo_path):
+        """
+        Returns the mpv options that decode into the music channel instead
+        of the sound card.
+        """
+        self.feed_fifo(fifo_path, self.music)
+        return ["--ao=pcm", f"--ao-pcm-file={fifo_path}",
+                "--ao-pcm-waveheader=no", "--audio-format=s16",
+                f"--audio-samplerate={SAMPLE_RATE}",
+                f"--audio-channels={'stereo' if CHANNELS == 2 else 'mono'}"]
+
+
+def change_device_volume(step=10, increase=True, control="Master"):
+    """
+    Changes the volume of the sound card's mixer with amixer, for when
+    there is no `AudioMixer` to change the gain of (no numpy).
+
+    Args:
+        step (int): The percentage to change the volume by.
+        increase (bool): True to increase the volume, False to decrease.
+        control (str): The mixer control to change.
+    Returns:
+        bool: True if amixer changed the volume, False otherwise.
+    """
+    operation = "+" if increase else "-"
+    try:
+        subprocess.run(["amixer", "set", control, f"{step}%{operation}"],
+                       stdout=subprocess.DEVNULL, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Error: Unable to change volume. {e}")
+        return False
+    return True
+
+
+def open_mixer(volume_file=None):
+    """
+    Opens the audio output: one PyAudio stream that speech and music are
+    mixed into. Without PyAudio or an output device, the audio goes to a
+    null sink so the rest of the bot still runs. Without numpy, which the
+    mixing needs, there is no mixer: mpg123 and mpv play to the sound card
+    themselves and speech no longer ducks the music.
+
+    Args:
+        volume_file (str): File the volume is kept in across restarts.
+
+    Returns:
+        AudioMixer or None: The started mixer, None without numpy.
+    """
+    try:
+        import numpy  # noqa: F401
+    except ImportError as e:
+        print(f"Error: numpy is missing, speech and music are played without "
+              f"the mixer. {e}")
+        return None
+    mixer = AudioMixer(PyAudioSink(), volume_file=volume_file)
+    try:
+        mixer.start()
+    except (ImportError, OSError) as e:
+        print(f"Error: unable to open the audio output, it is discarded. {e}")
+        mixer = AudioMixer(NullSink(), volume_file=volume_file)
+        mixer.start()
+    return mixer
+
+
+class Mpg123Decoder:
+    """
+    Long-lived mpg123 process that decodes MP3 files into a mixer channel.
+
+    It is driven through its remote control interface (`mpg123 -R`) with
+    the responses on stderr and the decoded PCM, resampled to the mixer's
+    format, on stdout, so consecutive files play without forking a new
+    process and speech is mixed over the music instead of fighting it for
+    the sound card. It is the `player` of `StreamingSpeaker`.
+
+    Without a mixer (`mixer` is None, e.g. numpy is missing), mpg123 plays
+    to the sound card itself.
+    """
+    def __init__(self, mixer, command="mpg123"):
+        self.mixer = mixer
+        self.channel = mixer.speech if mixer is not None else None
+        self.command = command
+        self.process = None
+        self.done = threading.Event()
+        self.result = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the mpg123 process and its reader threads if it is not
+        running.
+        """
+        if self.process and self.process.poll() is None:
+            return
+        command = [self.command, "-R", "--remote-err"]
+        if self.channel is not None:
+            command += ["-s", "-e", "s16", "-r", str(SAMPLE_RATE),
+                        "--stereo" if CHANNELS == 2 else "--mono"]
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE if self.channel is not None
+            else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            bufsize=0
+        )
+        if self.channel is not None:
+            threading.Thread(target=self._read_pcm, args=(self.process,),
+                             daemon=True).start()
+        threading.Thread(target=self._read_status, args=(self.process,),
+                         daemon=True).start()
+
+    def _read_pcm(self, process):
+        remainder = b""
+        while True:
+            data = process.stdout.read(4096)
+            if not data:
+                return
+            data = remainder + data
+            whole = len(data) // FRAME_BYTES * FRAME_BYTES
+            remainder = data[whole:]
+            self.channel.write(data[:whole])
+
+    def _read_status(self, process):
+        for line in process.stderr:
+            line = line.decode("utf-8", "replace").strip()
+            if line.startswith("@P 0"):
+                self.result = True
+                self.done.set()
+            elif line.startswith("@E"):
+                print(f"Error playing speech: {line}")
+                self.result = False
+                self.done.set()
+        self.result = False
+        self.done.set()
+
+    def play(self, mp3_file):
+        """
+        Plays an MP3 file and waits until it has been heard.
+
+        Args:
+            mp3_file (str): Path of the file to play.
+
+        Returns:
+            bool: True if the file was played or stopped, False if the
+            player failed.
+        """
+        with self.lock:
+            try:
+                if self.channel is not None:
+                    self.mixer.start()
+                    self.channel.begin()
+                self.start()
+                self.done.clear()
+                self.process.stdin.write(f"LOAD {mp3_file}\n".encode("utf-8"))
+                self.process.stdin.flush()
+                self.done.wait()
+                if self.result:
+                    if self.channel is not None:
+                        self.channel.wait_drained()
+                    return True
+            except (OSError, ValueError) as e:
+                print(f"Error: mpg123 player failed. {e}")
+            finally:
+                if self.channel is not None:
+                    self.channel.finish()
+            self.close()
+            return False
+
+    def stop(self):
+        """
+        Stops the file that is currently playing.
+        """
+        if self.process and self.process.poll() is None:
+            try:
+                self.process.stdin.write(b"STOP\n")
+                self.process.stdin.flush()
+            except (OSError, ValueError):
+                pass
+        if self.channel is not None:
+            self.channel.clear()
+
+    def close(self):
+        """
+        Terminates the mpg123 process.
+        """
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=3)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
@@ -0,0 +1,89 @@
+"""
+Cost of the in-process audio mixer against forking a tool per action.
+
+- volume: `AudioMixer.change_volume` against forking a process per change,
+  like `amixer set Master 10%+` did before the mixer (`--command`, `true`
+  by default, since amixer may not be installed).
+- mixing: CPU time to mix one second of music and speech with ducking,
+  as a share of real time, i.e. the load the mixer thread adds while both
+  play.
+- ducking: the music level, block by block, while a short prompt plays
+  over it on a `NullSink`.
+
+Usage:
+    python3 bench/bench_audio_output.py [--repeat 200] [--seconds 10]
+        [--command true]
+"""
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from audio_output import (FRAME_BYTES, SAMPLE_RATE, AudioMixer,  # noqa: E402
+                          NullSink)
+
+
+def tone(seconds, level):
+    return (np.full(int(SAMPLE_RATE * seconds) * 2, level,
+                    dtype=np.int16)).tobytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--command", default="true",
+                        help="stand-in for the amixer call")
+    args = parser.parse_args()
+
+    mixer = AudioMixer(NullSink(realtime=False))
+    start = time.perf_counter()
+    for index in range(args.repeat):
+        mixer.change_volume(10, increase=index % 2 == 0)
+    in_process = (time.perf_counter() - start) / args.repeat
+    command = shlex.split(args.command)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        subprocess.run(command, check=True)
+    forked = (time.perf_counter() - start) / args.repeat
+    print(f"volume change: {in_process * 1e6:.1f} us in process, "
+          f"{forked * 1e3:.2f} ms forking {args.command!r}")
+
+    size = mixer.block_frames * FRAME_BYTES
+    music, speech = tone(1, 8000)[:size], tone(1, 4000)[:size]
+    blocks = int(args.seconds * 1000 / 20)
+    mixer.speech.begin()
+    start = time.process_time()
+    for index in range(blocks):
+        mixer.mix(music, speech if index % 100 < 50 else b"")
+    cpu = (time.process_time() - start) / args.seconds
+    mixer.speech.finish()
+    print(f"mixing: {cpu:.2%} of one core while music and speech play")
+
+    sink = NullSink(history=100)
+    mixer = AudioMixer(sink, volume=100)
+    mixer.start()
+    threading.Thread(target=mixer.music.write, args=(tone(1.2, 10000),),
+                     daemon=True).start()
+    time.sleep(0.2)
+    mixer.speech.begin()
+    mixer.speech.write(tone(0.4, 0))
+    mixer.speech.finish()
+    mixer.speech.wait_drained()
+    time.sleep(0.5)
+    mixer.stop()
+    levels = [int(np.abs(np.frombuffer(block, dtype=np.int16)).max())
+              for block in sink.blocks]
+    print("ducking, music peak per 20 ms block:")
+    print(" ".join(str(level) for level in levels))
+
+
+if __name__ == "__main__":
+    main()
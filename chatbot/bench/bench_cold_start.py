@@ -0,0 +1,107 @@
+"""
+Cold start of chatbot.py: import time and time-to-first-greeting.
+
+Runs `python -X importtime -c "import chatbot"` in a fresh interpreter and
+lists the most expensive imports, then starts `ChatBot().main()` in fresh
+interpreters with and without fast start. In the child, the internet probe
+is replaced by a fixed delay, `speak` only records when it is called and
+the first `listen` ends the conversation, so the numbers are the time from
+process start until the greeting would play and until the bot listens.
+Fast start listens after the modules of `PRELOAD_MODULES` are imported;
+the sequential start imports them later, when they are first used.
+
+Usage:
+    python3 bench/bench_cold_start.py [--runs 5] [--probe-ms 50]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CHATBOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import sys, time
+sys.path.insert(0, {chatbot_dir!r})
+from chatbot import ChatBot
+
+def check_internet(self, *args, **kwargs):
+    time.sleep({probe_s})
+    return True
+
+def speak(self, text):
+    if not hasattr(ChatBot, "greeted"):
+        ChatBot.greeted = True
+        print("greeting", time.time(), flush=True)
+
+def listen(self, language="vi-VN", audio=False):
+    print("listening", time.time(), flush=True)
+    raise EOFError()
+
+ChatBot.check_internet = check_internet
+ChatBot.speak = speak
+ChatBot.listen = listen
+ChatBot(chatbot_dir={chatbot_dir!r}).main(fast_start={fast_start})
+"""
+
+
+def import_times(top):
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import chatbot"],
+        cwd=CHATBOT_DIR, capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in output.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1]), parts[2].rstrip()))
+    total = next(cumulative for cumulative, name in rows
+                 if name.strip() == "chatbot")
+    # Direct imports of chatbot are indented by one level.
+    direct = sorted((row for row in rows if row[1].startswith("   ")
+                     and not row[1].startswith("     ")), reverse=True)
+    return total, direct[:top]
+
+
+def cold_start(fast_start, probe_s):
+    code = CHILD.format(chatbot_dir=CHATBOT_DIR, probe_s=probe_s,
+                        fast_start=fast_start)
+    start = time.time()
+    output = subprocess.run([sys.executable, "-c", code], cwd=CHATBOT_DIR,
+                            capture_output=True, text=True, check=True).stdout
+    events = {}
+    for line in output.splitlines():
+        name, _, stamp = line.partition(" ")
+        if name in ("greeting", "listening") and name not in events:
+            events[name] = float(stamp) - start
+    return events["greeting"], events["listening"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--probe-ms", type=float, default=50,
+                        help="simulated internet probe latency")
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    total, top = import_times(args.top)
+    print(f"import chatbot: {total / 1e3:.1f} ms")
+    for cumulative, name in top:
+        print(f"  {cumulative / 1e3:8.1f} ms {name.strip()}")
+
+    for fast_start in (False, True):
+        runs = [cold_start(fast_start, args.probe_ms / 1e3)
+                for _ in range(args.runs)]
+        greeting = statistics.median(run[0] for run in runs)
+        listening = statistics.median(run[1] for run in runs)
+        name = "fast start" if fast_start else "sequential"
+        print(f"{name:>10}: first greeting {greeting * 1e3:6.0f} ms, "
+              f"listening {listening * 1e3:6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Start latency and bandwidth of repeated YouTube requests with the media library.
+
+Replays a Zipf-distributed stream of song requests, where a few songs are
+asked for over and over like children do, through `YouTubeResolver`:
+
+- baseline: the resolver alone, with its in-memory caches.
+- library: the resolver with a `MediaLibrary`, which remembers searches on
+  disk and downloads the tracks played more than `--download-after` times.
+
+The service is restarted every `--session` requests, which empties the
+in-memory caches but not the library. pytube's `Search` and yt-dlp are
+replaced by stubs that sleep for `--search-ms` and `--extract-ms` (and
+`--download-ms` for a download) and count their calls; a streamed or
+downloaded track counts as `--track-kb`. Background downloads are waited
+for after each request, so the numbers do not depend on thread timing.
+
+Prints, per run, the mean and p95 time from the keyword to a playable URL
+or file, the searches and yt-dlp runs, and the kilobytes fetched.
+
+Usage:
+    python3 bench/bench_media.py [--requests 200] [--songs 40] [--zipf 1.2]
+        [--session 50] [--search-ms 100] [--extract-ms 200]
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media_library import MediaLibrary  # noqa: E402
+from youtube_resolver import YouTubeResolver  # noqa: E402
+
+FAKE_YT_DLP = """#!{python}
+import sys, time
+args = sys.argv[1:]
+with open({log!r}, "a") as log:
+    log.write(("download" if "-o" in args else "extract") + "\\n")
+if "-o" in args:
+    time.sleep({download_s})
+    with open(args[args.index("-o") + 1], "wb") as file:
+        file.write(bytes({track_bytes}))
+else:
+    time.sleep({extract_s})
+    print("https://audio.example/" + args[-1][-11:] + "?expire=4102444800")
+"""
+
+
+def install_stubs(work_dir, args):
+    """
+    Replaces pytube's `Search` and yt-dlp; returns the yt-dlp path, its
+    call log and the list of searched keywords.
+    """
+    log = os.path.join(work_dir, "yt-dlp.log")
+    command = os.path.join(work_dir, "yt-dlp")
+    with open(command, "w") as file:
+        file.write(FAKE_YT_DLP.format(
+            python=sys.executable, log=log,
+            download_s=args.download_ms / 1000,
+            extract_s=args.extract_ms / 1000,
+            track_bytes=args.track_kb * 1024))
+    os.chmod(command, 0o755)
+    os.environ["PATH"] = work_dir + os.pathsep + os.environ["PATH"]
+    searches = []
+
+    class Video:
+        def __init__(self, watch_url):
+            self.watch_url = watch_url
+
+    class Search:
+        def __init__(self, keyword):
+            time.sleep(args.search_ms / 1000)
+            searches.append(keyword)
+            self.results = [Video(f"https://www.youtube.com/watch?v="
+                                  f"{abs(hash(keyword)) % 10 ** 9:09d}{index:02d}")
+                            for index in range(5)]
+
+    sys.modules["pytube"] = types.SimpleNamespace(Search=Search)
+    return command, log, searches
+
+
+def make_requests(args):
+    rng = random.Random(args.seed)
+    songs = [f"bài hát số {index}" for index in range(args.songs)]
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(args.songs)]
+    return rng.choices(songs, weights, k=args.requests)
+
+
+def replay(requests, args, work_dir, command, log, searches, with_library):
+    searches.clear()
+    if os.path.exists(log):
+        os.remove(log)
+    library = None
+    if with_library:
+        library = MediaLibrary(os.path.join(work_dir, "media.db"),
+                               os.path.join(work_dir, "media_cache"),
+                               max_bytes=args.cache_mb * 1024 * 1024,
+                               download_after=args.download_after,
+                               command=command)
+    latencies = []
+    streamed = 0
+    for index, keyword in enumerate(requests):
+        if index % args.session == 0:
+            # A restart of the service.
+            resolver = YouTubeResolver(library=library)
+        start = time.perf_counter()
+        watch_url = resolver.search(keyword)[0]
+        resolver.extract(watch_url)
+        latencies.append(time.perf_counter() - start)
+        if library is None or not library.local_file(watch_url):
+            streamed += args.track_kb
+        if library is not None:
+            download = library.record_play(watch_url)
+            if download is not None:
+                download.result()
+    with open(log) as file:
+        calls = file.read().split()
+    if library is not None:
+        library.close()
+    latencies.sort()
+    return {
+        "mean_ms": statistics.mean(latencies) * 1e3,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1e3,
+        "searches": len(searches),
+        "extracts": calls.count("extract"),
+        "downloads": calls.count("download"),
+        "kb": streamed + calls.count("download") * args.track_kb,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--songs", type=int, default=40)
+    parser.add_argument("--zipf", type=float, default=1.2)
+    parser.add_argument("--session", type=int, default=50,
+                        help="requests between restarts of the service")
+    parser.add_argument("--search-ms", type=float, default=100)
+    parser.add_argument("--extract-ms", type=float, default=200)
+    parser.add_argument("--download-ms", type=float, default=400)
+    parser.add_argument("--track-kb", type=int, default=3000)
+    parser.add_argument("--download-after", type=int, default=2)
+    parser.add_argument("--cache-mb", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    requests = make_requests(args)
+    print(f"{len(requests)} requests, {len(set(requests))} distinct songs, "
+          f"restart every {args.session}")
+    print(f"{'run':>8} {'mean ms':>8} {'p95 ms':>8} {'searches':>9} "
+          f"{'extracts':>9} {'downloads':>10} {'MB':>8}")
+    work_dir = tempfile.mkdtemp(prefix="chatbot-media-")
+    try:
+        command, log, searches = install_stubs(work_dir, args)
+        for name, with_library in (("baseline", False), ("library", True)):
+            result = replay(requests, args, work_dir, command, log, searches,
+                            with_library)
+            print(f"{name:>8} {result['mean_ms']:>8.1f} "
+                  f"{result['p95_ms']:>8.1f} {result['searches']:>9} "
+                  f"{result['extracts']:>9} {result['downloads']:>10} "
+                  f"{result['kb'] / 1024:>8.1f}")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Accuracy and latency of matching with and without `normalize_text`.
+
+Replays a labeled corpus of recognizer transcripts (bench/corpus/
+normalization.json by default: diacritics dropped or misplaced, digits,
+punctuation, odd spacing and case) through:
+
+- routing: the raw check chain (substring tests and `process.extractOne`
+  on the lowercased text, as before normalization) against `IntentRouter`,
+  with the intents of the main loop or of youtube mode in priority order.
+- responses: the raw `linear_scan` over the shipped questions against
+  `KnowledgeStore` on a copy of the shipped database.
+
+Each transcript is lowercased first, like `ChatBot.listen` does. Prints the
+share of transcripts that reach the labeled intent, option or answer and
+the mean latency per transcript, with the options normalized at load time.
+
+Usage:
+    python3 bench/bench_normalization.py [--corpus FILE] [--repeat 20]
+        [--verbose]
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+CHATBOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CHATBOT_DIR)
+
+from fuzzywuzzy import process  # noqa: E402
+
+from config import OPTION_KEYS, load_config  # noqa: E402
+from intent_router import IntentRouter, VOLUME_KEYWORDS  # noqa: E402
+from knowledge_store import KnowledgeStore  # noqa: E402
+from retrieval import linear_scan  # noqa: E402
+
+CORPUS_PATH = os.path.join(CHATBOT_DIR, "bench", "corpus", "normalization.json")
+DATA_DIR = os.path.join(CHATBOT_DIR, "data")
+
+INTENTS = {
+    "main": ("volume_up", "volume_down", "story", "enter_youtube"),
+    "youtube": ("volume_up", "volume_down", "stop_video", "exit_youtube",
+                "hello"),
+}
+
+
+def raw_route(text, intents, keywords, options):
+    for intent in intents:
+        if intent in keywords:
+            if any(keyword in text for keyword in keywords[intent]):
+                return intent, None
+        else:
+            match, score = process.extractOne(text, options[intent])
+            if score >= 75:
+                return intent, match
+    return None, None
+
+
+def normalized_route(text, intents, router):
+    route = router.route(text, intents)
+    return route.intent, route.option
+
+
+def route_ok(result, case):
+    intent, option = result
+    return intent == case["intent"] and (
+        "option" not in case or option == case["option"])
+
+
+def timed(func, cases, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [func(case) for case in cases]
+    return results, (time.perf_counter() - start) / (repeat * len(cases))
+
+
+def report(name, cases, results, check, elapsed, verbose):
+    failures = [(case, result) for case, result in zip(cases, results)
+                if not check(result, case)]
+    correct = len(cases) - len(failures)
+    print(f"  {name:>10}: {correct:3d}/{len(cases)} "
+          f"({correct / len(cases):6.1%}), {elapsed * 1e6:8.1f} us/transcript")
+    if verbose:
+        for case, result in failures:
+            print(f"{'':16}{case['text']!r} -> {result!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", default=CORPUS_PATH,
+                        help="labeled transcripts, as in the default corpus")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--verbose", action="store_true",
+                        help="list the transcripts that are missed")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as file:
+        corpus = json.load(file)
+    config = load_config(os.path.join(DATA_DIR, "options.json"))
+    keywords = {**VOLUME_KEYWORDS, "hello": [config.voice_dict["hello"]]}
+    options = {key: config.options[key] for key in OPTION_KEYS}
+
+    start = time.perf_counter()
+    # Without the utterance cache, so repeated passes score every transcript.
+    router = IntentRouter(keywords, options, cache_size=0)
+    build = time.perf_counter() - start
+    print(f"router build: {build * 1e3:.2f} ms")
+
+    routes = [dict(case, text=case["text"].lower()) for case in corpus["routes"]]
+    print(f"routing ({len(routes)} transcripts):")
+    results, elapsed = timed(
+        lambda case: raw_route(case["text"], INTENTS[case["mode"]],
+                               keywords, options), routes, args.repeat)
+    report("raw", routes, results, route_ok, elapsed, args.verbose)
+    results, elapsed = timed(
+        lambda case: normalized_route(case["text"], INTENTS[case["mode"]],
+                                      router), routes, args.repeat)
+    report("normalized", routes, results, route_ok, elapsed, args.verbose)
+
+    work_dir = tempfile.mkdtemp(prefix="chatbot-normalization-")
+    try:
+        db_path = os.path.join(work_dir, "chatbot.db")
+        shutil.copy(os.path.join(DATA_DIR, "chatbot.db"), db_path)
+        conn = sqlite3.connect(db_path)
+        answers = dict(conn.execute("SELECT question, answer FROM responses "
+                                    "ORDER BY id DESC"))
+        responses = [dict(case, text=case["text"].lower(),
+                          answer=answers.get(case["question"]))
+                     for case in corpus["responses"]]
+        print(f"responses ({len(responses)} transcripts):")
+        results, elapsed = timed(
+            lambda case: linear_scan(conn, case["text"]), responses,
+            args.repeat)
+        report("raw", responses, results,
+               lambda result, case: result == case["answer"], elapsed,
+               args.verbose)
+        conn.close()
+
+        store = KnowledgeStore(db_path)
+        results, elapsed = timed(lambda case: store.get_answer(case["text"]),
+                                 responses, args.repeat)
+        report("normalized", responses, results,
+               lambda result, case: result == case["answer"], elapsed,
+               args.verbose)
+        store.close()
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Offline end-to-end benchmark of ChatBot with JSON results.
+
+Drives the real ChatBot with no microphone, network or audio device:
+
+- main: `ChatBot.main()` on replayed utterances, covering routing,
+  stories, answers and volume commands.
+- youtube: the same loop in youtube mode, covering search, stream
+  extraction, playback, volume and stop commands.
+- responses: `get_response` over synthetic response tables from 50 to 100k
+  rows.
+
+The utterances come from a directory of `*.wav` recordings with a `.txt`
+transcript each (--corpus). Without one, they are synthesized from the
+transcripts in bench/corpus/utterances.json as tone bursts of about the
+length of the spoken text. Recognition replays the transcripts. gTTS is
+replaced by a module that writes silent MP3s into the real TTS cache.
+pytube's `Search` returns fixed watch URLs. yt-dlp, mpg123 and amixer are
+small scripts on a private PATH, mpv is the `FakeMpvServer` of the tests
+and the audio mixer writes to a `NullSink`.
+
+Every scenario runs in its own interpreter so its peak RSS is its own. The
+report (turns per second, per-stage latency percentiles from `Metrics`,
+peak RSS) is printed as JSON, to be compared across commits. A
+conversation scenario in which no turn is handled fails the run.
+
+Usage:
+    python3 bench/bench_offline.py [--output results.json]
+        [--scenarios main youtube responses] [--corpus DIR]
+        [--sizes 50 1000 10000 100000] [--tts-ms 0] [--speech-ms 0]
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import random
+import resource
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import wave
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CHATBOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, CHATBOT_DIR)
+
+SCENARIOS = ("main", "youtube", "responses")
+CORPUS_PATH = os.path.join(BENCH_DIR, "corpus", "utterances.json")
+
+# One silent MPEG-1 Layer III frame, 128 kbit/s at 44.1 kHz.
+SILENT_FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+
+# Decodes every file to {speech_s} seconds of silence in the mixer's format.
+FAKE_MPG123 = """#!{python}
+import sys
+for line in sys.stdin:
+    if line.startswith("LOAD"):
+        print("@P 2", file=sys.stderr, flush=True)
+        sys.stdout.buffer.write(bytes(int({speech_s} * 48000) * 4))
+        sys.stdout.buffer.flush()
+        print("@P 0", file=sys.stderr, flush=True)
+"""
+
+FAKE_YT_DLP = """#!{python}
+import hashlib, sys, time
+video = hashlib.md5(sys.argv[-1].encode()).hexdigest()[:11]
+print(f"https://media.invalid/audio/{{video}}?expire={{int(time.time()) + 21600}}")
+"""
+
+FAKE_AMIXER = """#!{python}
+"""
+
+
+def write_script(bin_dir, name, source, **values):
+    path = os.path.join(bin_dir, name)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(source.format(python=sys.executable, **values))
+    os.chmod(path, 0o755)
+
+
+def install_stubs(work_dir, tts_s, speech_s):
+    """
+    Replaces every service that needs a network or a device.
+    """
+    bin_dir = os.path.join(work_dir, "bin")
+    os.makedirs(bin_dir)
+    write_script(bin_dir, "mpg123", FAKE_MPG123, speech_s=speech_s)
+    write_script(bin_dir, "yt-dlp", FAKE_YT_DLP)
+    write_script(bin_dir, "amixer", FAKE_AMIXER)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+
+    class SilentTTS:
+        def __init__(self, text, lang="vi"):
+            self.text = text
+
+        def save(self, path):
+            time.sleep(tts_s)
+            frames = max(len(self.text) // 4, 1)
+            with open(path, "wb") as file:
+                file.write(SILENT_FRAME * frames)
+
+    class Video:
+        def __init__(self, watch_url):
+            self.watch_url = watch_url
+
+    class Search:
+        def __init__(self, keyword):
+            digest = hashlib.md5(keyword.encode("utf-8")).hexdigest()
+            self.results = [Video(f"https://www.youtube.com/watch?v="
+                                  f"{digest[index:index + 11]}")
+                            for index in range(5)]
+
+    sys.modules["gtts"] = types.SimpleNamespace(gTTS=SilentTTS)
+    sys.modules["pytube"] = types.SimpleNamespace(Search=Search)
+
+
+def synthesize_corpus(transcripts, out_dir):
+    """
+    Writes a 16 kHz tone burst per transcript, about 70 ms per character,
+    with its transcript next to it.
+    """
+    os.makedirs(out_dir)
+    for index, text in enumerate(transcripts):
+        base = os.path.join(out_dir, f"{index:03d}")
+        samples = int(16000 * min(max(len(text) * 0.07, 0.4), 4))
+        data = b"".join(
+            struct.pack("<h", int(4000 * math.sin(2 * math.pi * 220 * i / 16000)))
+            for i in range(samples)
+        )
+        with wave.open(f"{base}.wav", "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(16000)
+            wav.writeframes(data)
+        with open(f"{base}.txt", "w", encoding="utf-8") as file:
+            file.write(text)
+    return out_dir
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_bot(work_dir, corpus_dir):
+    from audio_output import AudioMixer, NullSink
+    from chatbot import ChatBot
+    from mpv_player import MpvPlayer
+    from speech_input import replay_speech_input
+    from tests.fake_mpv import FakeMpvServer
+
+    def null_mixer(bot):
+        mixer = AudioMixer(NullSink())
+        mixer.start()
+        return mixer
+
+    bot_dir = os.path.join(work_dir, "bot")
+    os.makedirs(os.path.join(bot_dir, "data"))
+    for name in ("options.json", "chatbot.db"):
+        shutil.copy(os.path.join(CHATBOT_DIR, "data", name),
+                    os.path.join(bot_dir, "data", name))
+    ChatBot.init_mixer = null_mixer
+    bot = ChatBot(chatbot_dir=bot_dir)
+    bot.check_internet = lambda *args, **kwargs: True
+    bot.barge_in = False
+    bot.speech_input = replay_speech_input(corpus_dir)
+    bot.speech_input.metrics = bot.metrics
+    socket_path = os.path.join(work_dir, "mpv.sock")
+    # Tracks last until a stop command, like a real song would.
+    server = FakeMpvServer(socket_path, duration=30)
+    bot.player = MpvPlayer(socket_path=socket_path, spawn=False)
+    return bot, server
+
+
+def run_conversation(args, work_dir, transcripts):
+    corpus_dir = args.corpus or synthesize_corpus(
+        transcripts, os.path.join(work_dir, "corpus"))
+    bot, server = make_bot(work_dir, corpus_dir)
+    start = time.perf_counter()
+    try:
+        bot.main(fast_start=False)
+    finally:
+        elapsed = time.perf_counter() - start
+        bot.player.close()
+        bot.speaker.player.close()
+        server.close()
+    summary = bot.metrics.summary()
+    utterances = summary.get("listen_recognition", {}).get("count", 0)
+    turns = summary.get("turn", {}).get("count", 0)
+    if not turns:
+        # Nothing was measured, e.g. the recordings could not be replayed.
+        sys.exit(f"ERROR: no turns in {args.child}, {utterances} "
+                 f"utterances recognized")
+    return {
+        "utterances": utterances,
+        "turns": turns,
+        "seconds": elapsed,
+        "turns_per_second": turns / elapsed if elapsed else None,
+        "stages": summary,
+        "player_commands": len(server.commands),
+    }
+
+
+def run_responses(args, work_dir, transcripts):
+    from bench_retrieval import build_table, load_seed_rows, make_queries
+    from knowledge_store import KnowledgeStore
+    from metrics import Metrics
+
+    rng = random.Random(0)
+    seed_rows = load_seed_rows()
+    results = {}
+    for size in args.sizes:
+        conn = build_table(size, seed_rows, rng)
+        queries = make_queries(conn, args.queries, rng)
+        rows = conn.execute("SELECT question, answer FROM responses").fetchall()
+        conn.close()
+        store = KnowledgeStore(os.path.join(work_dir, f"responses-{size}.db"))
+        start = time.perf_counter()
+        store.import_rows((question, answer, []) for question, answer in rows)
+        build = time.perf_counter() - start
+        metrics = Metrics()
+        start = time.perf_counter()
+        answered = 0
+        for query in queries:
+            with metrics.time("get_response"):
+                answered += store.get_answer(query) is not None
+        elapsed = time.perf_counter() - start
+        results[str(size)] = {
+            "build_seconds": build,
+            "queries": len(queries),
+            "answered": answered,
+            "queries_per_second": len(queries) / elapsed if elapsed else None,
+            "stages": metrics.summary(),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        store.close()
+    return {"sizes": results}
+
+
+def run_child(args):
+    with open(CORPUS_PATH, encoding="utf-8") as file:
+        corpus = json.load(file)
+    work_dir = tempfile.mkdtemp(prefix="chatbot-bench-")
+    try:
+        install_stubs(work_dir, args.tts_ms / 1e3, args.speech_ms / 1e3)
+        sys.path.insert(0, BENCH_DIR)
+        if args.child == "responses":
+            result = run_responses(args, work_dir, None)
+        else:
+            result = run_conversation(args, work_dir, corpus[args.child])
+        result["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              cwd=CHATBOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS,
+                        default=list(SCENARIOS))
+    parser.add_argument("--corpus",
+                        help="directory of *.wav recordings with .txt transcripts")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[50, 1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--tts-ms", type=float, default=0,
+                        help="simulated gTTS latency per phrase")
+    parser.add_argument("--speech-ms", type=float, default=0,
+                        help="simulated playback time per spoken chunk")
+    parser.add_argument("--output", help="write the JSON report to a file")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_child(args)
+        print("RESULT " + json.dumps(result))
+        return
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "time": time.time(),
+        "options": {"corpus": args.corpus, "sizes": args.sizes,
+                    "queries": args.queries, "tts_ms": args.tts_ms,
+                    "speech_ms": args.speech_ms},
+        "scenarios": {},
+    }
+    for scenario in args.scenarios:
+        command = [sys.executable, os.path.abspath(__file__),
+                   "--child", scenario, "--queries", str(args.queries),
+                   "--tts-ms", str(args.tts_ms),
+                   "--speech-ms", str(args.speech_ms),
+                   "--sizes", *map(str, args.sizes)]
+        if args.corpus:
+            command += ["--corpus", os.path.abspath(args.corpus)]
+        output = subprocess.run(command, capture_output=True, text=True)
+        lines = [line for line in output.stdout.splitlines()
+                 if line.startswith("RESULT ")]
+        if output.returncode != 0 or not lines:
+            print(output.stdout + output.stderr, file=sys.stderr)
+            print(f"ERROR: scenario {scenario} failed", file=sys.stderr)
+            sys.exit(1)
+        report["scenarios"][scenario] = json.loads(lines[-1][len("RESULT "):])
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
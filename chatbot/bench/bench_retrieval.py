@@ -0,0 +1,141 @@
+"""
+Benchmark of `ResponseIndex` against the original full-table scan.
+
+Builds synthetic `responses` tables of 50, 5k and 50k rows from the
+syllables of the shipped questions, checks that both lookups return the
+same answer for every query and prints the mean lookup latency.
+
+Usage:
+    python3 bench/bench_retrieval.py [--queries 200] [--sizes 50 5000 50000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retrieval import ResponseIndex, linear_scan  # noqa: E402
+
+DATA_DB = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "data", "chatbot.db")
+
+
+def load_seed_rows():
+    """
+    Reads the shipped question/answer pairs.
+
+    Returns:
+        list: (question, answer) tuples.
+    """
+    conn = sqlite3.connect(DATA_DB)
+    rows = conn.execute("SELECT question, answer FROM responses").fetchall()
+    conn.close()
+    return rows
+
+
+def build_table(size, seed_rows, rng):
+    """
+    Creates an in-memory `responses` table with `size` rows. The shipped
+    rows come first, the rest are random syllable sequences.
+
+    Args:
+        size (int): Number of rows.
+        seed_rows (list): Shipped (question, answer) tuples.
+        rng (random.Random): Random generator.
+
+    Returns:
+        sqlite3.Connection: The populated connection.
+    """
+    syllables = sorted({word for question, _ in seed_rows
+                        for word in question.split()})
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""
+    CREATE TABLE responses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL
+    )
+    """)
+    rows = list(seed_rows[:size])
+    while len(rows) < size:
+        question = " ".join(rng.choice(syllables)
+                            for _ in range(rng.randint(1, 6)))
+        rows.append((question, rng.choice(seed_rows)[1]))
+    conn.executemany("INSERT INTO responses (question, answer) VALUES (?, ?)",
+                     rows)
+    conn.commit()
+    return conn
+
+
+def make_queries(conn, count, rng):
+    """
+    Samples queries from the stored questions with small typos, plus a few
+    unrelated inputs that should not match.
+
+    Args:
+        conn (sqlite3.Connection): The populated connection.
+        count (int): Number of queries.
+        rng (random.Random): Random generator.
+
+    Returns:
+        list: Query strings.
+    """
+    questions = [row[0] for row in conn.execute("SELECT question FROM responses")]
+    queries = []
+    for _ in range(count):
+        text = list(rng.choice(questions))
+        for _ in range(rng.randint(0, 2)):
+            if text:
+                text[rng.randrange(len(text))] = rng.choice("aăâeêiooôơuưy ")
+        queries.append("".join(text))
+    queries += ["mở bài hát sơn tùng", "hôm nay thời tiết thế nào", "a"]
+    return queries
+
+
+def timed(func, queries):
+    """
+    Runs a lookup over all queries.
+
+    Returns:
+        tuple: (answers, mean seconds per query)
+    """
+    start = time.perf_counter()
+    answers = [func(query) for query in queries]
+    return answers, (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 5000, 50000])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    seed_rows = load_seed_rows()
+    print(f"{'rows':>8} {'build ms':>10} {'scan ms':>10} {'index ms':>10} "
+          f"{'speedup':>8}")
+    for size in args.sizes:
+        conn = build_table(size, seed_rows, rng)
+        queries = make_queries(conn, args.queries, rng)
+
+        start = time.perf_counter()
+        index = ResponseIndex(conn)
+        build = time.perf_counter() - start
+
+        expected, scan = timed(lambda q: linear_scan(conn, q), queries)
+        actual, lookup = timed(index.get_answer, queries)
+        mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+        if mismatches:
+            print(f"ERROR: {mismatches} answers differ from the full scan")
+            sys.exit(1)
+        print(f"{size:>8} {build * 1e3:>10.1f} {scan * 1e3:>10.3f} "
+              f"{lookup * 1e3:>10.3f} {scan / lookup:>7.1f}x")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Per-utterance routing cost of `IntentRouter` vs the original check chain.
+
+The chain normalizes the utterance, runs the six volume substring tests
+and then `process.extractOne` with `normalize_text` as the processor
+against the story and enter-youtube options (main loop), or against the
+exit-youtube options plus the hello test (youtube mode), normalizing every
+option on every call. Both paths must pick the same branch for every utterance. The
+router is timed on utterances it sees for the first time and on repeated
+utterances served from its cache.
+
+Usage:
+    python3 bench/bench_router.py [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzywuzzy import fuzz, process  # noqa: E402
+
+from intent_router import IntentRouter, VOLUME_KEYWORDS  # noqa: E402
+from text_normalizer import normalize_text  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "data")
+
+
+def load_options():
+    with open(os.path.join(DATA_DIR, "options.json"), encoding="utf-8") as file:
+        data = json.load(file)
+    data["Other"] = {key: value for item in data["Other"]
+                     for key, value in item.items()}
+    return data
+
+
+def load_utterances(options):
+    conn = sqlite3.connect(os.path.join(DATA_DIR, "chatbot.db"))
+    utterances = [row[0] for row in conn.execute("SELECT question FROM responses")]
+    conn.close()
+    for key in ("story", "enter_youtube", "exit_youtube", "stop_video"):
+        utterances += [option.lower() for option in options[key]]
+    utterances += ["tăng âm lượng lên", "giảm volume đi", "mở bài hát sơn tùng",
+                   "kể chuyện thánh gióng đi", "phát youtube nhạc thiếu nhi",
+                   "xin chào bạn", "hôm nay trời đẹp quá"]
+    return utterances
+
+
+SCORER = partial(fuzz.WRatio, full_process=False)
+
+
+def extract_one(text, options):
+    return process.extractOne(text, options, processor=normalize_text,
+                              scorer=SCORER)
+
+
+def is_volume(text):
+    text = normalize_text(text)
+    return ("tang am" in text or "tang volum" in text or "tang volume" in text
+            or "giam am" in text or "giam volum" in text
+            or "giam volume" in text)
+
+
+def chain_main(text, options):
+    if is_volume(text):
+        return "volume"
+    match, score = extract_one(text, options["story"])
+    if score >= 75:
+        return ("story", match)
+    match, score = extract_one(text, options["enter_youtube"])
+    if score >= 75:
+        return ("enter_youtube", match)
+    return None
+
+
+def chain_youtube(text, options):
+    if is_volume(text):
+        return "volume"
+    match, score = extract_one(text, options["exit_youtube"])
+    if score >= 75:
+        return ("exit_youtube", match)
+    if normalize_text(options["Other"]["hello"]) in normalize_text(text):
+        return "hello"
+    return None
+
+
+def router_main(text, router):
+    route = router.route(text, ("volume_up", "volume_down", "story",
+                                "enter_youtube"))
+    if route.intent in VOLUME_KEYWORDS:
+        return "volume"
+    return (route.intent, route.option) if route.intent else None
+
+
+def router_youtube(text, router):
+    route = router.route(text, ("volume_up", "volume_down", "exit_youtube",
+                                "hello"))
+    if route.intent in VOLUME_KEYWORDS:
+        return "volume"
+    if route.intent == "hello":
+        return "hello"
+    return (route.intent, route.option) if route.intent else None
+
+
+def timed(func, utterances, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [func(text, arg) for text in utterances]
+    return results, (time.perf_counter() - start) / (repeat * len(utterances))
+
+
+def make_router(options):
+    return IntentRouter(
+        {**VOLUME_KEYWORDS, "hello": [options["Other"]["hello"]]},
+        {key: options[key] for key in
+         ("story", "enter_youtube", "exit_youtube", "stop_video")}
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    options = load_options()
+    utterances = load_utterances(options)
+
+    start = time.perf_counter()
+    router = make_router(options)
+    build = time.perf_counter() - start
+    print(f"router build: {build * 1e3:.2f} ms, utterances: {len(utterances)}")
+
+    for name, chain, routed in (("main", chain_main, router_main),
+                                ("youtube", chain_youtube, router_youtube)):
+        expected, chain_time = timed(chain, utterances, options, args.repeat)
+        # First sight of each utterance, then repeated utterances.
+        actual, cold_time = timed(routed, utterances, make_router(options), 1)
+        warm, warm_time = timed(routed, utterances, router, args.repeat)
+        mismatches = [text for text, a, b, c in
+                      zip(utterances, expected, actual, warm)
+                      if a != b or a != c]
+        if mismatches:
+            print(f"ERROR: {name} routing differs for {mismatches}")
+            sys.exit(1)
+        print(f"{name:>8}: chain {chain_time * 1e6:8.1f} us/utterance, "
+              f"router new {cold_time * 1e6:8.1f} us "
+              f"({chain_time / cold_time:.1f}x), "
+              f"repeated {warm_time * 1e6:8.1f} us "
+              f"({chain_time / warm_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark of the rapidfuzz scorer against per-pair `fuzz.ratio` calls.
+
+For synthetic question lists of growing size (built like in
+bench_retrieval.py), times `best` for each query against the whole list,
+which is what a full scan does, and `cdist` for all queries at once, which
+is what an offline evaluation does. Both scorers must return the same
+scores and the same best choice for every query, which holds when
+fuzzywuzzy runs on python-Levenshtein; on difflib the bench stops, since
+the service then keeps fuzzywuzzy. Finally times
+`KnowledgeStore.get_answer`, which reranks its full-text candidates with
+`best`, with each scorer.
+
+Usage:
+    python3 bench/bench_scoring.py [--queries 200] [--sizes 64 1000 10000 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_retrieval import build_table, load_seed_rows, make_queries  # noqa: E402
+from fuzzy_scorer import (FuzzywuzzyScorer, RapidfuzzScorer,  # noqa: E402
+                          uses_levenshtein)
+from knowledge_store import KnowledgeStore  # noqa: E402
+from text_normalizer import normalize_text  # noqa: E402
+
+
+def timed(func, queries):
+    start = time.perf_counter()
+    results = [func(query) for query in queries]
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[64, 1000, 10000, 100000])
+    parser.add_argument("--cutoff", type=int, default=71)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if not uses_levenshtein():
+        print("fuzzywuzzy runs on difflib, whose scores rapidfuzz does not "
+              "reproduce; install python-Levenshtein to compare them")
+        sys.exit(1)
+
+    rng = random.Random(args.seed)
+    seed_rows = load_seed_rows()
+    reference, rapid = FuzzywuzzyScorer(), RapidfuzzScorer()
+    # Imports numpy outside of the timings.
+    rapid.cdist(["a"], ["a"])
+    print(f"{'choices':>8} {'loop ms':>10} {'rapid ms':>10} {'speedup':>8} "
+          f"{'cdist loop s':>13} {'cdist s':>8} {'speedup':>8}")
+    for size in args.sizes:
+        conn = build_table(size, seed_rows, rng)
+        queries = [normalize_text(query)
+                   for query in make_queries(conn, args.queries, rng)]
+        choices = [normalize_text(question) for (question,) in
+                   conn.execute("SELECT question FROM responses ORDER BY id")]
+        conn.close()
+
+        expected, loop = timed(
+            lambda query: reference.best(query, choices, args.cutoff), queries)
+        actual, fast = timed(
+            lambda query: rapid.best(query, choices, args.cutoff), queries)
+        if expected != actual:
+            print(f"ERROR: best choices differ for {size} choices")
+            sys.exit(1)
+
+        # The nested loop is the slow side, so only a slice is scored.
+        batch = queries[:max(1, min(len(queries), 2000000 // size))]
+        start = time.perf_counter()
+        matrix = reference.cdist(batch, choices, args.cutoff)
+        batch_loop = (time.perf_counter() - start) * len(queries) / len(batch)
+        start = time.perf_counter()
+        rapid_matrix = rapid.cdist(queries, choices, args.cutoff)
+        batch_fast = time.perf_counter() - start
+        if rapid_matrix[:len(batch)].tolist() != matrix:
+            print(f"ERROR: score matrices differ for {size} choices")
+            sys.exit(1)
+        print(f"{size:>8} {loop * 1e3:>10.3f} {fast * 1e3:>10.3f} "
+              f"{loop / fast:>7.1f}x {batch_loop:>13.2f} {batch_fast:>8.3f} "
+              f"{batch_loop / batch_fast:>7.1f}x")
+
+    conn = build_table(max(args.sizes), seed_rows, rng)
+    queries = make_queries(conn, args.queries, rng)
+    rows = conn.execute("SELECT question, answer FROM responses").fetchall()
+    conn.close()
+    store = KnowledgeStore(":memory:")
+    store.import_rows((question, answer, []) for question, answer in rows)
+    answers = {}
+    for scorer in (reference, rapid):
+        store.scorer = scorer
+        answers[scorer.name], lookup = timed(store.get_answer, queries)
+        print(f"get_answer, {len(rows)} rows, {scorer.name}: "
+              f"{lookup * 1e3:.3f} ms")
+    if answers[reference.name] != answers[rapid.name]:
+        print("ERROR: get_answer differs between the scorers")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
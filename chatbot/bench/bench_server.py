@@ -0,0 +1,301 @@
+"""
+Load test of the server mode with simulated thin clients.
+
+Starts `server.py` in its own interpreter, with the stubs of
+bench_offline.py instead of gTTS, pytube and yt-dlp, then connects
+`--clients` simulated clients for each count given. Every client says
+hello, then sends the utterances of bench/corpus/utterances.json ("main")
+in a loop, `--think-ms` apart, until `--seconds` are over. An utterance is
+sent as a phrase of PCM audio of about its spoken length, which a stub
+recognizer on the server decodes back to text after `--recognition-ms`;
+with `--text` it is sent as text instead. Synthesis of a phrase missing
+from the TTS cache takes `--tts-ms`.
+
+Prints, per client count, the p50 and p95 time from the end of an
+utterance to the first audio of the reply, the utterances answered "busy"
+or not at all, the server's CPU time as cores in use, and the sessions one
+core would serve at that load.
+
+Usage:
+    python3 bench/bench_server.py [--clients 1 8 32 64] [--seconds 20]
+        [--think-ms 2000] [--tts-ms 300] [--recognition-ms 50] [--text]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CHATBOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, CHATBOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_offline import CORPUS_PATH, install_stubs  # noqa: E402
+
+# 16 kHz mono 16-bit audio.
+BYTES_PER_SECOND = 32000
+
+
+class EchoBackend:
+    """
+    Recognizer backend reading the text written at the start of the phrase.
+    """
+    name = "echo"
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def session(self, language):
+        from speech_input import RecognitionSession
+
+        return RecognitionSession(self, language)
+
+    def recognize(self, pcm, language):
+        time.sleep(self.seconds)
+        return pcm.split(b"\0", 1)[0].decode("utf-8") or None
+
+
+def encode_phrase(text):
+    """
+    Pads a transcript to a phrase of about 70 ms of audio per character.
+    """
+    data = text.encode("utf-8") + b"\0"
+    size = int(BYTES_PER_SECOND * min(max(len(text) * 0.07, 0.4), 4))
+    return data + bytes(max(size - len(data), 0))
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_server(args):
+    """
+    Serves on `args.port` until stdin is closed, then prints the CPU time
+    used meanwhile and the server's metrics.
+    """
+    from server import MAX_MESSAGE_BYTES, ChatServer, ServerBot
+    from speech_input import FallbackRecognizer
+
+    work_dir = tempfile.mkdtemp(prefix="chatbot-server-")
+    try:
+        install_stubs(work_dir, args.tts_ms / 1e3, 0)
+        bot_dir = os.path.join(work_dir, "bot")
+        os.makedirs(os.path.join(bot_dir, "data"))
+        for name in ("options.json", "chatbot.db", "NoInternet.mp3"):
+            shutil.copy(os.path.join(CHATBOT_DIR, "data", name),
+                        os.path.join(bot_dir, "data", name))
+        bot = ServerBot(bot_dir, args.synthesis_workers,
+                        args.recognition_workers)
+        bot.check_internet = lambda *args, **kwargs: True
+        bot.recognizer = FallbackRecognizer(
+            [EchoBackend(args.recognition_ms / 1e3)])
+        server = ChatServer(bot, "127.0.0.1", args.port,
+                            max_sessions=max(args.clients))
+
+        async def serve():
+            import websockets
+
+            loop = asyncio.get_running_loop()
+            stop = loop.create_future()
+
+            def wait_for_eof():
+                sys.stdin.read()
+                loop.call_soon_threadsafe(stop.set_result, None)
+
+            threading.Thread(target=wait_for_eof, daemon=True).start()
+            async with websockets.serve(server.handle, "127.0.0.1", args.port,
+                                        max_size=MAX_MESSAGE_BYTES):
+                print("READY", flush=True)
+                started = cpu_seconds()
+                await stop
+            return cpu_seconds() - started
+
+        used = asyncio.run(serve())
+        print("RESULT " + json.dumps({
+            "cpu_seconds": used,
+            "stages": bot.metrics.summary(),
+        }), flush=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+async def client(index, args, utterances, deadline, stats):
+    """
+    One thin client: sends an utterance, waits for the first audio of the
+    reply, thinks, and sends the next one.
+    """
+    import websockets
+
+    rng = random.Random(index)
+    async with websockets.connect(f"ws://127.0.0.1:{args.port}",
+                                  max_size=None) as connection:
+        await connection.send(json.dumps({"type": "hello",
+                                          "session": f"client-{index}"}))
+        replied = None
+
+        async def receive():
+            async for message in connection:
+                if isinstance(message, bytes):
+                    if replied is not None and not replied.done():
+                        replied.set_result("audio")
+                    continue
+                message = json.loads(message)
+                if message["type"] == "busy":
+                    if replied is not None and not replied.done():
+                        replied.set_result("busy")
+                elif message["type"] == "play":
+                    await connection.send(json.dumps({"type": "ended",
+                                                      "reason": "eof"}))
+
+        receiver = asyncio.create_task(receive())
+        # Let the greeting start before the first utterance.
+        await asyncio.sleep(rng.uniform(0, args.think_ms / 1e3))
+        try:
+            while time.perf_counter() < deadline:
+                text = rng.choice(utterances)
+                replied = asyncio.get_running_loop().create_future()
+                if args.text:
+                    await connection.send(json.dumps({"type": "text",
+                                                      "text": text}))
+                else:
+                    await connection.send(encode_phrase(text))
+                sent_at = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(replied, args.timeout)
+                except asyncio.TimeoutError:
+                    result = "timeout"
+                if result == "audio":
+                    stats["latencies"].append(time.perf_counter() - sent_at)
+                else:
+                    stats[result] += 1
+                await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1e3)
+        finally:
+            receiver.cancel()
+
+
+async def load(args, clients, utterances):
+    stats = {"latencies": [], "busy": 0, "timeout": 0}
+    deadline = time.perf_counter() + args.seconds
+    results = await asyncio.gather(
+        *(client(index, args, utterances, deadline, stats)
+          for index in range(clients)),
+        return_exceptions=True)
+    stats["errors"] = [repr(result) for result in results
+                       if isinstance(result, Exception)]
+    return stats
+
+
+def measure(args, clients, utterances):
+    command = [sys.executable, os.path.abspath(__file__), "--serve",
+               "--port", str(args.port), "--clients", str(clients),
+               "--tts-ms", str(args.tts_ms),
+               "--recognition-ms", str(args.recognition_ms),
+               "--synthesis-workers", str(args.synthesis_workers),
+               "--recognition-workers", str(args.recognition_workers)]
+    server = subprocess.Popen(command, stdin=subprocess.PIPE,
+                              stdout=subprocess.PIPE, text=True)
+    # Read all along, the server logs every session.
+    ready = threading.Event()
+    lines = []
+
+    def read_output():
+        for line in server.stdout:
+            lines.append(line)
+            if line.startswith("READY"):
+                ready.set()
+        ready.set()
+
+    reader = threading.Thread(target=read_output, daemon=True)
+    reader.start()
+    try:
+        ready.wait()
+        if server.poll() is not None:
+            raise RuntimeError("the server did not start")
+        start = time.perf_counter()
+        stats = asyncio.run(load(args, clients, utterances))
+        elapsed = time.perf_counter() - start
+        server.stdin.close()
+        server.wait(timeout=30)
+        reader.join()
+    finally:
+        if server.poll() is None:
+            server.kill()
+    results = [json.loads(line[len("RESULT "):]) for line in lines
+               if line.startswith("RESULT ")]
+    if not results:
+        raise RuntimeError("the server did not report its CPU time")
+    result = results[-1]
+    latencies = sorted(stats["latencies"])
+    cores = result["cpu_seconds"] / elapsed
+    return {
+        "clients": clients,
+        "answered": len(latencies),
+        "p50_ms": latencies[len(latencies) // 2] * 1e3 if latencies else None,
+        "p95_ms": (latencies[int(len(latencies) * 0.95)] * 1e3
+                   if latencies else None),
+        "busy": stats["busy"],
+        "timeout": stats["timeout"],
+        "errors": stats["errors"],
+        "cores": cores,
+        "sessions_per_core": clients / cores if cores else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, nargs="+",
+                        default=[1, 8, 32, 64])
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--think-ms", type=float, default=2000,
+                        help="mean pause between a reply and the next "
+                             "utterance")
+    parser.add_argument("--tts-ms", type=float, default=300,
+                        help="simulated gTTS latency per phrase")
+    parser.add_argument("--recognition-ms", type=float, default=50,
+                        help="simulated recognition time per phrase")
+    parser.add_argument("--synthesis-workers", type=int, default=4)
+    parser.add_argument("--recognition-workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=10,
+                        help="seconds to wait for a reply")
+    parser.add_argument("--text", action="store_true",
+                        help="send text instead of audio phrases")
+    parser.add_argument("--port", type=int, default=18765)
+    parser.add_argument("--output", help="write the JSON report to a file")
+    parser.add_argument("--serve", action="store_true",
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        run_server(args)
+        return
+
+    with open(CORPUS_PATH, encoding="utf-8") as file:
+        utterances = json.load(file)["main"]
+    print(f"{'clients':>8} {'answered':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'busy':>5} {'timeout':>8} {'cores':>6} {'per core':>9}")
+    report = []
+    for clients in args.clients:
+        result = measure(args, clients, utterances)
+        report.append(result)
+        print(f"{clients:>8} {result['answered']:>9} "
+              f"{result['p50_ms'] or 0:>8.0f} {result['p95_ms'] or 0:>8.0f} "
+              f"{result['busy']:>5} {result['timeout']:>8} "
+              f"{result['cores']:>6.2f} {result['sessions_per_core'] or 0:>9.0f}")
+        for error in result["errors"]:
+            print(f"  client error: {error}", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"options": vars(args), "runs": report}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
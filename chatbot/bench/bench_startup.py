@@ -0,0 +1,122 @@
+"""
+Startup cost of loading options.json and of reloading it while running.
+
+Compares the original loading (`json.load` of options.json once per option
+list plus once for the phrases) followed by the intent router build with
+a single `load_config` and the same build, then times a whole `ChatBot()`
+construction on the repository's data directory. Finally it edits a copy
+of options.json and measures how long the `ConfigWatcher` takes to pick
+the change up.
+
+Usage:
+    python3 bench/bench_startup.py [--repeat 50]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+CHATBOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CHATBOT_DIR)
+
+from config import OPTION_KEYS, ConfigWatcher, load_config  # noqa: E402
+from intent_router import IntentRouter, VOLUME_KEYWORDS  # noqa: E402
+
+OPTIONS_PATH = os.path.join(CHATBOT_DIR, "data", "options.json")
+
+
+def original_load(path):
+    options = {}
+    for key in OPTION_KEYS:
+        with open(path, "r", encoding="utf-8") as file:
+            options[key] = json.load(file).get(key, [])
+    with open(path, "r", encoding="utf-8") as file:
+        voice_dict = {key: value for item in json.load(file).get("Other", [])
+                      for key, value in item.items()}
+    return options, voice_dict
+
+
+def config_load(path):
+    config = load_config(path)
+    # The keyword lists added since (KEYWORD_KEYS) were not loaded before.
+    return ({key: config.options[key] for key in OPTION_KEYS},
+            config.voice_dict)
+
+
+def build_router(options, voice_dict):
+    return IntentRouter({**VOLUME_KEYWORDS, "hello": [voice_dict["hello"]]},
+                        options)
+
+
+def timed(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def reload_latency(interval, repeat):
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, "options.json")
+    shutil.copy(OPTIONS_PATH, path)
+    reloaded = threading.Event()
+    watcher = ConfigWatcher(path, lambda config: reloaded.set(), interval)
+    watcher.start()
+    with open(OPTIONS_PATH, encoding="utf-8") as file:
+        data = json.load(file)
+    latencies = []
+    try:
+        for index in range(repeat):
+            data["story"].append(f"chuyện thử {index}")
+            reloaded.clear()
+            start = time.perf_counter()
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(data, file, ensure_ascii=False)
+            if not reloaded.wait(interval * 10 + 1):
+                print("ERROR: change was not reloaded")
+                sys.exit(1)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        watcher.stop()
+        shutil.rmtree(tmp_dir)
+    return statistics.median(latencies), max(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.5,
+                        help="watcher polling interval in seconds")
+    args = parser.parse_args()
+
+    if original_load(OPTIONS_PATH) != config_load(OPTIONS_PATH):
+        print("ERROR: load_config returns different options")
+        sys.exit(1)
+    for name, load in (("original", original_load), ("config", config_load)):
+        parse = timed(lambda: load(OPTIONS_PATH), args.repeat)
+        total = timed(lambda: build_router(*load(OPTIONS_PATH)), args.repeat)
+        print(f"{name:>9}: parse {parse * 1e3:6.2f} ms, "
+              f"parse + router {total * 1e3:6.2f} ms")
+
+    from chatbot import ChatBot
+    construct = timed(lambda: ChatBot(chatbot_dir=CHATBOT_DIR),
+                      max(args.repeat // 10, 3))
+    print(f"  ChatBot(): {construct * 1e3:6.2f} ms")
+
+    watcher = ConfigWatcher(OPTIONS_PATH, lambda config: None)
+    check = timed(watcher.check, args.repeat * 20)
+    median, worst = reload_latency(args.interval, 5)
+    print(f"     reload: unchanged check {check * 1e6:.1f} us, edit picked up "
+          f"after {median * 1e3:.0f} ms (max {worst * 1e3:.0f} ms, "
+          f"interval {args.interval * 1e3:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark of the FTS5 `KnowledgeStore` against the in-memory `ResponseIndex`.
+
+For synthetic response tables of growing size (built like in
+bench_retrieval.py), writes the rows to a JSON Lines file, bulk imports it
+into a fresh store, then compares lookup latency with `ResponseIndex`,
+which returns exactly what a full scan would, and counts the queries whose
+answer differs. The index scans the questions and queries in the form
+`normalize_text` gives them, as the store compares them.
+
+Usage:
+    python3 bench/bench_store.py [--queries 200] [--sizes 1000 10000 100000]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_retrieval import build_table, load_seed_rows, make_queries  # noqa: E402
+from knowledge_store import KnowledgeStore  # noqa: E402
+from retrieval import ResponseIndex  # noqa: E402
+from text_normalizer import normalize_text  # noqa: E402
+
+
+def timed(func, queries):
+    start = time.perf_counter()
+    answers = [func(query) for query in queries]
+    return answers, (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 10000, 100000])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    seed_rows = load_seed_rows()
+    work_dir = tempfile.mkdtemp(prefix="chatbot-store-")
+    print(f"{'rows':>8} {'import ms':>10} {'index ms':>10} {'store ms':>10} "
+          f"{'speedup':>8} {'differ':>7}")
+    try:
+        for size in args.sizes:
+            conn = build_table(size, seed_rows, rng)
+            # The importer merges repeated questions, keep the first one.
+            conn.execute("DELETE FROM responses WHERE id NOT IN "
+                         "(SELECT min(id) FROM responses GROUP BY question)")
+            queries = make_queries(conn, args.queries, rng)
+
+            jsonl_path = os.path.join(work_dir, f"{size}.jsonl")
+            with open(jsonl_path, "w", encoding="utf-8") as file:
+                for question, answer in conn.execute(
+                        "SELECT question, answer FROM responses ORDER BY id"):
+                    file.write(json.dumps({"question": question,
+                                           "answer": answer},
+                                          ensure_ascii=False) + "\n")
+            conn.create_function("normalize", 1, normalize_text)
+            conn.execute("UPDATE responses SET question = normalize(question)")
+            index = ResponseIndex(conn)
+            store = KnowledgeStore(os.path.join(work_dir, f"{size}.db"))
+            start = time.perf_counter()
+            store.import_file(jsonl_path)
+            imported = time.perf_counter() - start
+
+            expected, exact = timed(
+                lambda query: index.get_answer(normalize_text(query)), queries)
+            actual, lookup = timed(store.get_answer, queries)
+            differ = sum(1 for a, b in zip(expected, actual) if a != b)
+            print(f"{size:>8} {imported * 1e3:>10.0f} {exact * 1e3:>10.3f} "
+                  f"{lookup * 1e3:>10.3f} {exact / lookup:>7.1f}x "
+                  f"{differ:>7}")
+            store.close()
+            conn.close()
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Time-to-first-audio of whole-text vs sentence-chunked speech synthesis.
+
+For every stored answer, measures how long it takes until the first MP3 is
+ready to play when the whole answer is synthesized at once and when only
+the first chunk from `split_text` is. With --live the real gTTS service is
+used (needs internet), otherwise synthesis is simulated with a fixed
+request overhead plus a per-character cost.
+
+Usage:
+    python3 bench/bench_tts_stream.py [--live] [--limit 10]
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_stream import split_text  # noqa: E402
+
+DATA_DB = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "data", "chatbot.db")
+
+
+def simulated_synthesis(overhead, per_char):
+    def synthesize(text):
+        time.sleep(overhead + per_char * len(text))
+    return synthesize
+
+
+def live_synthesis():
+    from gtts import gTTS
+    out_dir = tempfile.mkdtemp()
+
+    def synthesize(text):
+        gTTS(text=text, lang="vi").save(os.path.join(out_dir, "bench.mp3"))
+    return synthesize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--overhead", type=float, default=0.25,
+                        help="simulated seconds per gTTS request")
+    parser.add_argument("--per-char", type=float, default=0.002,
+                        help="simulated seconds per character")
+    args = parser.parse_args()
+
+    synthesize = (live_synthesis() if args.live
+                  else simulated_synthesis(args.overhead, args.per_char))
+    conn = sqlite3.connect(DATA_DB)
+    answers = [row[0] for row in conn.execute(
+        "SELECT DISTINCT answer FROM responses ORDER BY length(answer) DESC "
+        "LIMIT ?", (args.limit,))]
+    conn.close()
+
+    whole, chunked = [], []
+    for answer in answers:
+        start = time.perf_counter()
+        synthesize(answer)
+        whole.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        synthesize(split_text(answer)[0])
+        chunked.append(time.perf_counter() - start)
+
+    print(f"answers: {len(answers)}, mean length: "
+          f"{statistics.mean(len(a) for a in answers):.0f} chars")
+    print(f"time to first audio, whole text: "
+          f"median {statistics.median(whole) * 1e3:.0f} ms, "
+          f"max {max(whole) * 1e3:.0f} ms")
+    print(f"time to first audio, chunked:    "
+          f"median {statistics.median(chunked) * 1e3:.0f} ms, "
+          f"max {max(chunked) * 1e3:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Replays a conversation trace through ChatBot and compares routing and timings.
+
+Reads a trace recorded with `chatbot.py --trace FILE` (see
+`turn_trace.TraceRecorder`), then feeds what was heard in one session back
+through the real `ChatBot.main()`, with the stubbed I/O of bench_offline.py:
+no microphone, network, speaker or player. Each utterance is replayed as
+its recorded audio when the trace kept it (`--trace-audio`), as a tone
+burst of about its spoken length otherwise, and recognition returns the
+recorded text. Utterances that were dropped while the bot spoke (its own
+voice, or speech that was not a command) are not replayed unless `--all`
+is given.
+
+The replay is traced too, and compared turn by turn with the recording:
+
+- routing: the turns whose branch, or the intent or option of one of
+  their routing decisions, changed, e.g. after editing options.json or
+  the normalizer.
+- timings: per stage, the count, p50 and p95 in milliseconds, recorded
+  against replayed. Network stages (recognition, gTTS, YouTube) are
+  stubbed, so the replay measures the bot's own work on the real
+  workload.
+
+The replay listens only between turns, so a command that interrupted
+speech in production reaches the bot after it finished speaking and may
+take another branch.
+
+Usage:
+    python3 bench/replay_trace.py TRACE [--session ID] [--all]
+        [--tts-ms 0] [--speech-ms 0] [--output report.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CHATBOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, CHATBOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_offline import (install_stubs, make_bot,  # noqa: E402
+                           synthesize_corpus)
+from turn_trace import read_trace  # noqa: E402
+
+# Branches of utterances that never reached the dispatcher.
+SKIPPED_BRANCHES = ("echo", "dropped")
+
+
+def select_turns(turns, session, replay_all):
+    if session is None:
+        session = turns[-1]["session"]
+    selected = [turn for turn in turns if turn["session"] == session]
+    if not replay_all:
+        selected = [turn for turn in selected
+                    if turn["branch"] not in SKIPPED_BRANCHES]
+    return session, selected
+
+
+def write_corpus(turns, trace_path, out_dir):
+    """
+    Writes the utterances as numbered WAV files with their transcripts,
+    using the recorded audio where the trace kept it.
+    """
+    synthesize_corpus([turn["text"] for turn in turns], out_dir)
+    recorded = 0
+    for index, turn in enumerate(turns):
+        audio = turn.get("audio")
+        path = audio and os.path.join(f"{trace_path}.audio", audio)
+        if path and os.path.exists(path):
+            shutil.copy(path, os.path.join(out_dir, f"{index:03d}.wav"))
+            recorded += 1
+    return recorded
+
+
+def decisions(turn):
+    return [(intent, option) for intent, _, option, _ in turn["routes"]]
+
+
+def compare_routing(recorded, replayed):
+    """
+    Returns the turns whose branch or routing decisions differ.
+    """
+    changes = []
+    for index, (before, after) in enumerate(zip(recorded, replayed)):
+        if (before["text"] != after["text"]
+                or before["branch"] != after["branch"]
+                or decisions(before) != decisions(after)):
+            changes.append({
+                "index": index,
+                "text": before["text"],
+                "mode": [before["mode"], after["mode"]],
+                "branch": [before["branch"], after["branch"]],
+                "routes": [before["routes"], after["routes"]],
+            })
+    return changes
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def stage_summary(turns):
+    durations = {}
+    for turn in turns:
+        for stage, seconds in turn["stages"].items():
+            durations.setdefault(stage, []).extend(seconds)
+    return {stage: {"count": len(values),
+                    "p50_ms": percentile(values, 0.5) * 1e3,
+                    "p95_ms": percentile(values, 0.95) * 1e3}
+            for stage, values in sorted(durations.items())}
+
+
+def replay(args, turns, work_dir):
+    install_stubs(work_dir, args.tts_ms / 1e3, args.speech_ms / 1e3)
+    corpus_dir = os.path.join(work_dir, "corpus")
+    recorded_audio = write_corpus(turns, args.trace, corpus_dir)
+    bot, server = make_bot(work_dir, corpus_dir)
+    recorder = bot.record_trace(os.path.join(work_dir, "replay.jsonl"))
+    try:
+        bot.main(fast_start=False)
+    finally:
+        recorder.stop()
+        bot.player.close()
+        bot.speaker.player.close()
+        server.close()
+    return recorded_audio, read_trace(recorder.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("trace", help="trace file written by --trace")
+    parser.add_argument("--session",
+                        help="session to replay, the last one by default")
+    parser.add_argument("--all", action="store_true",
+                        help="also replay the utterances that were dropped")
+    parser.add_argument("--tts-ms", type=float, default=0,
+                        help="simulated gTTS latency per phrase")
+    parser.add_argument("--speech-ms", type=float, default=0,
+                        help="simulated playback time per spoken chunk")
+    parser.add_argument("--output", help="write the JSON report to a file")
+    args = parser.parse_args()
+
+    turns = read_trace(args.trace)
+    if not turns:
+        sys.exit(f"No turns in {args.trace}")
+    session, recorded = select_turns(turns, args.session, args.all)
+    if not recorded:
+        sys.exit(f"No turns to replay in session {session}")
+    print(f"Replaying {len(recorded)} utterances of session {session}")
+    work_dir = tempfile.mkdtemp(prefix="chatbot-replay-")
+    try:
+        recorded_audio, replayed = replay(args, recorded, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    _, replayed = select_turns(replayed, None, args.all)
+
+    changes = compare_routing(recorded, replayed)
+    before, after = stage_summary(recorded), stage_summary(replayed)
+    print(f"{recorded_audio} of {len(recorded)} utterances replayed from "
+          f"recorded audio")
+    print(f"routing: {len(changes)} of {min(len(recorded), len(replayed))} "
+          f"turns changed, {len(replayed)} turns replayed")
+    for change in changes:
+        print(f"  #{change['index']} {change['text']!r}: "
+              f"{change['branch'][0]} -> {change['branch'][1]}")
+    print(f"{'stage':<24} {'count':>13} {'p50 ms':>17} {'p95 ms':>17}")
+    for stage in sorted(set(before) | set(after)):
+        cells = []
+        for key in ("count", "p50_ms", "p95_ms"):
+            cells += [f"{summary[key]:.{0 if key == 'count' else 1}f}"
+                      if summary else "-"
+                      for summary in (before.get(stage), after.get(stage))]
+        print(f"{stage:<24} {cells[0]:>6} {cells[1]:>6} {cells[2]:>8} "
+              f"{cells[3]:>8} {cells[4]:>8} {cells[5]:>8}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"trace": args.trace, "session": session,
+                       "turns": len(recorded), "replayed": len(replayed),
+                       "routing_changes": changes,
+                       "stages": {"recorded": before, "replayed": after}},
+                      file, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
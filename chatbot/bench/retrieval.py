@@ -0,0 +1,205 @@
+"""
+Exact references for the retrieval benchmarks: the original full-table
+scan of `ChatBot.get_response` and `ResponseIndex`, which returns the same
+answers without scoring every row. `KnowledgeStore` only reranks full-text
+candidates, so the benchmarks measure it against these.
+"""
+from collections import defaultdict
+
+from fuzzywuzzy import fuzz
+
+
+def _bigrams(text):
+    """
+    Counts the character bigrams of a string.
+
+    Args:
+        text (str): The string to split into bigrams.
+
+    Returns:
+        dict: A mapping of bigram to number of occurrences.
+    """
+    counts = defaultdict(int)
+    for i in range(len(text) - 1):
+        counts[text[i:i + 2]] += 1
+    return counts
+
+
+def _score_bound(shared, len_a, len_b):
+    """
+    Upper bound of `fuzz.ratio` for two strings from their lengths and the
+    number of bigram occurrences they share.
+
+    Both the difflib and the Levenshtein back ends of `fuzz.ratio` compute
+    2 * M / T, where M is the number of matched characters and T the total
+    length. M is at most the shorter length. The matched characters form
+    blocks separated by at least one unmatched character, so with B blocks
+    the shared bigrams are at least M - B and B is at most T - 2M + 1, which
+    gives M <= (shared + T + 1) / 3.
+
+    Args:
+        shared (int): Bigram occurrences shared by both strings.
+        len_a (int): Length of the first string.
+        len_b (int): Length of the second string.
+
+    Returns:
+        int: The highest score `fuzz.ratio` could return for the pair.
+    """
+    total = len_a + len_b
+    if not len_a or not len_b:
+        return 0
+    matched = min(len_a, len_b, (shared + total + 1) // 3)
+    return int(round(100 * 2 * matched / total))
+
+
+class ResponseIndex:
+    """
+    In-memory retrieval index over the questions of the `responses` table.
+
+    Questions are loaded once and indexed by character bigrams. A lookup
+    accumulates shared bigrams per question from the inverted index, ranks
+    the candidates by the best score they could reach and runs the exact
+    `fuzz.ratio` only on the top of that ranking, stopping as soon as no
+    remaining candidate can beat the best score found. Answers stay in the
+    database and are fetched by id for the winner only.
+
+    The result is identical to scanning every row with `fuzz.ratio`,
+    including the tie-break on the first row in table order.
+    """
+    def __init__(self, conn, threshold=70):
+        self.conn = conn
+        self.threshold = threshold
+        self.ids = []
+        self.questions = []
+        self.lengths = []
+        self.postings = {}
+        self.by_length = {}
+        self.rebuild()
+
+    def rebuild(self):
+        """
+        Reloads the questions from the database and rebuilds the index.
+
+        Must be called after rows are added to or removed from `responses`.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id, question FROM responses ORDER BY id")
+        rows = cursor.fetchall()
+
+        postings = defaultdict(list)
+        by_length = defaultdict(list)
+        for pos, (_, question) in enumerate(rows):
+            for gram, count in _bigrams(question).items():
+                postings[gram].append((pos, count))
+            by_length[len(question)].append(pos)
+
+        self.ids = [row_id for row_id, _ in rows]
+        self.questions = [question for _, question in rows]
+        self.lengths = [len(question) for question in self.questions]
+        self.postings = dict(postings)
+        self.by_length = dict(by_length)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def _candidates(self, query):
+        """
+        Collects every question that could score above the threshold.
+
+        Args:
+            query (str): The user input.
+
+        Returns:
+            dict: A mapping of row position to shared bigram occurrences.
+        """
+        len_q = len(query)
+        shared = defaultdict(int)
+        for gram, q_count in _bigrams(query).items():
+            for pos, count in self.postings.get(gram, ()):
+                shared[pos] += min(q_count, count)
+
+        # Short questions can match a short query without sharing a bigram.
+        for length, positions in self.by_length.items():
+            if _score_bound(0, len_q, length) > self.threshold:
+                for pos in positions:
+                    shared.setdefault(pos, 0)
+        return shared
+
+    def best_match(self, query):
+        """
+        Finds the question with the highest `fuzz.ratio` against the query.
+
+        Args:
+            query (str): The user input.
+
+        Returns:
+            tuple or None: (row id, question, score) of the best question if
+                           its score is above the threshold, else `None`.
+        """
+        len_q = len(query)
+        ranked = []
+        for pos, shared in self._candidates(query).items():
+            bound = _score_bound(shared, len_q, self.lengths[pos])
+            if bound > self.threshold:
+                ranked.append((-bound, pos))
+        ranked.sort()
+
+        best_pos = None
+        best_score = self.threshold
+        for neg_bound, pos in ranked:
+            if -neg_bound < best_score:
+                break
+            score = fuzz.ratio(query, self.questions[pos])
+            if score > best_score or (score == best_score
+                                      and best_pos is not None
+                                      and pos < best_pos):
+                best_pos = pos
+                best_score = score
+        if best_pos is None:
+            return None
+        return self.ids[best_pos], self.questions[best_pos], best_score
+
+    def get_answer(self, query):
+        """
+        Retrieves the answer of the best matching question.
+
+        Args:
+            query (str): The user input.
+
+        Returns:
+            str or None: The answer if a question scored above the threshold,
+                         else `None`.
+        """
+        match = self.best_match(query)
+        if match is None:
+            return None
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT answer FROM responses WHERE id = ?", (match[0],))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+
+def linear_scan(conn, user_input):
+    """
+    The original full-table scan.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the chatbot database.
+        user_input (str): The user input.
+
+    Returns:
+        str or None: The answer of the best question scoring above 70.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT question, answer FROM responses")
+    best_match = None
+    best_score = 0
+    for question, answer in cursor.fetchall():
+        score = fuzz.ratio(user_input, question)
+        if score > best_score:
+            best_match = (question, answer)
+            best_score = score
+    if best_match and best_score > 70:
+        return best_match[1]
+    return None
+
@@ -1,18 +1,29 @@
-import socket
-import subprocess
+import argparse
+import importlib
 import threading
-import time
-import sqlite3
 import random
-import re
 import os
-import json
-import psutil
-import speech_recognition as sr
 
-from fuzzywuzzy import fuzz, process
-from gtts import gTTS
-from pytube import Search
+
+from audio_output import Mpg123Decoder, change_device_volume, open_mixer
+from config import (KEYWORD_KEYS, OPTION_KEYS, Config, ConfigError,
+                    ConfigWatcher, load_config)
+from connectivity import DEFAULT_HOSTS, ConnectivityMonitor, tcp_probe
+from knowledge_store import KnowledgeStore
+from media_library import MediaLibrary
+from intent_router import IntentRouter, VOLUME_KEYWORDS
+from metrics import JsonlExporter, Metrics, MetricsServer
+from mpv_player import MpvPlayer, PlayerError
+from audio_capture import CaptureTimeout
+from speech_input import (FallbackRecognizer, GoogleBackend, RecognitionError,
+                          SpeechInput, VoskBackend)
+from tts_cache import TTSCache
+from tts_stream import StreamingSpeaker, split_text
+from youtube_resolver import ResolveError, YouTubeResolver
+
+# Loaded in the background while the greeting plays, see `ChatBot.preload`.
+PRELOAD_MODULES = ("asyncio", "async_core", "speech_recognition", "gtts",
+                   "pytube")
 
 
 class ChatBot:
@@ -22,34 +33,82 @@ class ChatBot:
     def __init__(self, chatbot_dir="/home/pi/workspace/chatbot"):
         self.chatbot_dir = chatbot_dir
         self.json_file_path = f"{self.chatbot_dir}/data/options.json"
-        self.recognizer = sr.Recognizer()
-        self.conn = self.init_db()
-        self.story_options = self.load_options_from_json("story")
-        self.enter_youtube_options = self.load_options_from_json("enter_youtube")
-        self.exit_youtube_options = self.load_options_from_json("exit_youtube")
-        self.stop_video_options = self.load_options_from_json("stop_video")
-        self.voice_dict = self.parse_json_to_dict("Other")
+        self.metrics = Metrics()
+        # Looked up on every probe, so `check_internet` can be replaced.
+        self.connectivity = ConnectivityMonitor(
+            probe=lambda: self.check_internet())
+        self.store = self.init_db()
+        self.conn = self.store.conn
+        self.tts_cache = TTSCache(f"{self.chatbot_dir}/data/tts_cache")
+        self.speech_input = None
+        self.mixer = None
+        self.speaker = None
+        self.library = None
+        self.youtube = None
+        self.player = None
+        self.init_devices()
+        # Disabled when the input is replayed from recordings.
+        self.barge_in = True
+        # A `TraceRecorder` while turns are traced, see `record_trace`.
+        self.trace = None
+        self.config_error = None
+        self.config = None
+        self.apply_config(self.load_config())
+        self.config_watcher = ConfigWatcher(self.json_file_path,
+                                            self.apply_config)
+
+    @property
+    def story_options(self):
+        return self.config.story
+
+    @property
+    def enter_youtube_options(self):
+        return self.config.enter_youtube
+
+    @property
+    def exit_youtube_options(self):
+        return self.config.exit_youtube
+
+    @property
+    def stop_video_options(self):
+        return self.config.stop_video
+
+    @property
+    def voice_dict(self):
+        return self.config.voice_dict
+
+    @property
+    def router(self):
+        return self.config.router
 
     def change_volume(self, step=10, increase=True):
         """
-        Changes the system volume by the specified step percentage.
+        Changes the output volume by the specified step percentage.
+
+        The volume is the software gain of the audio mixer, which applies to
+        speech and music alike without forking a process and is kept in
+        `data/volume` across restarts. Without the mixer, the level of the
+        sound card is changed with amixer.
 
         Args:
             step (int): The percentage to change the volume by (default is 10).
             increase (bool): True to increase the volume, False to decrease.
         Returns:
-            bool: True if the volume was changed successfully, False otherwise.
-        """
-        try:
-            operation = "+" if increase else "-"
-            command = f"amixer set Master {step}%{operation}"
-            subprocess.run(command, shell=True, check=True)
+            bool: True if the volume was changed, False if it was already at
+            its limit or could not be changed.
+        """
+        if self.mixer is None:
+            changed = change_device_volume(step, increase)
+        elif not self.mixer.change_volume(step, increase):
+            print("Error: Unable to change volume, already at "
+                  f"{self.mixer.volume}%.")
+            return False
+        else:
+            changed = True
+        if changed:
             action = "increased" if increase else "decreased"
             print(f"Volume {action} by {step}%.")
-            return True
-        except subprocess.CalledProcessError as e:
-            print(f"Error: Unable to change volume. {e}")
-            return False
+        return changed
 
     def change_volume_by_voice(self, user_input, is_speak=True):
         """
@@ -63,8 +122,8 @@ class ChatBot:
             else False.
         """
         catched = False
-        if ("tăng âm" in user_input or "tăng volum" in user_input
-                or "tăng volume" in user_input):
+        found = self.router.keywords(user_input)
+        if "volume_up" in found:
             if not self.change_volume():
                 if is_speak:
                     self.speak(self.voice_dict["not_increased_vol"])
@@ -72,8 +131,7 @@ class ChatBot:
                 if is_speak:
                     self.speak(self.voice_dict["increased_vol"])
             catched = True
-        if ("giảm âm" in user_input or "giảm volum" in user_input
-                or "giảm volume" in user_input):
+        if "volume_down" in found:
             if not self.change_volume(increase=False):
                 if is_speak:
                     self.speak(self.voice_dict["not_decreased_vol"])
@@ -83,45 +141,38 @@ class ChatBot:
             catched = True
         return catched
 
-    def check_internet(self, host="8.8.8.8", port=53, timeout=5):
+    def check_internet(self, hosts=DEFAULT_HOSTS, timeout=3):
         """
         Checks if the network can access the internet.
 
+        This is the probe of `self.connectivity`, which runs it in the
+        background; the rest of the bot reads the cached result.
+
         Returns:
             bool: True if internet is accessible, False otherwise.
         """
-        try:
-            socket.setdefaulttimeout(timeout)
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((host, port))
-            return True
-        except (socket.timeout, socket.error):
-            return False
+        return tcp_probe(hosts, timeout)
 
-    def check_and_kill_process(self, process_name):
+    def preload(self):
         """
-        Checks if a process with the given name is running, and kills it if found.
-
-        Args:
-            process_name (str): The name of the process to check and kill.
+        Imports the modules the conversation needs that are not loaded at
+        startup, so their import cost is paid while the greeting plays.
+        Third-party modules are otherwise imported on first use.
         """
-        for process in psutil.process_iter(attrs=["pid", "name"]):
+        for name in PRELOAD_MODULES:
             try:
-                if process.info["name"] == process_name:
-                    print(f"Process '{process_name}' found with PID "
-                          f"{process.info['pid']}. Killing it.")
-                    process.terminate()
-                    process.wait(timeout=3)
-                    break
-            except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
-                print(f"Error handling process: {e}")
-                continue
+                importlib.import_module(name)
+            except ImportError as e:
+                print(f"Error: unable to preload {name}. {e}")
 
     def search_mp4(self, keyword):
         """
         Search for a video on YouTube using the given keyword and return the
         video URL.
 
+        Results are cached per keyword by the YouTube resolver. While the
+        connection is down, only cached keywords are found.
+
         Args:
             keyword (str): The keyword to search for.
 
@@ -130,115 +181,87 @@ class ChatBot:
             is found.
         """
         try:
-            search_results = Search(keyword)
-            if search_results.results:
-                return search_results.results[0].watch_url
-            else:
-                return None
+            results = self.youtube.search(keyword)
+            return results[0] if results else None
         except Exception as e:
             print(f"An error occurred during the search: {e}")
             return None
 
-    def play_video(self, video_url):
+    def play_video(self, video_url, audio_url=None):
         """
         Plays the audio of a given YouTube video using yt-dlp and mpv.
 
         This function extracts the direct audio URL from the YouTube video
-        using `yt-dlp` and then plays it using `mpv` without video.
+        using `yt-dlp`, unless it was already resolved, and then plays it
+        without video on the long-lived `mpv` instance, waiting until the
+        track ends or is stopped. mpv decodes into the music channel of the
+        audio mixer, so speech is heard over the track. While the connection
+        is down, the no-internet prompt is played instead of waiting for
+        yt-dlp or mpv to time out.
+
+        A track the media library has downloaded is played from its file,
+        also offline. Every play is counted, so a track played often is
+        downloaded in the background for the next time.
 
         Args:
             video_url (str): The URL of the YouTube video.
+            audio_url (str): The direct audio URL, if already resolved.
         """
-        try:
-            # Run yt-dlp to get the direct audio URL
-            result = subprocess.run(
-                ["yt-dlp", "-f", "bestaudio", "--get-url", video_url],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-
-            # Extract URL using regex
-            urls = re.findall(r"https?://[^\s]+", result.stdout)
-            if not urls:
-                print("Error: No valid URL found.")
+        local_file = self.library.local_file(video_url)
+        if local_file:
+            audio_url = local_file
+        elif not self.connectivity.online:
+            self.no_internet_speak()
+            return
+        if audio_url is None:
+            try:
+                with self.metrics.time("play_video_extract"):
+                    audio_url = self.youtube.extract(video_url)
+            except ResolveError as e:
+                print(f"Error: {e}")
                 self.speak(self.voice_dict["error_video"])
                 return
 
-            audio_url = urls[0]  # Get the first valid URL
-
-            # Play with mpv
-            subprocess.run(["mpv", "--no-video", audio_url])
-
-        except subprocess.CalledProcessError as e:
-            print(f"Error running yt-dlp: {e}")
+        self.library.record_play(video_url)
+        try:
+            with self.metrics.time("play_video"):
+                reason = self.player.play(audio_url)
+                if reason == "eof" and self.mixer is not None:
+                    # mpv is done once the mixer has buffered the end.
+                    self.mixer.music.wait_drained(timeout=2)
+            if self.mixer is not None:
+                self.mixer.music.clear()
+            print(f"Playback ended: {reason}")
+        except PlayerError as e:
+            print(f"Error: {e}")
             self.speak(self.voice_dict["error_video"])
 
-    def listen_voice_in_thread(self, running, stop_video_options):
-        """
-        Starts a thread to listen for user voice commands and handle them in
-        parallel.
-
-        Args:
-            running (list[bool]): A mutable list with a single boolean element
-            to control the running state of the thread.
-            stop_video_options (list[str]): A list of voice commands to stop
-            video playback.
-
-        Returns:
-            threading.Thread: The thread object that was started.
-        """
-        thread = threading.Thread(
-            target=self.listen_thread_handle,
-            args=(running, stop_video_options),
-            daemon=True
-        )
-        thread.start()
-        return thread
-
-    def listen_thread_handle(self, running, stop_video_options):
-        """
-        Listens for voice commands in a loop and performs actions based on the
-        input.
-
-        Args:
-            running (list[bool]): A mutable list with a single boolean element
-            to control the loop's execution.
-            stop_video_options (list[str]): A list of voice commands that trigger
-            stopping video playback.
-        """
-        while running[0]:
-            user_input = self.listen()
-            if user_input:
-                if self.change_volume_by_voice(user_input):
-                    continue
-                match = self.get_best_match(user_input, stop_video_options)
-                if match:
-                    self.check_and_kill_process("mpv")
-                    self.check_and_kill_process("yt-dlp")
-                    break
-
     def no_internet_speak(self):
         """
         Plays a predefined audio file to notify the user of a lack of internet
         connectivity.
 
         Behavior:
-            - Uses the `mpg123` command-line tool to play an MP3 file stored in
-            the chatbot's data directory.
+            - Plays an MP3 file stored in the chatbot's data directory through
+            the speech player, over any music that is playing.
             - The audio file is expected to communicate that the system cannot
             connect to the internet.
         """
-        os.system(f"mpg123 {self.chatbot_dir}/data/NoInternet.mp3")
+        self.speaker.player.play(f"{self.chatbot_dir}/data/NoInternet.mp3")
 
     def speak(self, text):
         """
         Converts the input text to speech in Vietnamese and plays it.
 
-        This function uses Google Text-to-Speech (gTTS) to generate an MP3 audio
-        file from the input text in Vietnamese. The generated audio file is
-        temporarily saved to "/tmp/temp_audio.mp3", and then played using the
-        mpg123 command.
+        The text is split on sentence and clause boundaries. Each chunk is
+        looked up in the on-disk TTS cache and only synthesized with Google
+        Text-to-Speech (gTTS) on a miss, while the previous chunk is playing,
+        so long answers start speaking after the first sentence and repeated
+        phrases also work offline. The chunks are decoded by one long-lived
+        mpg123 process into the audio mixer, which ducks any music playing.
+        If a chunk cannot be synthesized, the no-internet prompt is played
+        instead. While the connection is down, a text that is not fully
+        cached gets the prompt right away, without waiting for gTTS to fail.
 
         Args:
             text (str): The text to be converted to speech.
@@ -246,82 +269,86 @@ class ChatBot:
         Returns:
             None
         """
-        try:
-            tts = gTTS(text=text, lang="vi")
-            mp3_file = "/tmp/temp_audio.mp3"
-            tts.save(mp3_file)
-            os.system(f"mpg123 {mp3_file}")
-        except Exception:
+        if not self.connectivity.online and not self.speaker.is_cached(text):
+            self.no_internet_speak()
+            return
+        if not self.speaker.speak(text, lang="vi"):
+            self.connectivity.report_failure()
             self.no_internet_speak()
 
-    def parse_json_to_dict(self, option):
+    def warm_tts_cache(self):
         """
-        Parses a JSON file containing 'Other' key with a list of dictionaries
-        and returns a dictionary with key-value pairs from the list.
-
-        Args:
-            option (str): The key for which to retrieve options from the JSON
-            file.
+        Pre-renders every phrase of the `Other` options and the chunks of every
+        stored answer into the TTS cache, so they can be spoken without
+        waiting for gTTS and without internet.
 
         Returns:
-            dict: A dictionary containing the key-value pairs
+            tuple: (number of phrases rendered, number of failures)
         """
-        try:
-            with open(self.json_file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-
-            other_data = data.get(option, [])
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT DISTINCT answer FROM responses")
+        texts = [chunk for text in self.voice_dict.values()
+                 for chunk in split_text(text)]
+        texts += [chunk for (answer,) in cursor.fetchall()
+                  for chunk in split_text(answer)]
+        return self.tts_cache.warm_up(texts, lang="vi")
 
-            parsed_dict = {item_key: item_value for item in other_data for
-                           item_key, item_value in item.items()}
+    def load_config(self):
+        """
+        Loads and validates `self.chatbot_dir/data/options.json`.
 
-            return parsed_dict
+        The file is read and parsed once, and its schema is checked so a
+        missing option list or phrase is reported at startup instead of
+        failing in the middle of a conversation. If the file is unusable,
+        the error is kept in `self.config_error` and an empty config is
+        returned, which makes `main` announce the problem.
 
-        except FileNotFoundError:
-            print("Error: File not found.")
-            return {}
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON: {e}")
-            return {}
+        Returns:
+            Config: The options and phrases of the chatbot.
+        """
+        try:
+            return load_config(self.json_file_path)
+        except ConfigError as e:
+            print(f"Error: {e}")
+            self.config_error = e
+            return Config.empty()
 
-    def load_options_from_json(self, options):
+    def apply_config(self, config):
         """
-        Loads specific options from a JSON file.
+        Switches to a new config together with the intent router built from
+        it.
 
-        This function attempts to load a JSON file containing options from the
-        specified directory (`self.chatbot_dir/data/options.json`). If the file
-        is found and the JSON is valid, it retrieves the options corresponding to
-        the given key. If any errors occur (e.g., file not found or invalid JSON),
-        it handles them gracefully and returns an empty list.
+        The router, with its preprocessed options, is built and attached to
+        the config before it replaces the old one in a single assignment.
+        A conversation running in another thread that reads `self.config`
+        once per turn sees either the old or the new lists and phrases, and
+        never a mix.
 
         Args:
-            options (str): The key for which to retrieve options from the JSON
-            file.
-
-        Returns:
-            list: A list of options corresponding to the provided key. If the
-                  file is not found or the JSON is invalid, an empty list is
-                  returned.
-        """
-        try:
-            with open(self.json_file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                return data.get(options, [])
-        except FileNotFoundError:
-            print("Error: File not found.")
-            return []
-        except json.JSONDecodeError:
-            print("Error: Invalid JSON format.")
-            return []
+            config (Config): The config to use.
+        """
+        router = IntentRouter(
+            {**VOLUME_KEYWORDS,
+             "hello": [config.voice_dict["hello"]]
+             if "hello" in config.voice_dict else [],
+             **{key: config.options[key] for key in KEYWORD_KEYS}},
+            {key: config.options[key] for key in OPTION_KEYS}
+        )
+        config.router = router
+        self.config = config
 
     def get_best_match(self, query, options):
         """
         Finds the best matching option for a given query.
 
-        This function uses the `fuzzywuzzy` library's `process.extractOne`
-        method to find the closest match from a list of options based on the
-        query string. If the best match has a score of 75 or higher, it is
-        returned. If the score is lower than 75, `None` is returned.
+        This function uses the intent router's precomputed option table to
+        find the closest match from a list of options based on the query
+        string, with the `fuzzywuzzy` library's `WRatio` score. The query and
+        the options are compared in their normalized form (see
+        `normalize_text`), so case, diacritics, punctuation and digits do not
+        lower the score. If the best match has a score of 75 or
+        higher, it is returned. If the score is lower than 75, `None` is
+        returned.
 
         Args:
             query (str): The query string for which to find the best match.
@@ -331,46 +358,88 @@ class ChatBot:
             str or None: The best matching option if the score is 75 or higher,
                      or `None` if no suitable match is found.
         """
-        best_match, score = process.extractOne(query, options)
-        if score >= 75:
-            return best_match
+        match = self.router.best_match(query, options)
+        if match and match[1] >= 75:
+            return match[0]
         return None
 
+    def init_devices(self):
+        """
+        Opens the microphone and the audio output of this device and what
+        plays on them: the shared audio capture, the audio mixer, mpg123 for
+        speech, the media library with its audio cache, the YouTube resolver
+        and mpv for the tracks.
+        """
+        self.speech_input = SpeechInput(self.init_recognizer(),
+                                        metrics=self.metrics)
+        self.mixer = self.init_mixer()
+        self.speaker = StreamingSpeaker(self.tts_cache,
+                                        Mpg123Decoder(self.mixer),
+                                        metrics=self.metrics)
+        self.library = MediaLibrary(f"{self.chatbot_dir}/data/media.db",
+                                    f"{self.chatbot_dir}/data/media_cache",
+                                    connectivity=self.connectivity)
+        self.youtube = YouTubeResolver(connectivity=self.connectivity,
+                                       library=self.library)
+        self.player = MpvPlayer(
+            audio_args=self.mixer.mpv_args(f"{self.chatbot_dir}/data/mpv.pcm")
+            if self.mixer is not None else ())
+
+    def init_mixer(self):
+        """
+        Opens the audio output that speech and music are mixed into, see
+        `open_mixer`.
+
+        Returns:
+            AudioMixer or None: The started mixer, None without numpy.
+        """
+        return open_mixer(f"{self.chatbot_dir}/data/volume")
+
+    def init_recognizer(self):
+        """
+        Builds the speech recognition backends in order of preference.
+
+        A local Vosk model in `self.chatbot_dir/data/vosk-model` is used first
+        when present, since it needs no network round trip. The Google Web
+        Speech API is the fallback.
+
+        Returns:
+            FallbackRecognizer: The recognizer used by `listen`.
+        """
+        backends = []
+        model_path = f"{self.chatbot_dir}/data/vosk-model"
+        if os.path.isdir(model_path):
+            backends.append(VoskBackend(model_path))
+        backends.append(GoogleBackend())
+        return FallbackRecognizer(backends, connectivity=self.connectivity)
+
     def init_db(self):
         """
-        Initializes the database and creates the necessary table.
+        Initializes the database and creates the necessary tables.
 
-        This function establishes a connection to an SQLite database located at
-        `self.chatbot_dir/data/chatbot.db`. It then creates a table called
-        `responses` if it does not already exist, with columns for `id`
-        (automatically incremented), `question` (the question asked), and
-        `answer` (the corresponding answer).
+        This function opens the knowledge store in the SQLite database located
+        at `self.chatbot_dir/data/chatbot.db` and migrates its schema: the
+        `responses` table with columns for `id` (automatically incremented),
+        `question` (the question asked), and `answer` (the corresponding
+        answer), an `aliases` table of alternative questions per response,
+        and a full-text index over the normalized form of both.
 
         Returns:
-            sqlite3.Connection: A connection object to the SQLite database.
-        """
-        conn = sqlite3.connect(f"{self.chatbot_dir}/data/chatbot.db")
-        cursor = conn.cursor()
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS responses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            question TEXT NOT NULL,
-            answer TEXT NOT NULL
-        )
-        """)
-        conn.commit()
-        return conn
+            KnowledgeStore: The store, whose `conn` is the SQLite connection.
+        """
+        return KnowledgeStore(f"{self.chatbot_dir}/data/chatbot.db")
 
     def get_response(self, user_input):
         """
         Retrieves the best matching response to the user's input from the
         database.
 
-        This function queries the `responses` table in the connected SQLite
-        database to find the best matching question based on the user's input.
-        It compares the user's input to all stored questions using fuzzy string
-        matching (via `fuzz.ratio`). If the best match has a score above 70,
-        the corresponding answer is returned. Otherwise, `None` is returned.
+        This function asks the full-text index of the knowledge store for the
+        stored questions and aliases that share words with the user's input,
+        both normalized once (see `normalize_text`), and reranks them with
+        the fuzzy matching score (via `fuzz.ratio`). If the best match has a
+        score above 70, the answer of its response is returned. Otherwise,
+        `None` is returned.
 
         Args:
             user_input (str): The input provided by the user to be matched
@@ -381,167 +450,225 @@ class ChatBot:
                          if the score is greater than 70, or `None` if no
                          suitable match is found.
         """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT question, answer FROM responses")
-        results = cursor.fetchall()
-
-        best_match = None
-        best_score = 0
-        for question, answer in results:
-            score = fuzz.ratio(user_input, question)
-            if score > best_score:
-                best_match = (question, answer)
-                best_score = score
-        if best_match and best_score > 70:
-            return best_match[1]
-        return None
+        with self.metrics.time("get_response"):
+            return self.store.get_answer(user_input)
 
-    def listen(self, language="vi-VN"):
+    def listen(self, language="vi-VN", audio=False):
         """
         Listens for audio input from the microphone and converts it to text.
 
-        This function continuously listens for audio input from the microphone
-        using the `speech_recognition` library. Once audio is detected, it
-        attempts to convert the audio to text using Google's speech recognition
-        service. If the input is successfully recognized, it returns the text
-        in lowercase. The function handles various exceptions such as
+        This function waits for the next phrase from the shared audio capture
+        service, which keeps the microphone open and calibrated and ends a
+        phrase with voice activity detection, streaming it into the
+        preferred recognition backend (a local model if installed, else
+        Google's speech recognition service) while the user speaks. If a
+        backend fails, the phrase is recognized by the next one right away.
+        The Google service is skipped while the connection is down; if no
+        backend is left, the no-internet prompt is played and listening
+        resumes once the connection is back. If the input is successfully
+        recognized, it returns the text in lowercase. The function handles
         unrecognized speech, timeouts, and service errors.
 
         Args:
             language (str): The language code (e.g., 'en' for English, 'vi' for
                             Vietnamese) to be used for speech recognition.
+            audio (bool): Also return the audio of the phrase the text was
+                          recognized from.
 
         Returns:
             str: The recognized speech as text in lowercase. If no valid speech
                  is recognized, the function will continue listening until input
-                 is successfully captured.
-        """
-        with sr.Microphone() as source:
-            self.recognizer.adjust_for_ambient_noise(source)
-            while True:
-                try:
-                    print("Listening...")
-                    audio = self.recognizer.listen(
-                        source,
-                        timeout=20,
-                        phrase_time_limit=15
-                    )
-                    text = self.recognizer.recognize_google(
-                        audio,
-                        language=language
-                    )
+                 is successfully captured. With `audio`, a (text, pcm) pair.
+        """
+        while True:
+            try:
+                print("Listening...")
+                text, pcm = self.speech_input.listen(language, audio=True)
+                if text:
                     print(f"You speak: {text}")
-                    return text.lower()
-                except sr.UnknownValueError:
-                    print("Didn't catch that.")
-                except sr.WaitTimeoutError:
-                    print("Timeout reached without input.")
-                except sr.RequestError as err:
-                    time.sleep(5 * 60)
-                    print(f"Speech recognition service error: {err}")
+                    return (text.lower(), pcm) if audio else text.lower()
+                print("Didn't catch that.")
+            except CaptureTimeout:
+                print("Timeout reached without input.")
+            except RecognitionError as err:
+                print(f"Speech recognition service error: {err}")
+                if not self.connectivity.online:
+                    self.no_internet_speak()
+                    self.connectivity.wait_online()
 
     def youtube_mode(self, user_input):
         """
-        Listens for audio input from the microphone and converts it to text.
+        Runs youtube mode if the user input asks for it, until the user
+        leaves it: searches, the play queue, playback and volume, with
+        barge-in, on the asyncio `ConversationCore`.
 
-        This function continuously listens for audio input from the microphone
-        using the `speech_recognition` library. Once audio is detected, it
-        attempts to convert the audio to text using Google's speech recognition
-        service. If the input is successfully recognized, it returns the text
-        in lowercase. The function handles various exceptions such as
-        unrecognized speech, timeouts, and service errors.
+        Args:
+            user_input (str): The utterance that may ask for youtube mode.
+
+        Returns:
+            bool: True if youtube mode was entered and left, False if the
+            input does not ask for it. The input itself is not answered.
+        """
+        import asyncio
+        from async_core import ConversationCore
+
+        core = ConversationCore(self, barge_in=self.barge_in)
+        return asyncio.run(core.youtube_mode(user_input))
+
+    def export_metrics(self, port=None, path=None, interval=60):
+        """
+        Publishes the per-stage latency histograms of `self.metrics`.
 
         Args:
-            language (str): The language code (e.g., 'en' for English, 'vi' for
-                            Vietnamese) to be used for speech recognition.
+            port (int): Serve them in the Prometheus text format on
+                http://127.0.0.1:port/metrics.
+            path (str): Append a p50/p95/p99 summary to this JSON Lines
+                file every `interval` seconds, rotating it at 1 MB.
 
         Returns:
-            str: The recognized speech as text in lowercase. If no valid speech
-                 is recognized, the function will continue listening until input
-                 is successfully captured.
-        """
-        running = [True]
-        enter_match = self.get_best_match(user_input, self.enter_youtube_options)
-        if enter_match:
-            self.speak(f"{enter_match} {self.voice_dict['youtube_mode']}")
-            while True:
-                running[0] = True
-                voice_input = self.listen()
-                if voice_input:
-                    if self.change_volume_by_voice(voice_input):
-                        continue
-                    exit_match = self.get_best_match(
-                        voice_input,
-                        self.exit_youtube_options
-                    )
-                    if exit_match:
-                        self.speak(exit_match)
-                        break
-                    if self.voice_dict["hello"] in voice_input:
-                        self.speak(self.voice_dict["youtube_hello"])
-                        continue
-                    video_url = self.search_mp4(voice_input)
-                    if video_url:
-                        self.speak(f"{self.voice_dict['find_video']} {voice_input},"
-                                   f" {self.voice_dict['wait_30s']}")
-                        thread = self.listen_voice_in_thread(
-                            running, self.stop_video_options
-                        )
-                        self.play_video(video_url)
-                        running[0] = False
-                        self.speak(self.voice_dict["end_video"])
-                        thread.join()
-                        self.speak(self.voice_dict["more_video"])
-                    else:
-                        self.speak(f"{self.voice_dict['no_video_found']} "
-                                   f"{voice_input}")
-
-    def main(self):
+            list: The started exporters, each with a `stop()` method.
+        """
+        exporters = []
+        if port is not None:
+            exporters.append(MetricsServer(self.metrics, port))
+        if path is not None:
+            exporters.append(JsonlExporter(self.metrics, path, interval))
+        for exporter in exporters:
+            exporter.start()
+        return exporters
+
+    def record_trace(self, path, audio=False):
+        """
+        Records every turn of the conversation: what was heard, how it was
+        routed and the time each stage took, for bench/replay_trace.py.
+
+        Args:
+            path (str): The JSON Lines trace file, rotated at 5 MB.
+            audio (bool): Also keep the audio of every phrase as a WAV file
+                in `<path>.audio/`.
+
+        Returns:
+            TraceRecorder: The started recorder, with a `stop()` method.
+        """
+        from turn_trace import TraceRecorder
+
+        self.trace = TraceRecorder(path, audio=audio)
+        self.trace.start()
+        self.metrics.add_listener(self.trace.observe)
+        return self.trace
+
+    def run_conversation(self, greet=True):
+        """
+        Runs the asyncio `ConversationCore` until the audio source is
+        closed, reloading options.json when it is edited.
+
+        Args:
+            greet (bool): Whether the core says hello first.
+        """
+        import asyncio
+        from async_core import ConversationCore
+
+        self.config_watcher.start()
+        try:
+            core = ConversationCore(self, barge_in=self.barge_in)
+            asyncio.run(core.run(greet=greet))
+        finally:
+            self.config_watcher.stop()
+
+    def main(self, fast_start=True):
         """
         The main entry point for the chatbot, handling user interaction and
         different modes.
 
-        This function checks for an internet connection, loads necessary options,
-        and begins listening for user input. It handles various commands such as
-        starting YouTube mode, playing a story, adjusting the volume, or responding
-        to other queries. If no valid options are found in the configuration files
-        (JSON), the function will notify the user. The chatbot responds in
-        Vietnamese and handles multiple scenarios based on the user's input.
+        This function starts the background connectivity monitor, loads
+        necessary options, and begins listening for user input. It handles
+        various commands such as starting YouTube mode, playing a story,
+        adjusting the volume, or responding to other queries. If no valid
+        options are found in the configuration files (JSON), the function
+        will notify the user. The chatbot responds in Vietnamese and handles
+        multiple scenarios based on the user's input.
+
+        The conversation runs on the asyncio `ConversationCore`, which keeps
+        listening while the bot speaks or plays music so the user can
+        interrupt it.
+
+        While it runs, options.json is watched and an edited file is loaded
+        without restarting the service.
+
+        The service does not wait for the network before it starts. If the
+        first probe of the connectivity monitor fails, the no-internet notice
+        is played and the conversation runs on its offline paths (cached
+        speech, local answers, a local recognizer if installed) until the
+        monitor sees the connection come back.
+
+        With `fast_start`, the modules that are not needed for the greeting
+        are imported in a background thread while the first probe runs, and
+        the greeting is played from the TTS cache as soon as the probe
+        answers. This shortens the cold start after every restart of the
+        systemd service.
+
+        Args:
+            fast_start (bool): Greet before the rest is initialized.
 
         Returns:
-            None: The function runs in an infinite loop, continuously processing
-                  user input.
+            None: The function runs until the audio source is closed,
+                  continuously processing user input.
         """
-        if not self.check_internet():
-            self.no_internet_speak()
-        else:
-            if (not self.story_options or not self.enter_youtube_options
-                    or not self.exit_youtube_options
-                    or not self.stop_video_options
-                    or not self.voice_dict):
+        self.connectivity.start()
+        try:
+            if fast_start:
+                preload = threading.Thread(target=self.preload, daemon=True)
+                preload.start()
+            online = self.connectivity.wait()
+            if not online:
+                self.no_internet_speak()
+            elif self.config_error is not None:
                 self.speak(self.voice_dict["unknown_options"])
-            else:
+            if self.config_error is not None:
+                return
+            if not fast_start:
+                self.run_conversation(greet=online)
+                return
+            if online:
                 self.speak(self.voice_dict["hello"])
-                while True:
-                    user_input = self.listen()
-                    if user_input:
-                        if self.change_volume_by_voice(user_input):
-                            continue
-                        match = self.get_best_match(user_input, self.story_options)
-                        if match:
-                            self.speak(f"{self.voice_dict['waiting']} {match}")
-                            match_res = self.get_response(match)
-                            if match_res:
-                                self.speak(match_res)
-                                continue
-                        self.youtube_mode(user_input)
-                        response = self.get_response(user_input)
-                        if response:
-                            self.speak(response)
-                        else:
-                            self.speak(self.voice_dict["unknown_answer"])
+            preload.join()
+            self.run_conversation(greet=False)
+        finally:
+            self.connectivity.stop()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vietnamese voice chatbot.")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="pre-render the fixed phrases and answers, then exit")
+    parser.add_argument("--import-responses", metavar="FILE",
+                        help="bulk import Q/A pairs from a .jsonl or .csv file, "
+                             "then exit")
+    parser.add_argument("--no-fast-start", action="store_true",
+                        help="initialize everything before greeting")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus metrics on 127.0.0.1:PORT")
+    parser.add_argument("--metrics-file",
+                        help="append latency summaries to this JSONL file")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="record every turn to this JSONL file")
+    parser.add_argument("--trace-audio", action="store_true",
+                        help="also keep the audio of every phrase")
+    args = parser.parse_args()
+
     bot = ChatBot()
-    bot.main()
+    if args.import_responses:
+        inserted, updated = bot.store.import_file(args.import_responses)
+        print(f"Imported {inserted} new and {updated} updated responses.")
+    elif args.warm_cache:
+        rendered, failed = bot.warm_tts_cache()
+        print(f"TTS cache warmed: {rendered} rendered, {failed} failed.")
+    else:
+        exporters = bot.export_metrics(args.metrics_port, args.metrics_file)
+        if args.trace:
+            exporters.append(bot.record_trace(args.trace, args.trace_audio))
+        try:
+            bot.main(fast_start=not args.no_fast_start)
+        finally:
+            for exporter in exporters:
+                exporter.stop()
@@ -0,0 +1,240 @@
+import json
+import os
+import threading
+
+OPTION_KEYS = ("story", "enter_youtube", "exit_youtube", "stop_video")
+
+# Phrase lists matched as substrings rather than fuzzily. Their short
+# phrases would also fuzzy-match song names that share a word. Older
+# options.json files lack them, so they have defaults.
+KEYWORD_KEYS = ("next_video", "replay_video")
+DEFAULT_KEYWORDS = {
+    "next_video": ["bài tiếp", "bài kế", "bài khác", "chuyển bài",
+                   "next video"],
+    "replay_video": ["nghe lại", "phát lại", "replay video"],
+}
+
+# Phrases of the "Other" section that the conversation speaks.
+PHRASE_KEYS = (
+    "unknown_answer", "unknown_options", "hello", "youtube_hello",
+    "youtube_mode", "find_video", "wait_30s", "end_video", "more_video",
+    "error_video", "no_video_found", "waiting", "increased_vol",
+    "decreased_vol", "not_increased_vol", "not_decreased_vol",
+)
+
+# Phrases of the "Other" section that older options.json files lack.
+DEFAULT_PHRASES = {
+    "queue_empty": "Chưa có bài nào trong danh sách phát, bạn muốn nghe gì",
+}
+
+DEFAULT_UNKNOWN_OPTIONS = "không có option trong file json"
+
+
+class ConfigError(Exception):
+    """
+    Raised when options.json cannot be read or does not match the schema.
+    """
+
+
+class Config:
+    """
+    The parsed and validated content of options.json.
+
+    A config is never modified once it is in use: `ChatBot.apply_config`
+    attaches the intent router built from it before publishing it, and a
+    reload builds a new one that replaces both in a single assignment.
+    """
+    def __init__(self, options, voice_dict, mtime=None):
+        """
+        Args:
+            options (dict): Option key to list of phrases, for every key of
+                `OPTION_KEYS` and `KEYWORD_KEYS`.
+            voice_dict (dict): The phrases of the "Other" section.
+            mtime (int): Modification time of the file, in nanoseconds.
+        """
+        self.options = options
+        self.voice_dict = voice_dict
+        self.mtime = mtime
+        # The `IntentRouter` of these options, see `ChatBot.apply_config`.
+        self.router = None
+
+    @classmethod
+    def empty(cls):
+        """
+        Returns the config used when options.json is unusable: no options
+        and only the phrase announcing the problem.
+        """
+        return cls({key: [] for key in OPTION_KEYS + KEYWORD_KEYS},
+                   {"unknown_options": DEFAULT_UNKNOWN_OPTIONS})
+
+    @property
+    def story(self):
+        return self.options["story"]
+
+    @property
+    def enter_youtube(self):
+        return self.options["enter_youtube"]
+
+    @property
+    def exit_youtube(self):
+        return self.options["exit_youtube"]
+
+    @property
+    def stop_video(self):
+        return self.options["stop_video"]
+
+    @property
+    def next_video(self):
+        return self.options["next_video"]
+
+    @property
+    def replay_video(self):
+        return self.options["replay_video"]
+
+
+def _string_list(data, key, errors):
+    value = data.get(key)
+    if not isinstance(value, list) or not value:
+        errors.append(f"'{key}' must be a non-empty list of phrases")
+        return []
+    if not all(isinstance(item, str) and item.strip() for item in value):
+        errors.append(f"'{key}' must only contain non-empty strings")
+    return value
+
+
+def parse_config(data, mtime=None):
+    """
+    Validates the decoded content of options.json.
+
+    The lists of `KEYWORD_KEYS` and the phrases of `DEFAULT_PHRASES` may be
+    left out; their defaults are used then.
+
+    Args:
+        data: The decoded JSON document.
+        mtime (int): Modification time of the file, in nanoseconds.
+
+    Returns:
+        Config: The validated config.
+
+    Raises:
+        ConfigError: Listing every problem found.
+    """
+    if not isinstance(data, dict):
+        raise ConfigError("options.json must contain a JSON object")
+    errors = []
+    options = {key: _string_list(data, key, errors) for key in OPTION_KEYS}
+    for key in KEYWORD_KEYS:
+        options[key] = (_string_list(data, key, errors) if key in data
+                        else DEFAULT_KEYWORDS[key])
+
+    voice_dict = dict(DEFAULT_PHRASES)
+    other = data.get("Other")
+    if not isinstance(other, list):
+        errors.append("'Other' must be a list of {key: phrase} objects")
+        other = []
+    for item in other:
+        if not isinstance(item, dict) or not all(
+                isinstance(value, str) for value in item.values()):
+            errors.append(f"'Other' entry {item!r} must map keys to phrases")
+            continue
+        voice_dict.update(item)
+    missing = [key for key in PHRASE_KEYS if key not in voice_dict]
+    if missing:
+        errors.append(f"'Other' is missing {', '.join(missing)}")
+
+    if errors:
+        raise ConfigError("; ".join(errors))
+    return Config(options, voice_dict, mtime)
+
+
+def load_config(path):
+    """
+    Reads, parses and validates options.json in one pass.
+
+    Args:
+        path (str): Path of options.json.
+
+    Returns:
+        Config: The validated config.
+
+    Raises:
+        ConfigError: If the file is missing, is not valid JSON or does not
+            match the schema.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+    except FileNotFoundError:
+        raise ConfigError(f"File not found: {path}") from None
+    except json.JSONDecodeError as e:
+        raise ConfigError(f"Invalid JSON format: {e}") from e
+    return parse_config(data, mtime)
+
+
+class ConfigWatcher:
+    """
+    Reloads options.json when it changes.
+
+    The file's modification time and size are polled from a background
+    thread, which works on every filesystem without extra packages and costs
+    one `stat` per interval. A changed file that fails validation is
+    reported and ignored, so the running config stays in use until the file
+    is fixed.
+    """
+    def __init__(self, path, on_reload, interval=2.0):
+        """
+        Args:
+            path (str): Path of options.json.
+            on_reload (callable): Called with the new `Config`.
+            interval (float): Seconds between checks.
+        """
+        self.path = path
+        self.on_reload = on_reload
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+        self.signature = self._signature()
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def check(self):
+        """
+        Reloads the file if it changed since the last check.
+
+        Returns:
+            bool: True if a new config was loaded.
+        """
+        signature = self._signature()
+        if signature is None or signature == self.signature:
+            return False
+        self.signature = signature
+        try:
+            config = load_config(self.path)
+        except ConfigError as e:
+            print(f"Error: options.json not reloaded. {e}")
+            return False
+        self.on_reload(config)
+        print("Reloaded options.json.")
+        return True
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
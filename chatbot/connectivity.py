@@ -0,0 +1,159 @@
+import socket
+import threading
+
+# Public DNS servers answer TCP on port 53 without sending any query.
+DEFAULT_HOSTS = (("8.8.8.8", 53), ("1.1.1.1", 53))
+
+
+def tcp_probe(hosts=DEFAULT_HOSTS, timeout=3):
+    """
+    Checks if any of the hosts accepts a TCP connection.
+
+    The timeout only applies to the probe's own sockets; the default
+    timeout of the other sockets in the process is left alone.
+
+    Args:
+        hosts (iterable): (host, port) tuples, tried in order.
+        timeout (float): Connection timeout per host in seconds.
+
+    Returns:
+        bool: True if a connection succeeded.
+    """
+    for host, port in hosts:
+        try:
+            with socket.create_connection((host, port), timeout=timeout):
+                return True
+        except OSError:
+            continue
+    return False
+
+
+class ConnectivityMonitor:
+    """
+    Watches the internet connection from a daemon thread and caches the
+    result, so callers read `online` without waiting on the network.
+
+    While online the connection is probed every `interval` seconds. Once it
+    is lost, it is probed again after a delay that doubles from
+    `min_backoff` up to `max_backoff`, so a returning connection is noticed
+    within seconds without hammering a network that is down. A component
+    whose network call failed calls `report_failure`, which triggers a probe
+    right away instead of waiting for the next one.
+
+    The state is unknown (`state` is `None`) until the first probe has
+    answered; `online` is optimistic until then.
+    """
+    def __init__(self, probe=tcp_probe, interval=30, min_backoff=1,
+                 max_backoff=60):
+        """
+        Args:
+            probe (callable): Returns True if the internet is reachable.
+            interval (float): Seconds between probes while online.
+            min_backoff (float): First retry delay once offline.
+            max_backoff (float): Longest retry delay once offline.
+        """
+        self.probe = probe
+        self.interval = interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.state = None
+        self.changed = threading.Condition()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.listeners = []
+
+    @property
+    def online(self):
+        return self.state is not False
+
+    def add_listener(self, callback):
+        """
+        Registers `callback(online)`, called from the monitor thread
+        whenever the state changes.
+        """
+        self.listeners.append(callback)
+
+    def set_state(self, online):
+        with self.changed:
+            previous = self.state
+            self.state = online
+            self.changed.notify_all()
+        if previous != online:
+            if previous is not None:
+                print("Internet connection restored." if online
+                      else "Internet connection lost.")
+            for callback in self.listeners:
+                callback(online)
+
+    def check(self):
+        """
+        Probes the connection now and updates the state.
+
+        Returns:
+            bool: True if the internet is reachable.
+        """
+        try:
+            online = bool(self.probe())
+        except Exception as e:
+            print(f"Error: connectivity probe failed. {e}")
+            online = False
+        self.set_state(online)
+        return online
+
+    def report_failure(self):
+        """
+        Asks for a probe right away, after a network call failed.
+        """
+        self.wake.set()
+
+    def wait(self, timeout=None):
+        """
+        Waits until the first probe has answered.
+
+        Returns:
+            bool or None: The state, `None` if it is still unknown.
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: self.state is not None, timeout)
+            return self.state
+
+    def wait_online(self, timeout=None):
+        """
+        Waits until the internet is reachable.
+
+        Returns:
+            bool: True if online, False if the timeout expired or the monitor
+            was stopped first.
+        """
+        with self.changed:
+            self.changed.wait_for(
+                lambda: self.state or self.stopped.is_set(), timeout)
+            return self.state is True
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+        with self.changed:
+            self.changed.notify_all()
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def run(self):
+        delay = self.min_backoff
+        while not self.stopped.is_set():
+            if self.check():
+                delay = self.min_backoff
+                wait = self.interval
+            else:
+                wait = delay
+                delay = min(delay * 2, self.max_backoff)
+            self.wake.wait(wait)
+            self.wake.clear()
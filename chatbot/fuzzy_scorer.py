@@ -0,0 +1,147 @@
+from fuzzywuzzy import fuzz
+
+
+def uses_levenshtein():
+    """
+    Tells whether fuzzywuzzy scores with python-Levenshtein rather than
+    difflib, whose ratio is a different measure.
+    """
+    return fuzz.SequenceMatcher.__module__ == "fuzzywuzzy.StringMatcher"
+
+
+class FuzzywuzzyScorer:
+    """
+    `fuzz.ratio` one pair at a time, the reference the other scorer must
+    agree with. Uses python-Levenshtein if installed, else difflib.
+    """
+    name = "fuzzywuzzy"
+
+    def scores(self, query, choices, cutoff=0):
+        """
+        Scores a query against every choice.
+
+        Args:
+            query (str): The query.
+            choices (list[str]): The choices.
+            cutoff (int): Scores below it are reported as 0.
+
+        Returns:
+            list[int]: The `fuzz.ratio` score of each choice.
+        """
+        return [score if score >= cutoff else 0
+                for score in (fuzz.ratio(query, choice) for choice in choices)]
+
+    def best(self, query, choices, cutoff=0):
+        """
+        Finds the choice with the highest `fuzz.ratio` score.
+
+        Args:
+            query (str): The query.
+            choices (list[str]): The choices.
+            cutoff (int): Minimum score, inclusive.
+
+        Returns:
+            tuple or None: (index, score) of the first choice with the highest
+                           score, or `None` if none reaches the cutoff.
+        """
+        best = None
+        for index, choice in enumerate(choices):
+            score = fuzz.ratio(query, choice)
+            if score >= cutoff and (best is None or score > best[1]):
+                best = (index, score)
+        return best
+
+    def cdist(self, queries, choices, cutoff=0):
+        """
+        Scores every query against every choice.
+
+        Args:
+            queries (list[str]): The queries.
+            choices (list[str]): The choices.
+            cutoff (int): Scores below it are reported as 0.
+
+        Returns:
+            list[list[int]]: One row of scores per query.
+        """
+        return [self.scores(query, choices, cutoff) for query in queries]
+
+
+class RapidfuzzScorer:
+    """
+    The scores of fuzzywuzzy on python-Levenshtein, from rapidfuzz,
+    computed in native code for a whole choice list per call.
+
+    rapidfuzz's `fuzz.ratio` is the normalized Indel similarity that
+    python-Levenshtein computes for fuzzywuzzy, as a float. It is rounded
+    the way fuzzywuzzy rounds, half to even, so scores, thresholds and ties
+    are unchanged. fuzzywuzzy on difflib scores differently, about a third
+    of the pairs change, so it is only a drop-in replacement when
+    `uses_levenshtein` is true. The cutoff is passed on, which lets rapidfuzz give up
+    early on choices that cannot reach it. `cdist` needs numpy.
+
+    Raises:
+        ImportError: If rapidfuzz is not installed.
+    """
+    name = "rapidfuzz"
+
+    def __init__(self):
+        from rapidfuzz import fuzz as rapid_fuzz, process
+        self.ratio = rapid_fuzz.ratio
+        self.process = process
+
+    def _matches(self, query, choices, cutoff):
+        # A float score rounds up to the cutoff from half a point below it.
+        return self.process.extract(query, choices, scorer=self.ratio,
+                                    limit=None,
+                                    score_cutoff=max(cutoff - 0.5, 0))
+
+    def scores(self, query, choices, cutoff=0):
+        scores = [0] * len(choices)
+        for _, score, index in self._matches(query, choices, cutoff):
+            score = round(score)
+            if score >= cutoff:
+                scores[index] = score
+        return scores
+
+    def best(self, query, choices, cutoff=0):
+        best = None
+        for _, score, index in self._matches(query, choices, cutoff):
+            score = round(score)
+            if score >= cutoff and (best is None or score > best[1]
+                                    or (score == best[1] and index < best[0])):
+                best = (index, score)
+        return best
+
+    def cdist(self, queries, choices, cutoff=0):
+        """
+        Returns:
+            numpy.ndarray: A queries x choices matrix of integer scores.
+        """
+        import numpy as np
+        matrix = self.process.cdist(queries, choices, scorer=self.ratio,
+                                    dtype=np.float64,
+                                    score_cutoff=max(cutoff - 0.5, 0))
+        # np.rint rounds half to even like `round`; integer dtypes do not.
+        matrix = np.rint(matrix).astype(np.int32)
+        matrix[matrix < cutoff] = 0
+        return matrix
+
+
+_scorer = None
+
+
+def get_scorer():
+    """
+    Returns the fastest scorer that gives fuzzywuzzy's scores, created on
+    first use: rapidfuzz if installed and fuzzywuzzy runs on
+    python-Levenshtein, else fuzzywuzzy itself.
+    """
+    global _scorer
+    if _scorer is None:
+        _scorer = FuzzywuzzyScorer()
+        if uses_levenshtein():
+            try:
+                _scorer = RapidfuzzScorer()
+            except ImportError:
+                pass
+    return _scorer
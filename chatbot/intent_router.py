@@ -0,0 +1,169 @@
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from functools import partial
+
+from fuzzywuzzy import fuzz
+
+from text_normalizer import normalize_text
+
+Route = namedtuple("Route", ["intent", "score", "option"])
+
+VOLUME_KEYWORDS = {
+    "volume_up": ["tăng âm", "tăng volum", "tăng volume"],
+    "volume_down": ["giảm âm", "giảm volum", "giảm volume"],
+}
+
+_score = partial(fuzz.WRatio, full_process=False)
+
+
+class IntentRouter:
+    """
+    Classifies an utterance against all intents in one pass.
+
+    Utterances, keywords and options all go through `normalize_text`, so
+    case, diacritics, punctuation, spacing and digits do not lower a match.
+    Keyword intents (substring tests on the normalized text) are compiled
+    into a single regex alternation that is scanned once per utterance.
+    Fuzzy intents share one candidate table of options that are normalized
+    at load time; an utterance is normalized once and every distinct option
+    is scored once, whichever intents it belongs to. The scores of recent
+    utterances are kept in a small LRU cache, since the same commands are
+    said over and over. Scores are those of `process.extractOne(query,
+    options, processor=normalize_text)` with `fuzz.WRatio`.
+    """
+    def __init__(self, keyword_intents, fuzzy_intents, threshold=75,
+                 cache_size=256, fold=True):
+        """
+        Args:
+            keyword_intents (dict): Intent name to list of substrings.
+            fuzzy_intents (dict): Intent name to list of options.
+            threshold (int): Minimum fuzzy score for an intent to fire.
+            cache_size (int): Number of utterances whose scores are kept.
+            fold (bool): Whether diacritics are ignored when comparing.
+        """
+        self.threshold = threshold
+        self.normalize = partial(normalize_text, fold=fold)
+        self.keyword_intents = {
+            name: list(dict.fromkeys(self.normalize(keyword)
+                                     for keyword in keywords))
+            for name, keywords in keyword_intents.items() if keywords
+        }
+        self.fuzzy_intents = {name: list(options) for name, options
+                              in fuzzy_intents.items()}
+        self.processed = {}
+        for options in self.fuzzy_intents.values():
+            for option in options:
+                self.process_option(option)
+
+        groups = []
+        self.group_intents = {}
+        for index, (name, keywords) in enumerate(self.keyword_intents.items()):
+            group = f"k{index}"
+            self.group_intents[group] = name
+            alternation = "|".join(re.escape(keyword) for keyword in
+                                   sorted(keywords, key=len, reverse=True))
+            groups.append(f"(?P<{group}>{alternation})")
+        # The lookahead matches at every position where a keyword starts, so
+        # overlapping keywords are all found.
+        self.pattern = re.compile(f"(?=(?:{'|'.join(groups)}))") if groups else None
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def process_option(self, option):
+        """
+        Returns the normalized form of an option, memoized.
+
+        Args:
+            option (str): A raw option string.
+
+        Returns:
+            str: The option as it is compared.
+        """
+        processed = self.processed.get(option)
+        if processed is None:
+            processed = self.processed[option] = self.normalize(option)
+        return processed
+
+    def keywords(self, text):
+        """
+        Finds the keyword intents whose substrings occur in the text.
+
+        Args:
+            text (str): The user input.
+
+        Returns:
+            set[str]: The names of the keyword intents found.
+        """
+        if self.pattern is None:
+            return set()
+        return {self.group_intents[match.lastgroup]
+                for match in self.pattern.finditer(self._scores(text)[None])}
+
+    def _scores(self, text):
+        """
+        Returns the memoized scores of the text against processed options,
+        keyed by processed option. The normalized text is stored under
+        `None`.
+        """
+        with self.lock:
+            scores = self.cache.get(text)
+            if scores is not None:
+                self.cache.move_to_end(text)
+                return scores
+            scores = self.cache[text] = {
+                None: self.normalize(text)
+            }
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return scores
+
+    def best_match(self, text, options):
+        """
+        Finds the best matching option, like `process.extractOne`.
+
+        Args:
+            text (str): The user input.
+            options (list): The options to compare against.
+
+        Returns:
+            tuple or None: (option, score) of the first option with the
+                           highest score, or `None` if options is empty.
+        """
+        scores = self._scores(text)
+        query = scores[None]
+        best = None
+        for option in options:
+            processed = self.process_option(option)
+            score = scores.get(processed)
+            if score is None:
+                score = scores[processed] = _score(query, processed)
+            if best is None or score > best[1]:
+                best = (option, score)
+        return best
+
+    def route(self, text, intents):
+        """
+        Classifies the text against intents in priority order.
+
+        Args:
+            text (str): The user input.
+            intents (iterable[str]): Intent names, highest priority first.
+
+        Returns:
+            Route: The first intent that fires with its score and matched
+                   option, or `Route(None, 0, None)` if none does.
+        """
+        found = None
+        for intent in intents:
+            if intent in self.keyword_intents:
+                if found is None:
+                    found = self.keywords(text)
+                if intent in found:
+                    return Route(intent, 100, None)
+            elif intent in self.fuzzy_intents:
+                match = self.best_match(text, self.fuzzy_intents[intent])
+                if match and match[1] >= self.threshold:
+                    return Route(intent, match[1], match[0])
+        return Route(None, 0, None)
@@ -0,0 +1,417 @@
+import csv
+import json
+import sqlite3
+import threading
+
+from fuzzy_scorer import get_scorer
+from text_normalizer import normalize_text
+
+
+def _create_responses(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS responses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL
+    )
+    """)
+
+
+def _create_aliases(conn):
+    conn.execute("""
+    CREATE TABLE aliases (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        response_id INTEGER NOT NULL
+            REFERENCES responses (id) ON DELETE CASCADE,
+        alias TEXT NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX aliases_response_id ON aliases (response_id)")
+    conn.execute("CREATE INDEX responses_question ON responses (question)")
+
+
+def _create_search(conn):
+    # Questions are stored under their response id and aliases under their
+    # negated alias id, so every row can be deleted by rowid.
+    conn.executescript("""
+    CREATE VIRTUAL TABLE search USING fts5(
+        text, response_id UNINDEXED, tokenize = 'trigram'
+    );
+    INSERT INTO search (rowid, text, response_id)
+        SELECT id, fold(question), id FROM responses;
+    INSERT INTO search (rowid, text, response_id)
+        SELECT -id, fold(alias), response_id FROM aliases;
+
+    CREATE TRIGGER responses_insert AFTER INSERT ON responses BEGIN
+        INSERT INTO search (rowid, text, response_id)
+            VALUES (new.id, fold(new.question), new.id);
+    END;
+    CREATE TRIGGER responses_delete AFTER DELETE ON responses BEGIN
+        DELETE FROM search WHERE rowid = old.id;
+    END;
+    CREATE TRIGGER responses_update AFTER UPDATE OF question ON responses BEGIN
+        UPDATE search SET text = fold(new.question) WHERE rowid = new.id;
+    END;
+    CREATE TRIGGER aliases_insert AFTER INSERT ON aliases BEGIN
+        INSERT INTO search (rowid, text, response_id)
+            VALUES (-new.id, fold(new.alias), new.response_id);
+    END;
+    CREATE TRIGGER aliases_delete AFTER DELETE ON aliases BEGIN
+        DELETE FROM search WHERE rowid = -old.id;
+    END;
+    CREATE TRIGGER aliases_update AFTER UPDATE ON aliases BEGIN
+        UPDATE search SET text = fold(new.alias), response_id = new.response_id
+            WHERE rowid = -new.id;
+    END;
+    """)
+
+
+def _normalize_search(conn):
+    # `fold` became `normalize_text`, which also collapses punctuation and
+    # spells out numbers. The triggers call it by name, only the stored text
+    # is rebuilt.
+    conn.executescript("""
+    DELETE FROM search;
+    INSERT INTO search (rowid, text, response_id)
+        SELECT id, fold(question), id FROM responses;
+    INSERT INTO search (rowid, text, response_id)
+        SELECT -id, fold(alias), response_id FROM aliases;
+    """)
+
+
+def _drop_fold_triggers(conn):
+    # The triggers called `fold`, which only the store's connection defines,
+    # so inserting or editing a question with any other client, like the
+    # sqlite3 shell, failed with "no such function". The store now writes
+    # the search rows itself; the delete triggers need no function.
+    conn.executescript("""
+    DROP TRIGGER responses_insert;
+    DROP TRIGGER responses_update;
+    DROP TRIGGER aliases_insert;
+    DROP TRIGGER aliases_update;
+    """)
+
+
+# Schema versions, stored in `PRAGMA user_version`. Version 1 is the table
+# `ChatBot.init_db` always created, so existing databases start from there.
+MIGRATIONS = [
+    (1, _create_responses),
+    (2, _create_aliases),
+    (3, _create_search),
+    (4, _normalize_search),
+    (5, _drop_fold_triggers),
+]
+
+
+class KnowledgeStore:
+    """
+    Question/answer store on SQLite with full-text candidate retrieval.
+
+    An FTS5 trigram table holds every question and alias in the form
+    `normalize_text` gives it, diacritics folded, computed in Python once
+    when the row is written through the store. Rows added with another
+    client, like the sqlite3 shell, are indexed when the store is opened;
+    after editing questions or aliases that way, call `reindex`. A lookup asks it for the rows containing the words of the
+    normalized query and, unless one of them matches closely, for the rows
+    sharing the most character trigrams with it, which also finds questions
+    the recognizer misspelled inside a word. Only those candidates are
+    reranked with `fuzz.ratio` against their stored normalized text, in one
+    call to the scorer of `get_scorer`. The cost depends on how many rows
+    look alike rather than on the size of the table. The answer of the best
+    question or alias above the threshold is returned; ties go to the oldest
+    response, as with a scan in table order.
+    Queries sharing no trigram with any question (very short or heavily
+    garbled ones) find nothing, where a full scan could still score above
+    the threshold.
+
+    The database runs in WAL mode so lookups are not blocked while a bulk
+    import writes, and the schema is migrated on open. With `memory`, the
+    file is copied into memory once and lookups never touch the disk, for
+    the server, which answers many sessions from one store; changes are not
+    written back then.
+    """
+    def __init__(self, path, threshold=70, candidates=64, confident=90,
+                 memory=False):
+        """
+        Args:
+            path (str): Path of the SQLite database.
+            threshold (int): Minimum `fuzz.ratio` score, exclusive.
+            candidates (int): Number of full-text hits that are reranked.
+            confident (int): Score from which a match ends the lookup
+                without trying the wider full-text queries.
+            memory (bool): Work on an in-memory copy of the database.
+        """
+        self.path = path
+        self.threshold = threshold
+        self.candidates = candidates
+        self.confident = confident
+        self.scorer = get_scorer()
+        self.lock = threading.RLock()
+        if memory:
+            self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+            source = sqlite3.connect(path)
+            source.backup(self.conn)
+            source.close()
+        else:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.create_function("fold", 1, normalize_text,
+                                  deterministic=True)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:" and not memory:
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.migrate()
+        self.index_new_rows()
+
+    @property
+    def version(self):
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self):
+        """
+        Applies the pending migrations, each in its own transaction.
+
+        Raises:
+            sqlite3.OperationalError: If SQLite was built without FTS5.
+        """
+        with self.lock:
+            version = self.version
+            for target, migration in MIGRATIONS:
+                if target <= version:
+                    continue
+                with self.conn:
+                    migration(self.conn)
+                    self.conn.execute(f"PRAGMA user_version = {target}")
+                print(f"Database migrated to version {target}.")
+
+    def index_new_rows(self):
+        """
+        Adds the questions and aliases missing from the search table, i.e.
+        inserted by another client than the store.
+        """
+        with self.lock, self.conn:
+            self._index(self.conn.execute("""
+            SELECT id, question, id FROM responses
+            WHERE id NOT IN (SELECT rowid FROM search WHERE rowid > 0)
+            UNION ALL
+            SELECT -id, alias, response_id FROM aliases
+            WHERE -id NOT IN (SELECT rowid FROM search WHERE rowid < 0)
+            """).fetchall())
+
+    def reindex(self):
+        """
+        Rebuilds the search table, after questions or aliases were edited
+        by another client than the store.
+        """
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM search")
+            self._index(self.conn.execute("""
+            SELECT id, question, id FROM responses
+            UNION ALL
+            SELECT -id, alias, response_id FROM aliases
+            """).fetchall())
+
+    def _index(self, rows):
+        # Rows are (rowid, text, response_id), see `_create_search`.
+        self.conn.executemany(
+            "INSERT INTO search (rowid, text, response_id) VALUES (?, ?, ?)",
+            [(rowid, normalize_text(text), response_id)
+             for rowid, text, response_id in rows])
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT count(*) FROM responses").fetchone()[0]
+
+    def _match_expressions(self, folded):
+        """
+        Returns the full-text queries to try in order: the words of the
+        normalized query that are long enough for the trigram index, all
+        required, then any of them, then any trigram of the query.
+        """
+        words = dict.fromkeys(word for word in folded.split() if len(word) >= 3)
+        trigrams = dict.fromkeys(folded[i:i + 3] for i in range(len(folded) - 2))
+        expressions = []
+        # Quoted terms are plain strings to FTS5, whatever they contain.
+        if words:
+            expressions.append(" AND ".join(_quote(word) for word in words))
+        if len(words) > 1:
+            expressions.append(" OR ".join(_quote(word) for word in words))
+        if trigrams:
+            expressions.append(" OR ".join(_quote(gram) for gram in trigrams))
+        return expressions
+
+    def _rerank(self, query, expression):
+        with self.lock:
+            rows = self.conn.execute("""
+            SELECT response_id, text FROM search
+            WHERE search MATCH ? ORDER BY rank LIMIT ?
+            """, (expression, self.candidates)).fetchall()
+        # Full-text rank order is not id order, ties go to the oldest.
+        rows.sort()
+        match = self.scorer.best(query, [text for _, text in rows],
+                                 cutoff=self.threshold + 1)
+        if match is None:
+            return None
+        index, score = match
+        return rows[index][0], rows[index][1], score
+
+    def best_match(self, query):
+        """
+        Finds the question or alias with the highest `fuzz.ratio` among the
+        full-text candidates.
+
+        Rows containing every word of the query are tried first, which is
+        selective and cheap. Unless one of them scores at least `confident`,
+        the rows containing any of the words, then the rows sharing the most
+        trigrams with the query are reranked as well. Folded diacritics make
+        many short questions look alike, so a fair match among the first
+        candidates is often not the best one.
+
+        Args:
+            query (str): The user input.
+
+        Returns:
+            tuple or None: (response id, matched normalized text, score) if
+                           the score is above the threshold, else `None`.
+        """
+        query = normalize_text(query)
+        best = None
+        for expression in self._match_expressions(query):
+            best = _better(best, self._rerank(query, expression),
+                           self.threshold)
+            if best is not None and best[2] >= self.confident:
+                break
+        return best
+
+    def get_answer(self, query):
+        """
+        Retrieves the answer of the best matching question or alias.
+
+        Args:
+            query (str): The user input.
+
+        Returns:
+            str or None: The answer, or `None` if nothing scored above the
+                         threshold.
+        """
+        match = self.best_match(query)
+        if match is None:
+            return None
+        with self.lock:
+            row = self.conn.execute("SELECT answer FROM responses WHERE id = ?",
+                                    (match[0],)).fetchone()
+        return row[0] if row else None
+
+    def import_rows(self, rows):
+        """
+        Adds or updates question/answer pairs in a single transaction.
+
+        A question that is already stored gets the new answer instead of a
+        duplicate row. Aliases are added unless the response already has
+        them.
+
+        Args:
+            rows (iterable): (question, answer, aliases) tuples, where
+                aliases is a list of strings.
+
+        Returns:
+            tuple: (inserted, updated) numbers of responses.
+        """
+        inserted = updated = 0
+        with self.lock, self.conn:
+            cursor = self.conn.cursor()
+            for question, answer, aliases in rows:
+                row = cursor.execute(
+                    "SELECT id FROM responses WHERE question = ? ORDER BY id",
+                    (question,)).fetchone()
+                if row:
+                    response_id = row[0]
+                    cursor.execute("UPDATE responses SET answer = ? WHERE id = ?",
+                                   (answer, response_id))
+                    updated += 1
+                else:
+                    cursor.execute(
+                        "INSERT INTO responses (question, answer) VALUES (?, ?)",
+                        (question, answer))
+                    response_id = cursor.lastrowid
+                    self._index([(response_id, question, response_id)])
+                    inserted += 1
+                for alias in aliases:
+                    if not cursor.execute(
+                            "SELECT 1 FROM aliases WHERE response_id = ? "
+                            "AND alias = ?", (response_id, alias)).fetchone():
+                        cursor.execute(
+                            "INSERT INTO aliases (response_id, alias) "
+                            "VALUES (?, ?)", (response_id, alias))
+                        self._index([(-cursor.lastrowid, alias, response_id)])
+        return inserted, updated
+
+    def import_file(self, path):
+        """
+        Bulk imports question/answer pairs from a JSON Lines or CSV file.
+
+        JSON Lines files hold one object per line with "question", "answer"
+        and optionally "aliases" (a list). CSV files have a header with
+        question, answer and optionally aliases, separated by "|".
+
+        Args:
+            path (str): The file, `.jsonl` or `.csv`.
+
+        Returns:
+            tuple: (inserted, updated) numbers of responses.
+
+        Raises:
+            ValueError: If the format is unknown or a row lacks a question
+                or an answer.
+        """
+        if path.endswith(".jsonl"):
+            rows = list(_read_jsonl(path))
+        elif path.endswith(".csv"):
+            rows = list(_read_csv(path))
+        else:
+            raise ValueError(f"Unknown import format: {path}")
+        return self.import_rows(rows)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def _better(best, match, threshold):
+    # Higher scores win, ties go to the oldest response.
+    if match is None or match[2] <= threshold:
+        return best
+    if (best is None or match[2] > best[2]
+            or (match[2] == best[2] and match[0] < best[0])):
+        return match
+    return best
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _row(record, line):
+    question = (record.get("question") or "").strip().lower()
+    answer = (record.get("answer") or "").strip()
+    if not question or not answer:
+        raise ValueError(f"Line {line}: a question and an answer are required")
+    aliases = record.get("aliases") or []
+    if isinstance(aliases, str):
+        aliases = aliases.split("|")
+    return question, answer, [alias.strip().lower() for alias in aliases
+                              if alias.strip()]
+
+
+def _read_jsonl(path):
+    with open(path, encoding="utf-8") as file:
+        for line, text in enumerate(file, 1):
+            if text.strip():
+                yield _row(json.loads(text), line)
+
+
+def _read_csv(path):
+    with open(path, encoding="utf-8", newline="") as file:
+        for line, record in enumerate(csv.DictReader(file), 2):
+            yield _row(record, line)
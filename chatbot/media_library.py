@@ -0,0 +1,341 @@
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from text_normalizer import normalize_text
+
+
+def _create_tables(conn):
+    conn.executescript("""
+    CREATE TABLE tracks (
+        watch_url TEXT PRIMARY KEY,
+        play_count INTEGER NOT NULL DEFAULT 0,
+        last_played REAL,
+        file TEXT,
+        bytes INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE searches (
+        keyword TEXT PRIMARY KEY,
+        results TEXT NOT NULL,
+        searched_at REAL NOT NULL
+    );
+    CREATE TABLE queue (
+        position INTEGER PRIMARY KEY,
+        keyword TEXT NOT NULL,
+        watch_url TEXT NOT NULL
+    );
+    CREATE TABLE queue_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        position INTEGER NOT NULL
+    );
+    """)
+
+
+def _add_queue_owner(conn):
+    # One play queue per owner: the local device ('') or a server session.
+    conn.executescript("""
+    ALTER TABLE queue RENAME TO queue_v1;
+    CREATE TABLE queue (
+        owner TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        keyword TEXT NOT NULL,
+        watch_url TEXT NOT NULL,
+        PRIMARY KEY (owner, position)
+    );
+    INSERT INTO queue SELECT '', position, keyword, watch_url FROM queue_v1;
+    DROP TABLE queue_v1;
+    ALTER TABLE queue_state RENAME TO queue_state_v1;
+    CREATE TABLE queue_state (
+        owner TEXT PRIMARY KEY,
+        position INTEGER NOT NULL
+    );
+    INSERT INTO queue_state SELECT '', position FROM queue_state_v1;
+    DROP TABLE queue_state_v1;
+    """)
+
+
+# Schema versions, stored in `PRAGMA user_version`, as in knowledge_store.
+MIGRATIONS = [
+    (1, _create_tables),
+    (2, _add_queue_owner),
+]
+
+
+class MediaLibrary:
+    """
+    What the chatbot remembers about YouTube tracks between requests.
+
+    - Search history: the results of every keyword, normalized with
+      `normalize_text`, so asking for a song again skips the search.
+    - Play queue: the results of the last keyword with the current
+      position, for "play the next one" and "play again". It survives a
+      restart. Each owner has its own: '' is the local device, the server
+      uses the id of each session.
+    - Audio cache: a track played more than `download_after` times is
+      downloaded once with yt-dlp in the background and then played from
+      disk, also offline. The cache is capped at `max_bytes`; the least
+      played tracks are evicted first, the least recently played among
+      equals.
+    """
+    def __init__(self, path, cache_dir, max_bytes=500 * 1024 * 1024,
+                 download_after=2, search_ttl=30 * 24 * 3600,
+                 command="yt-dlp", connectivity=None):
+        """
+        Args:
+            path (str): Path of the SQLite database.
+            cache_dir (str): Directory of the downloaded tracks.
+            max_bytes (int): Size cap of the downloaded tracks.
+            download_after (int): Plays after which a track is downloaded.
+            search_ttl (float): Seconds a search result is reused.
+            command (str): The yt-dlp executable.
+            connectivity (ConnectivityMonitor): Skips downloads while the
+                connection is down.
+        """
+        self.path = path
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.download_after = download_after
+        self.search_ttl = search_ttl
+        self.command = command
+        self.connectivity = connectivity
+        self.lock = threading.RLock()
+        self.downloads = {}
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.migrate()
+
+    def migrate(self):
+        with self.lock:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, migration in MIGRATIONS:
+                if target <= version:
+                    continue
+                with self.conn:
+                    migration(self.conn)
+                    self.conn.execute(f"PRAGMA user_version = {target}")
+
+    def lookup(self, keyword):
+        """
+        Returns the remembered results of a keyword.
+
+        Args:
+            keyword (str): The keyword as spoken.
+
+        Returns:
+            list[str] or None: Watch URLs, or `None` if the keyword was not
+            searched recently.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT results FROM searches WHERE keyword = ? "
+                "AND searched_at > ?",
+                (normalize_text(keyword), time.time() - self.search_ttl)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def remember(self, keyword, results):
+        """
+        Stores the results of a search.
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO searches (keyword, results, searched_at) "
+                "VALUES (?, ?, ?)",
+                (normalize_text(keyword), json.dumps(results), time.time()))
+
+    def set_queue(self, keyword, watch_urls, owner=""):
+        """
+        Replaces the play queue with the results of a keyword and moves to
+        the first one.
+
+        Returns:
+            str or None: The first watch URL, `None` if there is none.
+        """
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM queue WHERE owner = ?", (owner,))
+            self.conn.executemany(
+                "INSERT INTO queue (owner, position, keyword, watch_url) "
+                "VALUES (?, ?, ?, ?)",
+                [(owner, position, keyword, url)
+                 for position, url in enumerate(watch_urls)])
+            self._move(owner, 0)
+        return self.current(owner)[1] if watch_urls else None
+
+    def _move(self, owner, position):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO queue_state (owner, position) VALUES (?, ?)",
+            (owner, position))
+
+    def current(self, owner=""):
+        """
+        Returns:
+            tuple or None: (keyword, watch URL) of the current entry of the
+            queue, `None` if the queue is empty.
+        """
+        with self.lock:
+            return self.conn.execute("""
+            SELECT keyword, watch_url FROM queue
+            WHERE owner = ?1 AND position =
+                (SELECT position FROM queue_state WHERE owner = ?1)
+            """, (owner,)).fetchone()
+
+    def next(self, owner=""):
+        """
+        Moves to the next entry of the queue, wrapping around at the end.
+
+        Returns:
+            tuple or None: (keyword, watch URL), `None` if the queue is empty.
+        """
+        with self.lock, self.conn:
+            size = self.conn.execute("SELECT count(*) FROM queue WHERE owner = ?",
+                                     (owner,)).fetchone()[0]
+            if not size:
+                return None
+            row = self.conn.execute(
+                "SELECT position FROM queue_state WHERE owner = ?",
+                (owner,)).fetchone()
+            self._move(owner, (row[0] + 1) % size if row else 0)
+        return self.current(owner)
+
+    def upcoming(self, count=1, owner=""):
+        """
+        Returns the watch URLs after the current entry, for prefetching.
+        """
+        with self.lock:
+            return [url for (url,) in self.conn.execute("""
+            SELECT watch_url FROM queue
+            WHERE owner = ?1 AND position >
+                (SELECT position FROM queue_state WHERE owner = ?1)
+            ORDER BY position LIMIT ?2
+            """, (owner, count))]
+
+    def local_file(self, watch_url):
+        """
+        Returns:
+            str or None: Path of the downloaded track, `None` if it is not
+            cached.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT file FROM tracks WHERE watch_url = ?",
+                (watch_url,)).fetchone()
+        if row and row[0] and os.path.exists(row[0]):
+            return row[0]
+        return None
+
+    def record_play(self, watch_url):
+        """
+        Counts a play and starts the download of a track that was played
+        often enough.
+
+        Returns:
+            concurrent.futures.Future or None: The download, if one started.
+        """
+        with self.lock, self.conn:
+            self.conn.execute("""
+            INSERT INTO tracks (watch_url, play_count, last_played)
+            VALUES (?, 1, ?)
+            ON CONFLICT (watch_url) DO UPDATE
+            SET play_count = play_count + 1, last_played = excluded.last_played
+            """, (watch_url, time.time()))
+            count = self.conn.execute(
+                "SELECT play_count FROM tracks WHERE watch_url = ?",
+                (watch_url,)).fetchone()[0]
+        if count <= self.download_after or self.local_file(watch_url):
+            return None
+        if self.connectivity is not None and not self.connectivity.online:
+            return None
+        with self.lock:
+            future = self.downloads.get(watch_url)
+            if future is None:
+                future = self.executor.submit(self.download, watch_url)
+                self.downloads[watch_url] = future
+                future.add_done_callback(
+                    lambda _: self.downloads.pop(watch_url, None))
+        return future
+
+    def path_for(self, watch_url):
+        key = hashlib.sha1(watch_url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.audio")
+
+    def download(self, watch_url):
+        """
+        Downloads the audio of a track into the cache and evicts other
+        tracks if the cache is over its cap.
+
+        Returns:
+            str or None: Path of the file, `None` if yt-dlp failed.
+        """
+        path = self.path_for(watch_url)
+        tmp_path = f"{path}.tmp"
+        try:
+            result = subprocess.run(
+                [self.command, "-f", "bestaudio", "--no-part", "--quiet",
+                 "--no-progress", "-o", tmp_path, watch_url],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+            if result.returncode != 0 or not os.path.exists(tmp_path):
+                print(f"Error: unable to download {watch_url}. "
+                      f"{result.stderr.strip()}")
+                return None
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error: unable to download {watch_url}. {e}")
+            return None
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE tracks SET file = ?, bytes = ? WHERE watch_url = ?",
+                (path, os.path.getsize(path), watch_url))
+            self.evict(keep=watch_url)
+        return path
+
+    def cached_bytes(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT coalesce(sum(bytes), 0) FROM tracks "
+                "WHERE file IS NOT NULL").fetchone()[0]
+
+    def evict(self, keep=None):
+        """
+        Deletes the least frequently played downloads until the cache fits
+        in `max_bytes`. The track just downloaded (`keep`) stays.
+        """
+        with self.lock:
+            total = self.cached_bytes()
+            if total <= self.max_bytes:
+                return
+            rows = self.conn.execute("""
+            SELECT watch_url, file, bytes FROM tracks
+            WHERE file IS NOT NULL AND watch_url IS NOT ?
+            ORDER BY play_count, last_played
+            """, (keep,)).fetchall()
+            for watch_url, path, size in rows:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                self.conn.execute(
+                    "UPDATE tracks SET file = NULL, bytes = 0 "
+                    "WHERE watch_url = ?", (watch_url,))
+                total -= size
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,270 @@
+import json
+import os
+import queue
+import socket
+import subprocess
+import threading
+import time
+
+
+class PlayerError(Exception):
+    """
+    Raised when mpv cannot be started or does not answer over IPC.
+    """
+
+
+class MpvPlayer:
+    """
+    One idle mpv process driven over its JSON IPC socket.
+
+    mpv is started once with `--idle` and only the process it spawned is
+    ever signalled, so stopping playback is a single IPC message instead of
+    a scan of the process table. Commands are answered by a reader thread
+    that matches replies by `request_id` and queues mpv events.
+    """
+    def __init__(self, socket_path="/tmp/chatbot-mpv.sock", command="mpv",
+                 spawn=True, timeout=5, audio_args=()):
+        """
+        Args:
+            socket_path (str): Path of the IPC socket.
+            command (str): The mpv executable.
+            spawn (bool): Start mpv, or connect to a socket that is already
+                served, e.g. by a test double.
+            timeout (float): Seconds to wait for mpv to answer a command or
+                to start a file.
+            audio_args (list): Extra mpv options for the audio output, e.g.
+                `AudioMixer.mpv_args`.
+        """
+        self.socket_path = socket_path
+        self.command_name = command
+        self.audio_args = list(audio_args)
+        self.spawn = spawn
+        self.timeout = timeout
+        self.process = None
+        self.sock = None
+        self.reader = None
+        self.lock = threading.Lock()
+        self.replies = {}
+        self.reply_ready = threading.Condition()
+        self.events = queue.Queue()
+        self.request_id = 0
+        self.stopped = threading.Event()
+
+    @property
+    def pid(self):
+        """
+        PID of the mpv process owned by this player, or `None`.
+        """
+        if self.process and self.process.poll() is None:
+            return self.process.pid
+        return None
+
+    def start(self):
+        """
+        Starts mpv if needed and connects to its IPC socket.
+
+        Raises:
+            PlayerError: If mpv cannot be started or reached.
+        """
+        with self.lock:
+            if self.sock is not None and (not self.spawn or self.pid):
+                return
+            self._disconnect()
+            if self.spawn and not self.pid:
+                if os.path.exists(self.socket_path):
+                    os.remove(self.socket_path)
+                try:
+                    self.process = subprocess.Popen(
+                        [self.command_name, "--idle=yes", "--no-video",
+                         "--no-terminal",
+                         f"--input-ipc-server={self.socket_path}",
+                         *self.audio_args],
+                        stdin=subprocess.DEVNULL,
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL
+                    )
+                except OSError as e:
+                    raise PlayerError(f"Unable to start mpv: {e}") from e
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.connect(self.socket_path)
+                    break
+                except OSError as e:
+                    sock.close()
+                    if time.monotonic() > deadline:
+                        raise PlayerError(f"Unable to reach mpv: {e}") from e
+                    time.sleep(0.05)
+            self.sock = sock
+            self.reader = threading.Thread(target=self._read, args=(sock,),
+                                           daemon=True)
+            self.reader.start()
+
+    def _disconnect(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def _read(self, sock):
+        buffer = b""
+        while True:
+            try:
+                data = sock.recv(4096)
+            except OSError:
+                data = b""
+            if not data:
+                self.events.put({"event": "disconnected"})
+                return
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if "request_id" in message and "event" not in message:
+                    with self.reply_ready:
+                        self.replies[message["request_id"]] = message
+                        self.reply_ready.notify_all()
+                elif "event" in message:
+                    self.events.put(message)
+
+    def command(self, *args):
+        """
+        Sends a command and waits for its reply.
+
+        Args:
+            *args: The mpv command and its arguments.
+
+        Returns:
+            The `data` field of the reply.
+
+        Raises:
+            PlayerError: If mpv reports an error or does not answer.
+        """
+        self.start()
+        with self.reply_ready:
+            self.request_id += 1
+            request_id = self.request_id
+        payload = json.dumps({"command": list(args), "request_id": request_id})
+        try:
+            self.sock.sendall(payload.encode("utf-8") + b"\n")
+        except OSError as e:
+            self._disconnect()
+            raise PlayerError(f"mpv IPC failed: {e}") from e
+        deadline = time.monotonic() + self.timeout
+        with self.reply_ready:
+            while request_id not in self.replies:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PlayerError(f"mpv did not answer {args[0]}")
+                self.reply_ready.wait(remaining)
+            reply = self.replies.pop(request_id)
+        if reply.get("error") != "success":
+            raise PlayerError(f"mpv {args[0]} failed: {reply.get('error')}")
+        return reply.get("data")
+
+    def _drain_events(self):
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                return
+
+    def load(self, url):
+        """
+        Replaces whatever is playing with the given URL.
+        """
+        self.command("loadfile", url, "replace")
+
+    def queue(self, url):
+        """
+        Appends a URL to the playlist, starting it if the player is idle.
+        """
+        self.command("loadfile", url, "append-play")
+
+    def stop(self):
+        """
+        Stops playback and clears the playlist, ending `play`.
+        """
+        self.stopped.set()
+        try:
+            self.command("stop")
+        except PlayerError as e:
+            print(f"Error stopping mpv: {e}")
+
+    def pause(self, paused=True):
+        self.command("set_property", "pause", paused)
+
+    def set_volume(self, volume):
+        """
+        Sets the mpv volume in percent.
+        """
+        self.command("set_property", "volume", volume)
+
+    def play(self, url):
+        """
+        Plays a URL and waits until it ends or is stopped.
+
+        A `stop` from another thread that reaches mpv before the file is
+        loaded ends the wait too, and the file is stopped again.
+
+        Args:
+            url (str): The media URL.
+
+        Returns:
+            str or None: The mpv end-file reason ("eof", "stop", "error", ...)
+            or `None` if the connection to mpv was lost.
+
+        Raises:
+            PlayerError: If mpv does not answer or does not start the file
+                within `timeout`.
+        """
+        self._drain_events()
+        self.stopped.clear()
+        self.load(url)
+        if self.stopped.is_set():
+            # The stop may have been sent before the loadfile.
+            self.stop()
+            return "stop"
+        started = False
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                event = self.events.get(
+                    timeout=None if started
+                    else max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                self.stop()
+                raise PlayerError(f"mpv did not start {url}") from None
+            name = event.get("event")
+            if name == "disconnected":
+                self._disconnect()
+                return None
+            if name == "start-file":
+                started = True
+            elif name == "end-file" and started:
+                return event.get("reason")
+
+    def close(self):
+        """
+        Quits mpv and terminates the owned process if it does not exit.
+        """
+        try:
+            if self.sock is not None:
+                self.command("quit")
+        except PlayerError:
+            pass
+        self._disconnect()
+        if self.pid:
+            try:
+                self.process.wait(timeout=3)
+            except subprocess.TimeoutExpired:
+                self.process.terminate()
+        self.process = None
@@ -0,0 +1,422 @@
+"""
+Server mode: one process runs the conversation engine for many thin
+clients over WebSocket.
+
+Usage:
+    python3 server.py [--host 127.0.0.1] [--port 8765] [--max-sessions 64]
+        [--synthesis-workers 4] [--recognition-workers 2]
+        [--metrics-port PORT]
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from async_core import ConversationCore
+from chatbot import ChatBot
+from knowledge_store import KnowledgeStore
+from media_library import MediaLibrary
+from speech_input import RecognitionError
+from tts_stream import split_text
+from youtube_resolver import YouTubeResolver
+
+# Largest message a client may send: 15 s of 16 kHz mono 16-bit audio.
+MAX_MESSAGE_BYTES = 15 * 16000 * 2
+
+
+class ServerBot(ChatBot):
+    """
+    The engine shared by every session: config and intent router, the
+    knowledge store loaded into memory, the TTS cache, the recognizers and
+    the YouTube resolver with its caches. Synthesis and recognition run on
+    bounded thread pools, so a burst of sessions queues for them instead
+    of starting a thread each.
+
+    Nothing is played on this host. Speech is sent to the clients as MP3
+    and tracks as stream URLs, which the clients play themselves.
+    """
+    def __init__(self, chatbot_dir="/home/pi/workspace/chatbot",
+                 synthesis_workers=4, recognition_workers=2):
+        super().__init__(chatbot_dir)
+        self.synthesis = ThreadPoolExecutor(max_workers=synthesis_workers,
+                                            thread_name_prefix="synthesis")
+        self.recognition = ThreadPoolExecutor(
+            max_workers=recognition_workers, thread_name_prefix="recognition")
+        self.synthesizing = {}
+        self.synthesis_lock = threading.Lock()
+        with open(f"{self.chatbot_dir}/data/NoInternet.mp3", "rb") as file:
+            self.no_internet_mp3 = file.read()
+
+    def init_devices(self):
+        """
+        Opens no device: phrases come from the clients, which also play
+        the speech and tracks. The media library only keeps the play queue
+        of each session and never downloads, and the resolver does not use
+        it, since only this host could play its downloads.
+        """
+        self.recognizer = self.init_recognizer()
+        self.library = MediaLibrary(f"{self.chatbot_dir}/data/media.db",
+                                    f"{self.chatbot_dir}/data/media_cache",
+                                    connectivity=self.connectivity)
+        self.youtube = YouTubeResolver(connectivity=self.connectivity)
+
+    def init_db(self):
+        return KnowledgeStore(f"{self.chatbot_dir}/data/chatbot.db",
+                              memory=True)
+
+    def synthesize(self, text, lang="vi"):
+        """
+        Synthesizes a chunk of speech on the pool.
+
+        Sessions asking for the same chunk while it is synthesized, like
+        the greeting when many clients connect at once, share one gTTS
+        call.
+
+        Returns:
+            concurrent.futures.Future: The MP3 bytes.
+        """
+        key = (text, lang)
+        with self.synthesis_lock:
+            future = self.synthesizing.get(key)
+            if future is not None:
+                return future
+            future = self.synthesis.submit(self._synthesize, text, lang)
+            self.synthesizing[key] = future
+        future.add_done_callback(lambda _: self._synthesized(key))
+        return future
+
+    def _synthesize(self, text, lang):
+        with self.metrics.time("speak_synthesis"):
+            path = self.tts_cache.render(text, lang)
+        with open(path, "rb") as file:
+            return file.read()
+
+    def _synthesized(self, key):
+        with self.synthesis_lock:
+            self.synthesizing.pop(key, None)
+
+    def recognize(self, pcm, language="vi-VN"):
+        """
+        Recognizes a phrase sent by a client.
+
+        Args:
+            pcm (bytes): 16 kHz mono 16-bit audio of the phrase.
+
+        Returns:
+            str or None: The text in lowercase, `None` if nothing was
+            understood.
+
+        Raises:
+            RecognitionError: If no backend could recognize the phrase.
+        """
+        with self.metrics.time("listen_recognition"):
+            text = self.recognizer.finish(None, None, pcm, language)
+        return text.lower() if text else None
+
+
+class SessionCore(ConversationCore):
+    """
+    The conversation of one client, with the input and output of
+    `ConversationCore` sent over its WebSocket connection.
+
+    Messages from the client:
+        - binary: one phrase of 16 kHz mono 16-bit PCM, cut by the client's
+          voice activity detection.
+        - {"type": "text", "text": ...}: an utterance recognized by the
+          client.
+        - {"type": "ended", "reason": ...}: the track it played ended.
+
+    Messages to the client:
+        - {"type": "transcript", "text": ...}: what a phrase was heard as.
+        - {"type": "speech", "text": ...}, then the MP3 of that chunk as a
+          binary message, to be played in order.
+        - {"type": "stop_speech"}: drop the speech not played yet.
+        - {"type": "play", "url": ..., "video": ...}: play a track and
+          answer "ended" when it is over.
+        - {"type": "stop"}: stop the track.
+        - {"type": "volume", "step": ..., "increase": ...}
+        - {"type": "busy"}: the utterance was dropped.
+
+    Backpressure: at most `max_pending` utterances wait per session, the
+    rest are answered "busy". Every send waits for the connection to drain,
+    so a slow client only slows its own session, and a session has at most
+    `prefetch` chunks on the shared synthesis pool.
+    """
+    def __init__(self, bot, connection, session_id, max_pending=4,
+                 prefetch=2):
+        super().__init__(bot, barge_in=True, owner=session_id)
+        self.connection = connection
+        self.session_id = session_id
+        self.max_pending = max_pending
+        self.prefetch = prefetch
+        self.inbox = asyncio.Queue()
+        self.pending = 0
+        self.recognized = None
+        self.track_ended = None
+        self.speech_stopped = False
+        self.speech_first_audio_at = None
+        self.closed = False
+
+    async def send(self, message):
+        if self.closed:
+            # Prompts after the client left, e.g. the end of its track.
+            return
+        await self.connection.send(json.dumps(message, ensure_ascii=False))
+
+    async def receive(self):
+        """
+        Reads the client's messages until it disconnects.
+        """
+        try:
+            async for message in self.connection:
+                if isinstance(message, bytes):
+                    self.accept(self.recognize(message, self.recognized))
+                    continue
+                try:
+                    message = json.loads(message)
+                except ValueError:
+                    continue
+                kind = message.get("type")
+                if kind == "text" and message.get("text"):
+                    self.accept(self.echo(message["text"].lower(),
+                                          self.recognized))
+                elif kind == "ended" and self.track_ended is not None:
+                    if not self.track_ended.done():
+                        self.track_ended.set_result(message.get("reason"))
+        finally:
+            self.closed = True
+            if self.recognized is not None:
+                await asyncio.gather(self.recognized, return_exceptions=True)
+            if self.track_ended is not None and not self.track_ended.done():
+                self.track_ended.set_result(None)
+            await self.inbox.put(None)
+
+    def accept(self, coroutine):
+        """
+        Queues an utterance, or drops it and answers "busy" when
+        `max_pending` are already waiting.
+        """
+        waiting = (self.pending + self.inbox.qsize()
+                   + self.utterances.qsize())
+        if waiting >= self.max_pending:
+            coroutine.close()
+            asyncio.create_task(self.send({"type": "busy"}))
+            return
+        self.pending += 1
+        # Each utterance waits for the previous one, so they stay in order.
+        self.recognized = asyncio.create_task(coroutine)
+
+    async def echo(self, text, previous):
+        try:
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            await self.inbox.put((text, None))
+        finally:
+            self.pending -= 1
+
+    async def recognize(self, pcm, previous):
+        try:
+            loop = asyncio.get_running_loop()
+            try:
+                text = await loop.run_in_executor(self.bot.recognition,
+                                                  self.bot.recognize, pcm)
+            except RecognitionError as e:
+                print(f"Session {self.session_id}: {e}")
+                text = None
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            if text:
+                await self.send({"type": "transcript", "text": text})
+                await self.inbox.put((text, pcm))
+        finally:
+            self.pending -= 1
+
+    # Input and output.
+
+    async def next_utterance(self):
+        heard = await self.inbox.get()
+        if heard is None:
+            raise EOFError("client disconnected")
+        return heard
+
+    @property
+    def first_audio_at(self):
+        return self.speech_first_audio_at
+
+    async def send_speech(self, text, mp3):
+        if self.speech_first_audio_at is None:
+            self.speech_first_audio_at = time.perf_counter()
+        await self.send({"type": "speech", "text": text})
+        if not self.closed:
+            await self.connection.send(mp3)
+
+    async def speak(self, text):
+        """
+        Synthesizes the chunks of a text on the shared pool, `prefetch`
+        ahead, and sends each one as soon as it is ready.
+        """
+        self.speech_first_audio_at = None
+        started_at = time.perf_counter()
+        chunks = split_text(text)
+        rendering = deque()
+        submitted = 0
+        for chunk in chunks:
+            while submitted < len(chunks) and len(rendering) < self.prefetch:
+                rendering.append(asyncio.wrap_future(
+                    self.bot.synthesize(chunks[submitted])))
+                submitted += 1
+            try:
+                mp3 = await rendering.popleft()
+            except Exception as e:
+                print(f"Error synthesizing speech: {e}")
+                self.bot.connectivity.report_failure()
+                await self.no_internet()
+                return
+            if self.speech_stopped:
+                # The chunks still rendering are left to finish, other
+                # sessions may be waiting for them too.
+                return
+            await self.send_speech(chunk, mp3)
+            if chunk is chunks[0]:
+                self.bot.metrics.observe(
+                    "speak_first_audio",
+                    self.speech_first_audio_at - started_at)
+
+    def stop_speaking(self):
+        self.speech_stopped = True
+        asyncio.create_task(self.send({"type": "stop_speech"}))
+
+    def resume_speaking(self):
+        self.speech_stopped = False
+
+    async def stop_playback(self, cancel=False):
+        # The stream URL lookups are shared with the other sessions.
+        await self.send({"type": "stop"})
+
+    async def play_video(self, video_url, audio_url):
+        self.track_ended = asyncio.get_running_loop().create_future()
+        await self.send({"type": "play", "url": audio_url,
+                         "video": video_url})
+        reason = await self.track_ended
+        print(f"Session {self.session_id}: playback ended: {reason}")
+
+    async def change_volume(self, text):
+        found = self.config.router.keywords(text)
+        for intent, increase in (("volume_up", True), ("volume_down", False)):
+            if intent in found:
+                await self.send({"type": "volume", "step": 10,
+                                 "increase": increase})
+                await self.speak(self.voice_dict["increased_vol" if increase
+                                                 else "decreased_vol"])
+
+    async def no_internet(self):
+        await self.send_speech("", self.bot.no_internet_mp3)
+
+
+class ChatServer:
+    """
+    WebSocket server running one `SessionCore` per connected client on a
+    shared `ServerBot`, all on one event loop.
+
+    A client opens a connection and sends {"type": "hello", "session": id}.
+    The id names its play queue, so a client that reconnects with the same
+    id keeps it; a new id is made up when it is left out. The server
+    answers {"type": "session", "id": ...} and greets. A second connection
+    with an id that is in use replaces the first. Above `max_sessions`
+    connections are refused with close code 1013 (try again later).
+
+    Needs the `websockets` package.
+    """
+    def __init__(self, bot, host="127.0.0.1", port=8765, max_sessions=64,
+                 max_pending=4):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.max_pending = max_pending
+        self.sessions = {}
+
+    async def handle(self, connection):
+        if len(self.sessions) >= self.max_sessions:
+            await connection.close(1013, "too many sessions")
+            return
+        try:
+            hello = json.loads(await asyncio.wait_for(connection.recv(), 10))
+        except (asyncio.TimeoutError, ValueError, TypeError):
+            await connection.close(1002, "expected hello")
+            return
+        except Exception:
+            return
+        session_id = str(hello.get("session") or uuid.uuid4())
+        previous = self.sessions.get(session_id)
+        if previous is not None:
+            await previous.connection.close(1000, "replaced")
+        core = SessionCore(self.bot, connection, session_id,
+                           max_pending=self.max_pending)
+        self.sessions[session_id] = core
+        print(f"Session {session_id} opened, {len(self.sessions)} active.")
+        receiver = asyncio.create_task(core.receive())
+        try:
+            await core.send({"type": "session", "id": session_id})
+            await core.run(greet=True)
+        except Exception as e:
+            # Mostly the client going away mid-send.
+            print(f"Session {session_id} ended: {e!r}")
+        finally:
+            receiver.cancel()
+            if self.sessions.get(session_id) is core:
+                del self.sessions[session_id]
+            print(f"Session {session_id} closed, {len(self.sessions)} active.")
+
+    async def serve(self, stop=None):
+        """
+        Serves until `stop` (an asyncio future) is done, forever without.
+        """
+        import websockets
+
+        async with websockets.serve(self.handle, self.host, self.port,
+                                    max_size=MAX_MESSAGE_BYTES):
+            print(f"Serving sessions on ws://{self.host}:{self.port}")
+            await (stop if stop is not None
+                   else asyncio.get_running_loop().create_future())
+
+    def run(self):
+        """
+        Starts the connectivity monitor and the options.json watcher, then
+        serves until interrupted.
+        """
+        self.bot.connectivity.start()
+        self.bot.config_watcher.start()
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.bot.config_watcher.stop()
+            self.bot.connectivity.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chatbot-dir", default="/home/pi/workspace/chatbot")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-sessions", type=int, default=64)
+    parser.add_argument("--synthesis-workers", type=int, default=4)
+    parser.add_argument("--recognition-workers", type=int, default=2)
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus metrics on 127.0.0.1:PORT")
+    args = parser.parse_args()
+
+    bot = ServerBot(args.chatbot_dir, args.synthesis_workers,
+                    args.recognition_workers)
+    exporters = bot.export_metrics(args.metrics_port)
+    try:
+        ChatServer(bot, args.host, args.port, args.max_sessions).run()
+    finally:
+        for exporter in exporters:
+            exporter.stop()
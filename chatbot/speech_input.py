@@ -0,0 +1,332 @@
+import glob
+import json
+import os
+import threading
+import time
+
+from audio_capture import (SAMPLE_RATE, SAMPLE_WIDTH, AudioCaptureService,
+                           WavSource)
+
+
+class RecognitionError(Exception):
+    """
+    Raised when a recognition backend is unavailable, e.g. no internet for
+    the Google service or no model for a local backend.
+    """
+
+
+class RecognitionSession:
+    """
+    Collects the audio of one phrase and recognizes it when the phrase ends.
+    Streaming backends override it to decode while the user is speaking.
+    """
+    def __init__(self, backend, language):
+        self.backend = backend
+        self.language = language
+        self.chunks = []
+
+    def feed(self, pcm):
+        self.chunks.append(pcm)
+
+    def result(self):
+        return self.backend.recognize(b"".join(self.chunks), self.language)
+
+
+class GoogleBackend:
+    """
+    Google Web Speech API through `speech_recognition`, which is only
+    imported when the first phrase is recognized.
+    """
+    name = "google"
+    needs_network = True
+
+    def __init__(self, recognizer=None):
+        self.recognizer = recognizer
+
+    def session(self, language):
+        return RecognitionSession(self, language)
+
+    def recognize(self, pcm, language):
+        """
+        Args:
+            pcm (bytes): 16 kHz mono 16-bit audio of the phrase.
+            language (str): The language code, e.g. "vi-VN".
+
+        Returns:
+            str or None: The recognized text, or `None` if nothing was
+            understood.
+
+        Raises:
+            RecognitionError: If the service cannot be reached.
+        """
+        import speech_recognition as sr
+        if self.recognizer is None:
+            self.recognizer = sr.Recognizer()
+        audio = sr.AudioData(pcm, SAMPLE_RATE, SAMPLE_WIDTH)
+        try:
+            return self.recognizer.recognize_google(audio, language=language)
+        except sr.UnknownValueError:
+            return None
+        except sr.RequestError as e:
+            raise RecognitionError(f"Google speech service error: {e}") from e
+
+
+class VoskSession:
+    """
+    Decodes a phrase with Vosk while it is being captured, so the text is
+    ready as soon as the voice activity detector ends the phrase.
+    """
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+
+    def feed(self, pcm):
+        self.recognizer.AcceptWaveform(pcm)
+
+    def result(self):
+        text = json.loads(self.recognizer.FinalResult()).get("text", "")
+        return text or None
+
+
+class VoskBackend:
+    """
+    Offline recognition with a local Vosk (Kaldi) model on the CPU.
+
+    The `vosk` package and the model are optional; the backend raises
+    `RecognitionError` when either is missing so the next backend is used.
+    The model is loaded once and shared by the threads recognizing.
+    """
+    name = "vosk"
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.model = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.model is None:
+                if not os.path.isdir(self.model_path):
+                    raise RecognitionError(
+                        f"No Vosk model in {self.model_path}")
+                try:
+                    import vosk
+                except ImportError as e:
+                    raise RecognitionError("vosk is not installed") from e
+                vosk.SetLogLevel(-1)
+                self.vosk = vosk
+                self.model = vosk.Model(self.model_path)
+            return self.model
+
+    def session(self, language):
+        model = self.load()
+        return VoskSession(self.vosk.KaldiRecognizer(model, SAMPLE_RATE))
+
+    def recognize(self, pcm, language):
+        session = self.session(language)
+        session.feed(pcm)
+        return session.result()
+
+
+class ReplayBackend:
+    """
+    Fake backend returning recorded transcripts in order, one per phrase,
+    to run the conversation loop without network or model.
+    """
+    name = "replay"
+
+    def __init__(self, transcripts):
+        self.transcripts = list(transcripts)
+        self.index = 0
+
+    def session(self, language):
+        return RecognitionSession(self, language)
+
+    def recognize(self, pcm, language):
+        if self.index >= len(self.transcripts):
+            return None
+        text = self.transcripts[self.index]
+        self.index += 1
+        return text or None
+
+
+class FallbackRecognizer:
+    """
+    Recognizes a phrase with the first available backend.
+
+    The audio is streamed into the preferred backend while it is captured
+    and kept in memory. If that backend fails, the buffered phrase is
+    handed to the next one immediately, and the failed backend is skipped
+    for an exponentially growing cool-down instead of sleeping.
+
+    With a `ConnectivityMonitor`, backends that need the network are skipped
+    while it reports the connection as down, and their failures make it
+    probe the connection right away.
+
+    Several threads may recognize at once, like the server's recognition
+    pool; the cool-downs are shared and updated under a lock.
+    """
+    def __init__(self, backends, min_backoff=5, max_backoff=5 * 60,
+                 connectivity=None):
+        self.backends = list(backends)
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.connectivity = connectivity
+        self.retry_at = {}
+        self.backoff = {}
+        self.lock = threading.Lock()
+
+    def available(self):
+        now = time.monotonic()
+        offline = self.connectivity is not None and not self.connectivity.online
+        with self.lock:
+            return [backend for backend in self.backends
+                    if self.retry_at.get(backend.name, 0) <= now
+                    and not (offline
+                             and getattr(backend, "needs_network", False))]
+
+    def failed(self, backend, err):
+        with self.lock:
+            delay = min(self.backoff.get(backend.name,
+                                         self.min_backoff / 2) * 2,
+                        self.max_backoff)
+            self.backoff[backend.name] = delay
+            self.retry_at[backend.name] = time.monotonic() + delay
+        print(f"Recognizer '{backend.name}' unavailable for {delay:.0f}s: {err}")
+        if self.connectivity is not None and getattr(backend, "needs_network",
+                                                     False):
+            self.connectivity.report_failure()
+
+    def succeeded(self, backend):
+        with self.lock:
+            self.backoff.pop(backend.name, None)
+            self.retry_at.pop(backend.name, None)
+
+    def session(self, language):
+        """
+        Opens a streaming session on the first available backend.
+
+        Returns:
+            tuple: (backend, session), or (None, None) if none is available.
+        """
+        for backend in self.available():
+            try:
+                return backend, backend.session(language)
+            except RecognitionError as err:
+                self.failed(backend, err)
+        return None, None
+
+    def finish(self, backend, session, pcm, language):
+        """
+        Gets the text of a captured phrase, falling back to the other
+        backends on failure.
+
+        Raises:
+            RecognitionError: If every backend failed.
+        """
+        if session is not None:
+            try:
+                text = session.result()
+                self.succeeded(backend)
+                return text
+            except RecognitionError as err:
+                self.failed(backend, err)
+        for other in self.available():
+            if other is backend:
+                continue
+            try:
+                text = other.recognize(pcm, language)
+                self.succeeded(other)
+                return text
+            except RecognitionError as err:
+                self.failed(other, err)
+        raise RecognitionError("No speech recognition backend available")
+
+
+class SpeechInput:
+    """
+    Turns the phrases of an `AudioCaptureService` into text.
+
+    The frames of a phrase are streamed into the recognizer while the user
+    is still speaking. Any number of threads may listen at the same time;
+    each gets every phrase.
+
+    With a `Metrics` registry, the time from the start of speech to the end
+    of the phrase ("listen_capture") and the time to get the text once the
+    phrase ended ("listen_recognition") are recorded.
+    """
+    def __init__(self, recognizer, capture=None, timeout=20, metrics=None):
+        self.recognizer = recognizer
+        self.capture = capture or AudioCaptureService()
+        self.timeout = timeout
+        self.metrics = metrics
+
+    def listen(self, language="vi-VN", audio=False):
+        """
+        Waits for one phrase and recognizes it.
+
+        Args:
+            language (str): The recognition language.
+            audio (bool): Also return the audio of the phrase.
+
+        Returns:
+            str or None: The recognized text, or `None` if nothing was
+            understood. With `audio`, a (text, pcm) pair.
+
+        Raises:
+            CaptureTimeout: If no speech started in time.
+            RecognitionError: If no backend could recognize the phrase.
+            EOFError: If the audio source is exhausted.
+        """
+        backend, session = self.recognizer.session(language)
+        speech_started = []
+
+        def on_frame(frame):
+            if not speech_started:
+                speech_started.append(time.perf_counter())
+            if session is not None:
+                session.feed(frame)
+
+        with self.capture.subscribe() as subscription:
+            pcm = subscription.next_phrase(on_frame=on_frame,
+                                           timeout=self.timeout)
+        if self.metrics is None:
+            text = self.recognizer.finish(backend, session, pcm, language)
+        else:
+            phrase_end = time.perf_counter()
+            self.metrics.observe("listen_capture",
+                                 phrase_end - speech_started[0])
+            try:
+                text = self.recognizer.finish(backend, session, pcm, language)
+            finally:
+                self.metrics.observe("listen_recognition",
+                                     time.perf_counter() - phrase_end)
+        return (text, pcm) if audio else text
+
+
+def replay_speech_input(wav_dir):
+    """
+    Builds a `SpeechInput` that replays `*.wav` files from a directory in
+    name order, with the transcript of each file read from the `.txt` file
+    of the same name.
+
+    Args:
+        wav_dir (str): Directory of recorded utterances.
+
+    Returns:
+        SpeechInput: Input that raises `EOFError` once all files are used.
+    """
+    paths = sorted(glob.glob(os.path.join(wav_dir, "*.wav")))
+    transcripts = []
+    for path in paths:
+        with open(f"{os.path.splitext(path)[0]}.txt", encoding="utf-8") as file:
+            transcripts.append(file.read().strip())
+    source = WavSource(paths)
+    # Recordings start with speech, there is no ambient noise to measure.
+    capture = AudioCaptureService(
+        source_factory=lambda: source,
+        recalibrate_every=0,
+        calibrate=False,
+        idle_pause=True
+    )
+    return SpeechInput(FallbackRecognizer([ReplayBackend(transcripts)]),
+                       capture=capture)
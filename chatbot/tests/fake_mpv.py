@@ -0,0 +1,86 @@
+import json
+import os
+import socket
+import threading
+
+
+class FakeMpvServer:
+    """
+    Minimal stand-in for mpv's IPC server, for the tests and benchmarks.
+
+    Every command is answered with success and recorded in `commands`. A
+    `loadfile` emits `start-file`, then `end-file` with reason "eof" after
+    `duration` seconds unless a `stop` or another `loadfile` comes first.
+    With `starts` False, a `loadfile` is answered but the file never starts,
+    like a stream mpv hangs on.
+    """
+    def __init__(self, socket_path, duration=0.1):
+        self.socket_path = socket_path
+        self.duration = duration
+        self.starts = True
+        self.commands = []
+        self.conn = None
+        self.timer = None
+        self.lock = threading.Lock()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(socket_path)
+        self.server.listen(1)
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _send(self, message):
+        with self.lock:
+            if self.conn is not None:
+                try:
+                    self.conn.sendall(json.dumps(message).encode("utf-8") + b"\n")
+                except OSError:
+                    pass
+
+    def _end(self, reason):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+            self._send({"event": "end-file", "reason": reason})
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.conn = conn
+            buffer = b""
+            while True:
+                try:
+                    data = conn.recv(4096)
+                except OSError:
+                    data = b""
+                if not data:
+                    break
+                buffer += data
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    self._handle(json.loads(line))
+            self.conn = None
+
+    def _handle(self, message):
+        command = message.get("command", [])
+        self.commands.append(command)
+        self._send({"error": "success", "data": None,
+                    "request_id": message.get("request_id")})
+        if command[:1] == ["loadfile"]:
+            self._end("stop")
+            if self.starts:
+                self._send({"event": "start-file"})
+                self.timer = threading.Timer(self.duration, self._end,
+                                             ("eof",))
+                self.timer.start()
+        elif command[:1] == ["stop"]:
+            self._end("stop")
+
+    def close(self):
+        self.server.close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
@@ -0,0 +1,307 @@
+import asyncio
+import os
+import wave
+from concurrent.futures import Future
+
+import pytest
+
+from async_core import ConversationCore
+from chatbot import ChatBot
+from config import load_config
+from metrics import Metrics
+from turn_trace import TraceRecorder, read_trace
+
+OPTIONS = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "data", "options.json")
+WATCH_URL = "https://www.youtube.com/watch?v=aaaaaaaaaaa"
+
+
+class FakeResolver:
+    def __init__(self):
+        self.searches = []
+
+    def search(self, keyword, timer=None):
+        self.searches.append(keyword)
+        return [WATCH_URL]
+
+    def extract_async(self, video_url):
+        future = Future()
+        future.set_result("https://media.invalid/audio")
+        return future
+
+    def prefetch(self, watch_urls):
+        pass
+
+    def cancel(self):
+        pass
+
+
+class FakeLibrary:
+    def set_queue(self, keyword, watch_urls, owner=""):
+        return watch_urls[0]
+
+    def next(self, owner=""):
+        return None
+
+    def current(self, owner=""):
+        return None
+
+    def upcoming(self, count=1, owner=""):
+        return []
+
+
+class FakeConnectivity:
+    online = True
+
+
+class FakeBot:
+    """
+    The parts of `ChatBot` the core uses, with the shipped options.json.
+    """
+    apply_config = ChatBot.apply_config
+    voice_dict = ChatBot.voice_dict
+    router = ChatBot.router
+
+    def __init__(self):
+        self.apply_config(load_config(OPTIONS))
+        self.metrics = Metrics()
+        self.trace = None
+        self.connectivity = FakeConnectivity()
+        self.library = FakeLibrary()
+        self.youtube = FakeResolver()
+        self.questions = []
+        self.answers = {}
+
+    def get_response(self, text):
+        self.questions.append(text)
+        return self.answers.get(text, f"câu trả lời cho {text}")
+
+
+class ScriptedCore(ConversationCore):
+    """
+    Hears what the test puts on `heard`; speech and tracks last `seconds`
+    unless they are stopped.
+    """
+    def __init__(self, bot, seconds=0.5):
+        super().__init__(bot)
+        self.seconds = seconds
+        self.heard = asyncio.Queue()
+        self.audio = {}
+        self.spoken = []
+        self.cut = []
+        self.played = []
+        self.speech_stopped = asyncio.Event()
+        self.speaking = asyncio.Event()
+
+    async def next_utterance(self):
+        text = await self.heard.get()
+        if text is None:
+            raise EOFError
+        return text, self.audio.get(text)
+
+    async def speak(self, text):
+        self.spoken.append(text)
+        self.speaking.set()
+        try:
+            await asyncio.wait_for(self.speech_stopped.wait(), self.seconds)
+            self.cut.append(text)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.speaking.clear()
+
+    def stop_speaking(self):
+        self.speech_stopped.set()
+
+    def resume_speaking(self):
+        self.speech_stopped.clear()
+
+    @property
+    def first_audio_at(self):
+        return None
+
+    async def stop_playback(self, cancel=False):
+        pass
+
+    async def play_video(self, video_url, audio_url):
+        self.played.append(video_url)
+
+    async def interrupt(self, text):
+        """
+        Says `text` as soon as the bot starts speaking.
+        """
+        await self.speaking.wait()
+        await self.heard.put(text)
+
+    async def wait_idle(self):
+        """
+        Waits until the bot waits for input, neither speaking nor playing,
+        and has taken everything it heard.
+        """
+        while (not self.ready.is_set() or self.speaking.is_set()
+               or self.playing is not None or not self.heard.empty()
+               or not self.utterances.empty()):
+            await asyncio.sleep(0.01)
+
+    async def finish(self, task):
+        # Let the turns queued so far run to the end.
+        await asyncio.sleep(self.seconds * 4)
+        await self.heard.put(None)
+        await asyncio.wait_for(task, 5)
+
+
+def converse(mode, script, seconds=0.2, answers=None):
+    """
+    Runs a conversation: `script` is a list of utterances, each said either
+    while the bot waits (`("wait", text)`) or as soon as it starts speaking
+    (`("barge_in", text)`). `answers` maps questions to the bot's answers.
+    """
+    async def run():
+        core = ScriptedCore(FakeBot(), seconds)
+        core.bot.answers.update(answers or {})
+        core.mode = mode
+        core.enter_text = "mở youtube"
+        task = asyncio.create_task(core.run(greet=False))
+        for when, text in script:
+            if when == "barge_in":
+                await core.interrupt(text)
+            else:
+                await core.wait_idle()
+                await core.heard.put(text)
+        await core.finish(task)
+        return core
+
+    return asyncio.run(run())
+
+
+def test_uninterrupted_story_is_answered():
+    core = converse("main", [("wait", "kể chuyện cây khế")])
+
+    assert core.bot.questions == ["cây khế"]
+    assert core.spoken[-1] == "câu trả lời cho cây khế"
+
+
+def test_barge_in_drops_the_rest_of_the_turn():
+    core = converse("main", [("wait", "kể chuyện cây khế"),
+                             ("barge_in", "tắt nhạc")])
+
+    assert len(core.spoken) == 1
+    assert core.cut == core.spoken
+    assert core.bot.questions == []
+
+
+def test_barge_in_during_the_track_prompt_does_not_start_it():
+    core = converse("youtube", [("wait", "sơn tùng"),
+                                ("barge_in", "tắt nhạc")])
+
+    assert core.bot.youtube.searches == ["sơn tùng"]
+    assert core.played == []
+
+
+def test_barge_in_command_is_handled_as_the_next_turn():
+    core = converse("main", [("wait", "xin chào bạn"),
+                             ("barge_in", "mở youtube")])
+
+    assert core.cut == [core.spoken[0]]
+    assert core.mode == "youtube"
+
+
+STORY = ("Ngày xưa có hai anh em mồ côi cha mẹ. Người anh tham lam lấy hết "
+         "ruộng vườn, chỉ để lại cho người em một cây khế ngọt. Một hôm có "
+         "con chim lạ bay đến ăn khế.")
+
+
+def test_story_named_during_an_answer_that_mentions_it_barges_in():
+    core = converse("main", [("wait", "xin chào bạn"),
+                             ("barge_in", "cây khế")],
+                    answers={"xin chào bạn": STORY})
+
+    assert core.cut == [STORY]
+    assert core.bot.questions == ["xin chào bạn", "cây khế"]
+
+
+def test_echo_of_the_answer_is_dropped():
+    core = converse("main", [("wait", "xin chào bạn"),
+                             ("barge_in", "chỉ để lại cho người em một cây khế")],
+                    answers={"xin chào bạn": STORY})
+
+    assert core.cut == []
+    assert core.bot.questions == ["xin chào bạn"]
+
+
+@pytest.mark.parametrize("text, searched", [
+    # Scores 86 against "tắt nhạc": a request, not a stop.
+    ("nhạc thiếu nhi", ["nhạc thiếu nhi"]),
+    ("tắt nhạc đi", []),
+])
+def test_stop_with_nothing_playing_in_youtube_mode(text, searched):
+    core = converse("youtube", [("wait", "xin chào"),
+                                ("barge_in", text)])
+
+    assert core.cut == [core.bot.voice_dict["youtube_hello"]]
+    assert core.bot.youtube.searches == searched
+
+
+def test_same_keyword_with_an_empty_queue():
+    # FakeLibrary.next finds no queue, e.g. after another session reset it.
+    core = converse("youtube", [("wait", "sơn tùng"), ("wait", "sơn tùng")],
+                    seconds=0.05)
+
+    assert core.played == [WATCH_URL]
+    assert core.spoken[-1] == core.bot.voice_dict["queue_empty"]
+
+
+def test_trace_keeps_the_audio_of_each_utterance(tmp_path):
+    trace = TraceRecorder(str(tmp_path / "trace.jsonl"), audio=True)
+    audio = {"xin chào bạn": b"\x01\x00" * 1600,
+             "tắt nhạc": b"\x02\x00" * 800}
+
+    async def run():
+        core = ScriptedCore(FakeBot())
+        core.bot.trace = trace
+        core.audio = audio
+        task = asyncio.create_task(core.run(greet=False))
+        await core.heard.put("xin chào bạn")
+        await core.interrupt("tắt nhạc")
+        await core.finish(task)
+
+    trace.start()
+    asyncio.run(run())
+    trace.stop()
+
+    turns = read_trace(trace.path)
+    assert sorted(turn["text"] for turn in turns) == sorted(audio)
+    for turn in turns:
+        with wave.open(os.path.join(trace.audio_dir, turn["audio"])) as wav:
+            assert wav.readframes(wav.getnframes()) == audio[turn["text"]]
+
+
+def test_youtube_mode_returns_when_the_user_leaves_it():
+    async def run():
+        core = ScriptedCore(FakeBot(), seconds=0.05)
+        task = asyncio.create_task(core.youtube_mode("mở youtube"))
+        for text in ("sơn tùng", "thoát youtube"):
+            await core.wait_idle()
+            await core.heard.put(text)
+        return core, await asyncio.wait_for(task, 5)
+
+    core, entered = asyncio.run(run())
+
+    assert entered
+    assert core.mode == "main"
+    assert core.bot.youtube.searches == ["sơn tùng"]
+    assert core.played == [WATCH_URL]
+    # The caller answers the utterance that entered youtube mode.
+    assert core.bot.questions == []
+    assert core.spoken[-1] == "thoát youtube"
+
+
+def test_youtube_mode_ignores_other_utterances():
+    async def run():
+        core = ScriptedCore(FakeBot())
+        return core, await core.youtube_mode("xin chào bạn")
+
+    core, entered = asyncio.run(run())
+
+    assert not entered
+    assert core.spoken == []
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from audio_output import SAMPLE_RATE, AudioMixer, NullSink  # noqa: E402
+
+
+def tone(mixer, level, blocks=1):
+    return np.full(mixer.block_frames * 2 * blocks, level,
+                   dtype=np.int16).tobytes()
+
+
+def peak(block):
+    return int(np.abs(np.frombuffer(block, dtype=np.int16)).max())
+
+
+def test_speech_ducks_the_music_and_releases_it():
+    # 20 ms blocks and a 100 ms fade: 0.2 of gain per block.
+    mixer = AudioMixer(NullSink(), duck_gain=0.3, fade_ms=100, block_ms=20)
+    music = tone(mixer, 10000)
+
+    mixer.speech.begin()
+    ducked = [peak(mixer.mix(music, b"")) for _ in range(6)]
+    mixer.speech.finish()
+    released = [peak(mixer.mix(music, b"")) for _ in range(6)]
+
+    # Each block ramps from the gain of the previous one, the peak is at
+    # its louder end.
+    assert ducked == pytest.approx([10000, 8000, 6000, 4000, 3000, 3000],
+                                   abs=5)
+    assert released == pytest.approx([5000, 7000, 9000, 10000, 10000, 10000],
+                                     abs=5)
+
+
+def test_ramps_are_smooth_within_a_block():
+    mixer = AudioMixer(NullSink(), duck_gain=0.3, fade_ms=100, block_ms=20)
+    mixer.speech.begin()
+    block = np.frombuffer(mixer.mix(tone(mixer, 10000), b""), dtype=np.int16)
+
+    # No click: the gain changes by a fraction of the fade per frame.
+    steps = np.abs(np.diff(block[::2].astype(np.int32)))
+    assert steps.max() <= 10000 * mixer.duck_step / mixer.block_frames + 1
+
+
+def test_speech_is_not_ducked():
+    mixer = AudioMixer(NullSink(), duck_gain=0.3)
+    mixer.speech.begin()
+    for _ in range(20):
+        block = mixer.mix(tone(mixer, 4000), tone(mixer, 4000))
+
+    assert peak(block) == pytest.approx(4000 * 0.3 + 4000, abs=2)
+
+
+def test_volume_defaults_to_unity():
+    mixer = AudioMixer(NullSink())
+
+    assert mixer.volume == 100
+    assert peak(mixer.mix(tone(mixer, 10000), b"")) == 10000
+
+
+def test_volume_is_kept_across_restarts(tmp_path):
+    volume_file = str(tmp_path / "volume")
+    mixer = AudioMixer(NullSink(), volume_file=volume_file)
+
+    assert mixer.change_volume(20, increase=False)
+    assert AudioMixer(NullSink(), volume_file=volume_file).volume == 80
+
+
+def test_volume_scales_speech_and_music():
+    mixer = AudioMixer(NullSink(), volume=50)
+    block = mixer.mix(tone(mixer, 8000), tone(mixer, 4000))
+
+    assert peak(block) == pytest.approx(12000 * 0.25, abs=2)
+
+
+def test_mixer_thread_ducks_music_on_the_sink():
+    sink = NullSink(history=100)
+    mixer = AudioMixer(sink, duck_gain=0.3, fade_ms=100, block_ms=20)
+    mixer.start()
+    try:
+        writer = threading.Thread(target=mixer.music.write,
+                                  args=(tone(mixer, 10000, blocks=50),),
+                                  daemon=True)
+        writer.start()
+        time.sleep(0.2)
+        mixer.speech.begin()
+        # Silent speech: only the music is heard, ducked.
+        mixer.speech.write(bytes(SAMPLE_RATE // 5 * 4))
+        mixer.speech.finish()
+        assert mixer.speech.wait_drained(timeout=2)
+        time.sleep(0.3)
+    finally:
+        mixer.stop()
+
+    levels = [peak(block) for block in sink.blocks if peak(block)]
+    assert levels[0] == pytest.approx(10000, abs=2)
+    assert min(levels) == pytest.approx(3000, abs=2)
+    assert levels[-1] == pytest.approx(10000, abs=2)
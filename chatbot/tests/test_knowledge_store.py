@@ -0,0 +1,44 @@
+import os
+import sqlite3
+
+import pytest
+
+from knowledge_store import KnowledgeStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = os.path.join(tmp_path, "chatbot.db")
+    store = KnowledgeStore(path)
+    store.import_rows([("con mèo kêu thế nào", "meo meo", ["mèo kêu ra sao"])])
+    store.close()
+    return path
+
+
+def test_rows_written_by_another_client_are_indexed_on_open(path):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("INSERT INTO responses (question, answer) "
+                     "VALUES ('con chó sủa thế nào', 'gâu gâu')")
+        conn.execute("INSERT INTO aliases (response_id, alias) "
+                     "VALUES (last_insert_rowid(), 'chó kêu ra sao')")
+    conn.close()
+
+    store = KnowledgeStore(path)
+    assert store.get_answer("con chó sủa thế nào") == "gâu gâu"
+    assert store.get_answer("chó kêu ra sao") == "gâu gâu"
+    assert store.get_answer("mèo kêu ra sao") == "meo meo"
+    store.close()
+
+
+def test_reindex_after_another_client_edits_a_question(path):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("UPDATE responses SET question = 'tiếng mèo kêu'")
+    conn.close()
+
+    store = KnowledgeStore(path)
+    store.reindex()
+    assert store.get_answer("tiếng mèo kêu") == "meo meo"
+    assert store.get_answer("con mèo kêu thế nào") is None
+    store.close()
@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+
+import pytest
+
+from fake_mpv import FakeMpvServer
+from mpv_player import MpvPlayer, PlayerError
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return os.path.join(tmp_path, "mpv.sock")
+
+
+@pytest.fixture
+def server(socket_path):
+    server = FakeMpvServer(socket_path, duration=0.1)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def player(socket_path, server):
+    player = MpvPlayer(socket_path=socket_path, spawn=False, timeout=2)
+    yield player
+    player.close()
+
+
+def test_play_waits_for_the_end_of_the_track(player, server):
+    start = time.monotonic()
+
+    assert player.play("https://media.invalid/a") == "eof"
+    assert time.monotonic() - start >= 0.1
+    assert server.commands == [["loadfile", "https://media.invalid/a",
+                                "replace"]]
+
+
+def test_play_twice_on_one_connection(player, server):
+    assert player.play("https://media.invalid/a") == "eof"
+    assert player.play("https://media.invalid/b") == "eof"
+    assert [command[1] for command in server.commands] == [
+        "https://media.invalid/a", "https://media.invalid/b"]
+
+
+def test_stop_ends_play(player, server):
+    server.duration = 10
+    stopper = threading.Timer(0.1, player.stop)
+    stopper.start()
+    start = time.monotonic()
+
+    assert player.play("https://media.invalid/a") == "stop"
+    assert time.monotonic() - start < 5
+    stopper.join()
+    assert server.commands[-1] == ["stop"]
+
+
+def test_stop_while_idle_is_harmless(player, server):
+    player.stop()
+
+    assert player.play("https://media.invalid/a") == "eof"
+
+
+def test_stop_that_reaches_mpv_before_the_file_ends_play(player, server):
+    server.duration = 10
+    load = player.load
+
+    def load_after_a_stop(url):
+        # A stop from another thread that wins the race with the loadfile.
+        player.stop()
+        load(url)
+
+    player.load = load_after_a_stop
+
+    assert player.play("https://media.invalid/a") == "stop"
+    assert server.commands[-1] == ["stop"]
+
+
+def test_file_that_never_starts_raises(player, server):
+    server.starts = False
+    player.timeout = 0.2
+
+    with pytest.raises(PlayerError):
+        player.play("https://media.invalid/a")
+    assert server.commands[-1] == ["stop"]
+
+
+def test_unreachable_mpv_raises(socket_path):
+    player = MpvPlayer(socket_path=socket_path, spawn=False, timeout=0.2)
+
+    with pytest.raises(PlayerError):
+        player.play("https://media.invalid/a")
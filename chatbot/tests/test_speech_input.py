@@ -0,0 +1,151 @@
+import math
+import os
+import struct
+import time
+import wave
+
+import pytest
+
+from speech_input import (FallbackRecognizer, RecognitionError,
+                          RecognitionSession, ReplayBackend,
+                          replay_speech_input)
+
+
+class FailingBackend:
+    """
+    Backend that fails every phrase, like Google without a connection.
+    """
+    def __init__(self, name="failing", needs_network=False):
+        self.name = name
+        self.needs_network = needs_network
+        self.calls = 0
+
+    def session(self, language):
+        return RecognitionSession(self, language)
+
+    def recognize(self, pcm, language):
+        self.calls += 1
+        raise RecognitionError("unreachable")
+
+
+class Connectivity:
+    def __init__(self, online=True):
+        self.online = online
+        self.failures = 0
+
+    def report_failure(self):
+        self.failures += 1
+
+
+def recognize(recognizer, pcm=b"\0\0"):
+    backend, session = recognizer.session("vi-VN")
+    if session is not None:
+        session.feed(pcm)
+    return recognizer.finish(backend, session, pcm, "vi-VN")
+
+
+def expire(recognizer):
+    for name in recognizer.retry_at:
+        recognizer.retry_at[name] = 0
+
+
+def test_falls_back_to_the_next_backend():
+    failing = FailingBackend()
+    recognizer = FallbackRecognizer([failing, ReplayBackend(["xin chào"])])
+
+    assert recognize(recognizer) == "xin chào"
+    assert failing.calls == 1
+
+
+def test_failed_backend_is_skipped_during_its_cool_down():
+    failing = FailingBackend()
+    replay = ReplayBackend(["một", "hai"])
+    recognizer = FallbackRecognizer([failing, replay], min_backoff=5)
+
+    recognize(recognizer)
+    assert recognizer.available() == [replay]
+    assert recognizer.retry_at["failing"] - time.monotonic() == pytest.approx(
+        5, abs=0.5)
+
+    backend, _ = recognizer.session("vi-VN")
+    assert backend is replay
+    assert recognize(recognizer) == "hai"
+    assert failing.calls == 1
+
+
+def test_cool_down_doubles_up_to_the_maximum():
+    failing = FailingBackend()
+    recognizer = FallbackRecognizer([failing, ReplayBackend([""] * 4)],
+                                    min_backoff=5, max_backoff=12)
+
+    delays = []
+    for _ in range(3):
+        recognize(recognizer)
+        delays.append(recognizer.backoff["failing"])
+        expire(recognizer)
+    assert delays == [5, 10, 12]
+
+
+def test_success_resets_the_cool_down():
+    failing = FailingBackend()
+    replay = ReplayBackend(["một", "hai"])
+    recognizer = FallbackRecognizer([replay, failing], min_backoff=5)
+    recognizer.failed(replay, RecognitionError("timeout"))
+    expire(recognizer)
+
+    assert recognize(recognizer) == "một"
+    assert "replay" not in recognizer.backoff
+    assert "replay" not in recognizer.retry_at
+
+
+def test_every_backend_failing_raises():
+    recognizer = FallbackRecognizer([FailingBackend("a"), FailingBackend("b")])
+
+    with pytest.raises(RecognitionError):
+        recognize(recognizer)
+    assert recognizer.available() == []
+    assert recognizer.session("vi-VN") == (None, None)
+
+
+def test_network_backends_are_skipped_while_offline():
+    connectivity = Connectivity(online=False)
+    online = FailingBackend("google", needs_network=True)
+    replay = ReplayBackend(["xin chào"])
+    recognizer = FallbackRecognizer([online, replay],
+                                    connectivity=connectivity)
+
+    assert recognize(recognizer) == "xin chào"
+    assert online.calls == 0
+
+    connectivity.online = True
+    recognize(recognizer)
+    assert online.calls == 1
+    assert connectivity.failures == 1
+
+
+def write_utterance(path, text, seconds=0.6):
+    samples = int(16000 * seconds)
+    data = b"".join(
+        struct.pack("<h", int(4000 * math.sin(2 * math.pi * 220 * i / 16000)))
+        for i in range(samples))
+    with wave.open(f"{path}.wav", "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(data)
+    with open(f"{path}.txt", "w", encoding="utf-8") as file:
+        file.write(text)
+
+
+def test_replay_speech_input_returns_the_transcripts_in_order(tmp_path):
+    pytest.importorskip("speech_recognition")
+    write_utterance(os.path.join(tmp_path, "000"), "Xin chào")
+    write_utterance(os.path.join(tmp_path, "001"), "kể chuyện")
+    speech_input = replay_speech_input(str(tmp_path))
+    speech_input.timeout = 5
+
+    assert speech_input.listen() == "Xin chào"
+    text, pcm = speech_input.listen(audio=True)
+    assert text == "kể chuyện" and pcm
+    with pytest.raises(EOFError):
+        speech_input.listen()
@@ -0,0 +1,57 @@
+import threading
+import time
+
+from tts_stream import StreamingSpeaker
+
+
+class SlowCache:
+    """
+    Renders a chunk in `seconds`, or until `release` is set.
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.release = threading.Event()
+        self.rendered = []
+
+    def render(self, chunk, lang):
+        self.release.wait(self.seconds)
+        self.rendered.append(chunk)
+        return chunk
+
+
+class FakePlayer:
+    def __init__(self):
+        self.played = []
+
+    def play(self, mp3_file):
+        self.played.append(mp3_file)
+        return True
+
+    def stop(self):
+        pass
+
+
+def test_stop_returns_during_a_synthesis():
+    cache, player = SlowCache(5), FakePlayer()
+    speaker = StreamingSpeaker(cache, player)
+    threading.Timer(0.1, speaker.stop).start()
+
+    started = time.perf_counter()
+    assert speaker.speak("Một câu. Hai câu.")
+
+    assert time.perf_counter() - started < 1
+    assert player.played == []
+    cache.release.set()
+
+
+def test_stop_before_the_text_holds_until_resume():
+    cache, player = SlowCache(0), FakePlayer()
+    speaker = StreamingSpeaker(cache, player)
+
+    speaker.stop()
+    speaker.speak("Xin chào.")
+    assert player.played == []
+
+    speaker.resume()
+    speaker.speak("Xin chào.")
+    assert player.played == ["Xin chào."]
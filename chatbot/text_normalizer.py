@@ -0,0 +1,110 @@
+import re
+import unicodedata
+
+DIGITS = ("không", "một", "hai", "ba", "bốn", "năm", "sáu", "bảy", "tám", "chín")
+SCALES = ("", "nghìn", "triệu", "tỷ")
+
+# Plain digit runs, or integers with "." as the thousands separator, as the
+# recognizer writes them ("1.000").
+NUMBER_PATTERN = re.compile(r"\d{1,3}(?:\.\d{3})+(?!\d)|\d+")
+# Everything but letters and digits, underscores included.
+SEPARATOR_PATTERN = re.compile(r"[\W_]+")
+
+
+def fold_diacritics(text):
+    """
+    Removes Vietnamese diacritics and lowercases a string, e.g. "Thánh
+    Gióng" becomes "thanh giong". "đ" is folded to "d" as well, which
+    Unicode decomposition alone does not do.
+
+    Args:
+        text (str): The string to fold.
+
+    Returns:
+        str: The folded string.
+    """
+    decomposed = unicodedata.normalize("NFD", text.lower())
+    stripped = "".join(char for char in decomposed
+                       if not unicodedata.combining(char))
+    return stripped.replace("đ", "d")
+
+
+def _read_hundreds(number, full):
+    hundreds, tens, units = number // 100, number // 10 % 10, number % 10
+    words = []
+    if full or hundreds:
+        words += [DIGITS[hundreds], "trăm"]
+    if tens == 0:
+        if units and words:
+            words.append("linh")
+    elif tens == 1:
+        words.append("mười")
+    else:
+        words += [DIGITS[tens], "mươi"]
+    if units:
+        if units == 5 and tens:
+            words.append("lăm")
+        elif units == 1 and tens > 1:
+            words.append("mốt")
+        else:
+            words.append(DIGITS[units])
+    return words
+
+
+def number_to_words(number):
+    """
+    Spells out a non-negative integer in Vietnamese, e.g. 21 becomes "hai
+    mươi mốt" and 1005 "một nghìn không trăm linh năm".
+
+    Args:
+        number (int): The number, below one thousand billion.
+
+    Returns:
+        str: The number in words, or its digits if it is too large.
+    """
+    if number == 0:
+        return DIGITS[0]
+    groups = []
+    rest = number
+    while rest:
+        groups.append(rest % 1000)
+        rest //= 1000
+    if len(groups) > len(SCALES):
+        return str(number)
+    words = []
+    for index in range(len(groups) - 1, -1, -1):
+        if groups[index]:
+            words += _read_hundreds(groups[index], full=bool(words))
+            if SCALES[index]:
+                words.append(SCALES[index])
+    return " ".join(words)
+
+
+def _spell_number(match):
+    return f" {number_to_words(int(match.group().replace('.', '')))} "
+
+
+def normalize_text(text, fold=True, numbers=True):
+    """
+    Brings a phrase to the form every matcher compares.
+
+    The text is composed to Unicode NFC and lowercased, so precomposed and
+    combining spellings of the same letter are equal. Numbers are spelled
+    out ("tập 2" and "tập hai" are equal), diacritics are folded if asked,
+    punctuation becomes a space and runs of whitespace collapse to one. The
+    result is a fixed point: normalizing it again changes nothing.
+
+    Args:
+        text (str): The phrase.
+        fold (bool): Whether to remove diacritics.
+        numbers (bool): Whether to spell out numbers.
+
+    Returns:
+        str: The normalized phrase.
+    """
+    text = unicodedata.normalize("NFC", text).lower()
+    if numbers:
+        text = NUMBER_PATTERN.sub(_spell_number, text)
+    if fold:
+        text = fold_diacritics(text)
+    return " ".join(SEPARATOR_PATTERN.sub(" ", text).split())
@@ -0,0 +1,165 @@
+"""
+Thin client of the server mode: the microphone, speaker and player of a
+device whose conversation runs on `server.py`.
+
+Usage:
+    python3 thin_client.py ws://HOST:8765 [--session ID]
+"""
+import argparse
+import asyncio
+import json
+import os
+import queue
+import tempfile
+import threading
+import uuid
+
+from audio_capture import AudioCaptureService, CaptureTimeout
+from audio_output import Mpg123Decoder, change_device_volume, open_mixer
+from mpv_player import MpvPlayer, PlayerError
+
+# The client's own files, next to this module whatever the working directory.
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+class ThinClient:
+    """
+    Streams every phrase the microphone hears to the server as PCM and
+    plays what it sends back: speech through a long-lived mpg123 and
+    tracks through mpv, both mixed by one `AudioMixer` so speech ducks the
+    music. Recognition, answers and synthesis all run on the server; the
+    protocol is described in `server.SessionCore`.
+
+    The session id is kept in `session_file`, so the play queue survives
+    a restart of the client.
+    """
+    def __init__(self, url, session_file=os.path.join(DATA_DIR, "session_id"),
+                 session_id=None):
+        self.url = url
+        self.session_id = session_id or self.load_session_id(session_file)
+        self.capture = AudioCaptureService()
+        self.mixer = open_mixer(os.path.join(DATA_DIR, "volume"))
+        self.decoder = Mpg123Decoder(self.mixer)
+        self.player = MpvPlayer(
+            audio_args=self.mixer.mpv_args(
+                os.path.join(tempfile.gettempdir(), "chatbot-client.pcm"))
+            if self.mixer is not None else ())
+        self.speech = queue.Queue()
+        self.speech_dir = tempfile.mkdtemp(prefix="chatbot-speech-")
+
+    @staticmethod
+    def load_session_id(path):
+        try:
+            with open(path) as file:
+                return file.read().strip()
+        except FileNotFoundError:
+            session_id = str(uuid.uuid4())
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w") as file:
+                file.write(session_id)
+            return session_id
+
+    def speak_loop(self):
+        """
+        Plays the received speech chunks in order, in a thread.
+        """
+        path = os.path.join(self.speech_dir, "speech.mp3")
+        while True:
+            mp3 = self.speech.get()
+            if mp3 is None:
+                return
+            with open(path, "wb") as file:
+                file.write(mp3)
+            self.decoder.play(path)
+
+    def stop_speech(self):
+        while True:
+            try:
+                self.speech.get_nowait()
+            except queue.Empty:
+                break
+        self.decoder.stop()
+
+    def play(self, url):
+        try:
+            return self.player.play(url)
+        except PlayerError as e:
+            print(f"Error: {e}")
+            return "error"
+
+    async def send_phrases(self, connection):
+        loop = asyncio.get_running_loop()
+        with self.capture.subscribe() as subscription:
+            while True:
+                try:
+                    pcm = await loop.run_in_executor(
+                        None, subscription.next_phrase, None, 60)
+                except CaptureTimeout:
+                    continue
+                await connection.send(pcm)
+
+    async def track(self, connection, url):
+        reason = await asyncio.to_thread(self.play, url)
+        await connection.send(json.dumps({"type": "ended",
+                                          "reason": reason}))
+
+    async def receive(self, connection):
+        async for message in connection:
+            if isinstance(message, bytes):
+                self.speech.put(message)
+                continue
+            message = json.loads(message)
+            kind = message.get("type")
+            if kind == "transcript":
+                print(f"You said: {message['text']}")
+            elif kind == "speech":
+                print(f"Bot: {message['text']}")
+            elif kind == "stop_speech":
+                self.stop_speech()
+            elif kind == "play":
+                asyncio.create_task(self.track(connection, message["url"]))
+            elif kind == "stop":
+                await asyncio.to_thread(self.player.stop)
+            elif kind == "volume" and self.mixer is not None:
+                self.mixer.change_volume(message["step"], message["increase"])
+            elif kind == "volume":
+                await asyncio.to_thread(change_device_volume, message["step"],
+                                        message["increase"])
+
+    async def run(self):
+        """
+        Connects to the server, reconnecting with the same session id when
+        the connection drops.
+        """
+        import websockets
+
+        threading.Thread(target=self.speak_loop, daemon=True).start()
+        while True:
+            try:
+                async with websockets.connect(self.url) as connection:
+                    await connection.send(json.dumps(
+                        {"type": "hello", "session": self.session_id}))
+                    sender = asyncio.create_task(
+                        self.send_phrases(connection))
+                    try:
+                        await self.receive(connection)
+                    finally:
+                        sender.cancel()
+            except (OSError, websockets.ConnectionClosed) as e:
+                print(f"Error: connection to the server lost. {e}")
+            self.stop_speech()
+            await asyncio.to_thread(self.player.stop)
+            await asyncio.sleep(5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("url", help="the server, e.g. ws://192.168.1.10:8765")
+    parser.add_argument("--session", help="session id, kept in "
+                                          "data/session_id by default")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(ThinClient(args.url, session_id=args.session).run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import threading
+
+
+class TTSCache:
+    """
+    On-disk cache of gTTS renderings.
+
+    Each MP3 is stored under the hash of its text and language, so a phrase
+    is synthesized over the network once and then played from disk, also
+    while offline. The total size is capped and the least recently played
+    files are evicted first; the file modification time records the last
+    use.
+    """
+    def __init__(self, cache_dir, max_bytes=100 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.sizes = {}
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".mp3"):
+                path = os.path.join(self.cache_dir, name)
+                self.sizes[path] = os.path.getsize(path)
+        self.total_bytes = sum(self.sizes.values())
+
+    def path_for(self, text, lang="vi"):
+        """
+        Returns the cache path of a phrase, whether or not it is cached.
+
+        Args:
+            text (str): The text to be converted to speech.
+            lang (str): The gTTS language code.
+
+        Returns:
+            str: Path of the MP3 file.
+        """
+        key = hashlib.sha1(f"{lang}\0{text}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def contains(self, text, lang="vi"):
+        """
+        Tells whether a phrase is cached, without marking it as used.
+        """
+        with self.lock:
+            return self.path_for(text, lang) in self.sizes
+
+    def get(self, text, lang="vi"):
+        """
+        Looks a phrase up and marks it as recently used.
+
+        Args:
+            text (str): The text to be converted to speech.
+            lang (str): The gTTS language code.
+
+        Returns:
+            str or None: Path of the cached MP3, or `None` on a miss.
+        """
+        path = self.path_for(text, lang)
+        with self.lock:
+            if path not in self.sizes:
+                return None
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                self.total_bytes -= self.sizes.pop(path)
+                return None
+        return path
+
+    def render(self, text, lang="vi"):
+        """
+        Returns the MP3 of a phrase, synthesizing it with gTTS on a miss.
+
+        Args:
+            text (str): The text to be converted to speech.
+            lang (str): The gTTS language code.
+
+        Returns:
+            str: Path of the MP3 file.
+
+        Raises:
+            Exception: Any gTTS error when the phrase is not cached and
+            cannot be synthesized, e.g. without internet.
+        """
+        path = self.get(text, lang)
+        if path:
+            return path
+        path = self.path_for(text, lang)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            # gtts is imported on the first miss, a warm cache never needs it.
+            from gtts import gTTS
+            gTTS(text=text, lang=lang).save(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self.lock:
+            size = os.path.getsize(path)
+            self.total_bytes += size - self.sizes.get(path, 0)
+            self.sizes[path] = size
+            self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """
+        Removes the least recently used files until the cache fits its cap.
+        Must be called with `self.lock` held.
+
+        Args:
+            keep (str): A path that must not be evicted.
+        """
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        def last_used(path):
+            try:
+                return os.path.getmtime(path)
+            except FileNotFoundError:
+                return 0
+
+        for path in sorted(self.sizes, key=last_used):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= self.sizes.pop(path)
+
+    def warm_up(self, texts, lang="vi"):
+        """
+        Renders every phrase that is not cached yet.
+
+        Args:
+            texts (iterable[str]): The phrases to pre-render.
+            lang (str): The gTTS language code.
+
+        Returns:
+            tuple: (number of phrases rendered, number of failures)
+        """
+        rendered = failed = 0
+        for text in dict.fromkeys(texts):
+            if not text or self.get(text, lang):
+                continue
+            try:
+                self.render(text, lang)
+                rendered += 1
+            except Exception as e:
+                print(f"Error rendering '{text[:40]}': {e}")
+                failed += 1
+        return rendered, failed
@@ -0,0 +1,181 @@
+import queue
+import re
+import threading
+import time
+
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\n+")
+CLAUSE_END = re.compile(r"(?<=[,;:])\s+")
+
+
+def split_text(text, first_chars=80, max_chars=200):
+    """
+    Splits a text into chunks on sentence and clause boundaries.
+
+    Sentences longer than `max_chars` are split on commas, semicolons and
+    colons, and short pieces are merged back up to `max_chars`. The first
+    sentence and chunk use the lower `first_chars` limit so the first chunk
+    is synthesized quickly.
+
+    Args:
+        text (str): The text to split.
+        first_chars (int): Preferred maximum length of the first chunk.
+        max_chars (int): Preferred maximum length of the other chunks.
+
+    Returns:
+        list[str]: The chunks, in order.
+    """
+    pieces = []
+    for sentence in SENTENCE_END.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= (max_chars if pieces else first_chars):
+            pieces.append(sentence)
+        else:
+            pieces.extend(part.strip() for part in CLAUSE_END.split(sentence)
+                          if part.strip())
+
+    chunks = []
+    for piece in pieces:
+        limit = first_chars if len(chunks) == 1 else max_chars
+        if chunks and len(chunks[-1]) + 1 + len(piece) <= limit:
+            chunks[-1] = f"{chunks[-1]} {piece}"
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+class StreamingSpeaker:
+    """
+    Producer/consumer text-to-speech pipeline.
+
+    A worker thread renders chunk N+1 through the TTS cache while chunk N is
+    playing, so a long answer starts speaking as soon as its first sentence
+    is synthesized. `stop` interrupts the current text from another thread
+    and silences the speaker until `resume`.
+
+    With a `Metrics` registry, the synthesis and playback of every chunk are
+    timed separately ("speak_synthesis", "speak_playback"), as is the delay
+    until the first chunk plays ("speak_first_audio").
+    """
+    def __init__(self, tts_cache, player, prefetch=2, metrics=None):
+        self.tts_cache = tts_cache
+        self.player = player
+        self.prefetch = prefetch
+        self.metrics = metrics
+        self.interrupted = threading.Event()
+        self.started_at = None
+        self.first_audio_at = None
+
+    def stop(self):
+        """
+        Interrupts the text being spoken, e.g. when the user barges in.
+        """
+        self.interrupted.set()
+        self.player.stop()
+
+    def resume(self):
+        """
+        Lets the speaker talk again after `stop`, when a new turn starts.
+        """
+        self.interrupted.clear()
+
+    def is_cached(self, text, lang="vi"):
+        """
+        Tells whether every chunk of a text can be played from the TTS cache,
+        i.e. without network.
+        """
+        return all(self.tts_cache.contains(chunk, lang)
+                   for chunk in split_text(text))
+
+    def _render(self, chunk, lang):
+        if self.metrics is None:
+            return self.tts_cache.render(chunk, lang)
+        with self.metrics.time("speak_synthesis"):
+            return self.tts_cache.render(chunk, lang)
+
+    def _play(self, mp3_file):
+        if self.first_audio_at is None:
+            self.first_audio_at = time.perf_counter()
+            if self.metrics is not None:
+                self.metrics.observe("speak_first_audio",
+                                     self.first_audio_at - self.started_at)
+        if self.metrics is None:
+            return self.player.play(mp3_file)
+        with self.metrics.time("speak_playback"):
+            return self.player.play(mp3_file)
+
+    def _produce(self, chunks, lang, out, stop):
+        for chunk in chunks:
+            if stop.is_set():
+                return
+            try:
+                item = self._render(chunk, lang)
+            except Exception as e:
+                item = e
+            if not self._put(out, item, stop) or isinstance(item, Exception):
+                return
+        self._put(out, None, stop)
+
+    @staticmethod
+    def _put(out, item, stop):
+        # Gives up once the text is abandoned, so the worker never blocks on
+        # a full queue nobody reads.
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def speak(self, text, lang="vi"):
+        """
+        Synthesizes and plays a text chunk by chunk.
+
+        Returns as soon as `stop` is called, even during a synthesis; the
+        worker finishes the chunk it is rendering in the background. A stop
+        holds until `resume`, so a barge-in heard just before the text
+        starts also silences it.
+
+        Args:
+            text (str): The text to be converted to speech.
+            lang (str): The gTTS language code.
+
+        Returns:
+            bool: True if every chunk was played or speech was interrupted,
+            False if a chunk could not be synthesized or played.
+        """
+        self.started_at = time.perf_counter()
+        self.first_audio_at = None
+        chunks = split_text(text)
+        if not chunks or self.interrupted.is_set():
+            return True
+
+        rendered = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        worker = threading.Thread(
+            target=self._produce,
+            args=(chunks, lang, rendered, stop),
+            daemon=True
+        )
+        worker.start()
+        played = True
+        try:
+            while not self.interrupted.is_set():
+                try:
+                    item = rendered.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+                if item is None or self.interrupted.is_set():
+                    break
+                if isinstance(item, Exception):
+                    print(f"Error synthesizing speech: {item}")
+                    played = False
+                    break
+                if not self._play(item):
+                    played = False
+                    break
+        finally:
+            stop.set()
+        return played
@@ -0,0 +1,184 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+import wave
+
+from audio_capture import SAMPLE_RATE, SAMPLE_WIDTH
+from metrics import rotate_file
+
+
+def read_trace(path):
+    """
+    Reads the turns of a trace file, skipping lines that are cut off.
+
+    Returns:
+        list: One dict per turn, in the order they were recorded.
+    """
+    turns = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                turns.append(json.loads(line))
+            except ValueError:
+                continue
+    return turns
+
+
+class TraceRecorder:
+    """
+    Records every turn of the conversation to a JSON Lines file, one line
+    per turn, so mis-routes and slowdowns seen in production can be
+    replayed offline with bench/replay_trace.py.
+
+    A turn is:
+
+    - "session": random id of the process, "turn": its number.
+    - "time", "mode" ("main" or "youtube") and "text", what was heard.
+    - "routes": every routing decision of the turn, as [intent or null,
+      score, matched option, the intents tried].
+    - "branch": the path the turn took, e.g. "answer", "story", "search".
+    - "stages": the durations `Metrics` recorded since the previous turn,
+      by stage, e.g. "listen_recognition", "get_response", "turn".
+    - "audio": with `audio`, the name of a WAV file of the phrase the
+      text was recognized from, in `<path>.audio/`.
+
+    The conversation only builds the record and puts it on a bounded
+    queue; a daemon thread writes it. When the writer falls behind the
+    record is dropped and counted in `dropped`, so tracing never slows a
+    turn down. The file is rotated at `max_bytes` like the metrics file,
+    and the oldest WAV files are deleted beyond `max_audio_bytes`.
+    """
+    def __init__(self, path, audio=False, max_bytes=5 * 1024 * 1024,
+                 backups=3, max_audio_bytes=50 * 1024 * 1024,
+                 queue_size=256):
+        self.path = path
+        self.audio_dir = f"{path}.audio" if audio else None
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.max_audio_bytes = max_audio_bytes
+        self.session = uuid.uuid4().hex[:8]
+        self.turns = 0
+        self.dropped = 0
+        self.stages = []
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.audio_bytes = None
+
+    def start(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)),
+                    exist_ok=True)
+        if self.audio_dir:
+            os.makedirs(self.audio_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Writes the records still queued and stops the writer thread.
+        """
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join(timeout=5)
+            self.thread = None
+        if self.dropped:
+            print(f"Trace: {self.dropped} turns dropped, the writer fell "
+                  f"behind.")
+
+    # Collection, from the conversation's threads.
+
+    def observe(self, stage, seconds):
+        """
+        `Metrics` listener collecting the stage durations of the turn.
+        """
+        with self.lock:
+            self.stages.append((stage, seconds))
+
+    def record(self, mode, text, routes, branch, audio=None):
+        """
+        Queues the record of a finished turn.
+
+        Args:
+            mode (str): The mode the turn was handled in.
+            text (str): The recognized utterance.
+            routes (list): `(intents, Route)` of every routing decision.
+            branch (str): The path the turn took.
+            audio (bytes): The phrase `text` was recognized from, if known.
+        """
+        with self.lock:
+            stages, self.stages = self.stages, []
+        phrase = audio if self.audio_dir else None
+        durations = {}
+        for stage, seconds in stages:
+            durations.setdefault(stage, []).append(round(seconds, 6))
+        self.turns += 1
+        entry = {
+            "session": self.session,
+            "turn": self.turns,
+            "time": round(time.time(), 3),
+            "mode": mode,
+            "text": text,
+            "routes": [[route.intent, route.score, route.option, list(intents)]
+                       for intents, route in routes],
+            "branch": branch,
+            "stages": durations,
+        }
+        if phrase is not None:
+            entry["audio"] = f"{self.session}-{self.turns:06d}.wav"
+        try:
+            self.queue.put_nowait((entry, phrase))
+        except queue.Full:
+            self.dropped += 1
+
+    # Writing, in the writer thread.
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            entry, phrase = item
+            try:
+                if phrase is not None:
+                    self.write_audio(entry["audio"], phrase)
+                self.write(json.dumps(entry, ensure_ascii=False))
+            except OSError as e:
+                print(f"Error: unable to write the trace. {e}")
+
+    def write(self, line):
+        if (os.path.exists(self.path)
+                and os.path.getsize(self.path) + len(line) > self.max_bytes):
+            rotate_file(self.path, self.backups)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+    def write_audio(self, name, pcm):
+        with wave.open(os.path.join(self.audio_dir, name), "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(SAMPLE_WIDTH)
+            wav.setframerate(SAMPLE_RATE)
+            wav.writeframes(pcm)
+        if self.audio_bytes is None:
+            self.audio_bytes = sum(entry.stat().st_size for entry
+                                   in os.scandir(self.audio_dir))
+        else:
+            self.audio_bytes += len(pcm) + 44
+        if self.audio_bytes > self.max_audio_bytes:
+            self.prune_audio()
+
+    def prune_audio(self):
+        """
+        Deletes the oldest WAV files until the directory is 10% below
+        `max_audio_bytes`.
+        """
+        entries = sorted(os.scandir(self.audio_dir),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self.audio_bytes <= self.max_audio_bytes * 0.9:
+                break
+            size = entry.stat().st_size
+            os.remove(entry.path)
+            self.audio_bytes -= size
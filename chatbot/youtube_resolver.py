@@ -0,0 +1,253 @@
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+
+class ResolveError(Exception):
+    """
+    Raised when yt-dlp cannot extract a playable audio URL.
+    """
+
+
+class TTLCache:
+    """
+    Small thread-safe dictionary whose entries expire.
+    """
+    def __init__(self, max_items=256):
+        self.max_items = max_items
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self.items[key]
+                return None
+            return value
+
+    def put(self, key, value, ttl):
+        with self.lock:
+            if len(self.items) >= self.max_items and key not in self.items:
+                oldest = min(self.items, key=lambda k: self.items[k][1])
+                del self.items[oldest]
+            self.items[key] = (value, time.time() + ttl)
+
+
+class StageTimer:
+    """
+    Records how long each stage of a YouTube request takes.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.stages[stage] = seconds
+
+    def measure(self, stage, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def report(self):
+        with self.lock:
+            parts = [f"{stage}={seconds * 1000:.0f}ms"
+                     for stage, seconds in self.stages.items()]
+        return "YouTube timings: " + " ".join(parts)
+
+
+class YouTubeResolver:
+    """
+    Resolves keywords to playable audio URLs off the main thread.
+
+    Search results (keyword to watch URLs) and extracted stream URLs (watch
+    URL to audio URL) are cached. Stream URLs are kept until shortly before
+    the `expire` timestamp YouTube puts in them. Once a keyword is resolved,
+    the stream URL of the next search result is extracted in the background
+    so a request for more videos starts without waiting for yt-dlp.
+
+    With a `ConnectivityMonitor`, lookups that are not cached fail at once
+    with `ResolveError` while the connection is down, and failed lookups
+    make it probe the connection right away.
+
+    With a `MediaLibrary`, search results are also kept on disk, so a
+    keyword asked for again after a restart is not searched, and a
+    downloaded track resolves to its local file without running yt-dlp.
+    """
+    def __init__(self, search_ttl=24 * 3600, url_ttl=3600, expiry_margin=300,
+                 connectivity=None, library=None):
+        self.search_ttl = search_ttl
+        self.url_ttl = url_ttl
+        self.expiry_margin = expiry_margin
+        self.connectivity = connectivity
+        self.library = library
+        self.searches = TTLCache()
+        self.audio_urls = TTLCache()
+        self.pending = {}
+        self.processes = set()
+        self.lock = threading.RLock()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+    def search(self, keyword, timer=None):
+        """
+        Searches YouTube for a keyword.
+
+        Args:
+            keyword (str): The keyword to search for.
+            timer (StageTimer): Optional timer for the "search" stage.
+
+        Returns:
+            list[str]: Watch URLs of the results, possibly empty.
+
+        Raises:
+            ResolveError: If the keyword is not cached and the connection is
+            down.
+        """
+        results = self.searches.get(keyword)
+        if results is None and self.library is not None:
+            results = self.library.lookup(keyword)
+            if results:
+                self.searches.put(keyword, results, self.search_ttl)
+        if results is not None:
+            if timer:
+                timer.record("search", 0)
+            return results
+        self.require_network()
+        start = time.perf_counter()
+        from pytube import Search
+        try:
+            search_results = Search(keyword)
+        except Exception:
+            self.network_failed()
+            raise
+        results = [video.watch_url for video in search_results.results or []]
+        if timer:
+            timer.record("search", time.perf_counter() - start)
+        if results:
+            self.searches.put(keyword, results, self.search_ttl)
+            if self.library is not None:
+                self.library.remember(keyword, results)
+        return results
+
+    def require_network(self):
+        if self.connectivity is not None and not self.connectivity.online:
+            raise ResolveError("No internet connection.")
+
+    def network_failed(self):
+        if self.connectivity is not None:
+            self.connectivity.report_failure()
+
+    def url_ttl_for(self, audio_url):
+        """
+        Returns how long a stream URL can be cached, from its `expire`
+        query parameter when present.
+        """
+        expire = parse_qs(urlparse(audio_url).query).get("expire")
+        if expire and expire[0].isdigit():
+            return max(int(expire[0]) - time.time() - self.expiry_margin, 0)
+        return self.url_ttl
+
+    def extract(self, watch_url):
+        """
+        Extracts the direct audio URL of a video with yt-dlp.
+
+        Args:
+            watch_url (str): The URL of the YouTube video.
+
+        Returns:
+            str: The direct audio URL, or the path of the downloaded track if
+            the media library has it.
+
+        Raises:
+            ResolveError: If yt-dlp fails or prints no URL, or if the URL is
+            not cached and the connection is down.
+        """
+        if self.library is not None:
+            path = self.library.local_file(watch_url)
+            if path:
+                return path
+        audio_url = self.audio_urls.get(watch_url)
+        if audio_url:
+            return audio_url
+        self.require_network()
+        try:
+            process = subprocess.Popen(
+                ["yt-dlp", "-f", "bestaudio", "--get-url", watch_url],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+        except OSError as e:
+            raise ResolveError(f"Error running yt-dlp: {e}") from e
+        with self.lock:
+            self.processes.add(process)
+        try:
+            stdout, stderr = process.communicate()
+        finally:
+            with self.lock:
+                self.processes.discard(process)
+        if process.returncode != 0:
+            # Negative when terminated by `cancel`.
+            if process.returncode > 0:
+                self.network_failed()
+            raise ResolveError(f"Error running yt-dlp: exit status "
+                               f"{process.returncode}. {stderr.strip()}")
+        urls = re.findall(r"https?://[^\s]+", stdout)
+        if not urls:
+            raise ResolveError("No valid URL found.")
+        audio_url = urls[0]
+        self.audio_urls.put(watch_url, audio_url, self.url_ttl_for(audio_url))
+        return audio_url
+
+    def extract_async(self, watch_url):
+        """
+        Starts extracting the audio URL of a video, sharing the work with
+        any extraction of the same URL already running.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the audio URL.
+        """
+        with self.lock:
+            future = self.pending.get(watch_url)
+            if future is None:
+                future = self.executor.submit(self.extract, watch_url)
+                self.pending[watch_url] = future
+                future.add_done_callback(
+                    lambda _: self._forget(watch_url, future))
+        return future
+
+    def _forget(self, watch_url, future):
+        with self.lock:
+            if self.pending.get(watch_url) is future:
+                del self.pending[watch_url]
+
+    def prefetch(self, watch_urls):
+        """
+        Extracts the audio URLs of upcoming candidates in the background.
+        """
+        for watch_url in watch_urls:
+            if self.library is not None and self.library.local_file(watch_url):
+                continue
+            if not self.audio_urls.get(watch_url):
+                self.extract_async(watch_url).add_done_callback(
+                    lambda future: future.exception())
+
+    def cancel(self):
+        """
+        Terminates the yt-dlp processes started by this resolver.
+        """
+        with self.lock:
+            processes = list(self.processes)
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()